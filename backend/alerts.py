@@ -0,0 +1,260 @@
+"""Streaming anomaly detection on ingested readings.
+
+Each buoy keeps a small, fixed amount of rolling state (EWMA mean/variance
+per metric, smoothed temperature and battery slopes and
+an EWMA reference position), so evaluating a reading is O(1) and never
+rescans history. Rules:
+
+* ``turbidity_spike``: turbidity z-score against its EWMA above ``z_threshold``
+* ``temperature_excursion``: temperature z-score above ``z_threshold`` or a
+  smoothed rate of change beyond ``max_temperature_rate`` per hour
+* ``battery_drain``: smoothed battery slope below ``-max_battery_drain`` per hour
+* ``drift``: position further than ``drift_radius_m`` from the reference position
+
+Each (buoy, alert type) is rate-limited by ``cooldown_seconds``.
+"""
+import math
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from geo import distance_m
+
+
+class AlertConfig(BaseModel):
+    z_threshold: float = 4.0
+    ewma_alpha: float = 0.05
+    # Readings seen before z-score and slope rules start firing
+    warmup: int = 30
+    max_temperature_rate: float = 3.0  # C per hour
+    max_battery_drain: float = 5.0  # % per hour
+    slope_alpha: float = 0.1
+    # Rates are taken over at least this long so sensor jitter is not amplified
+    min_rate_interval: float = 60.0  # seconds
+    drift_radius_m: float = 50.0
+    position_alpha: float = 0.01
+    cooldown_seconds: float = 900.0
+
+    @classmethod
+    def from_env(cls) -> "AlertConfig":
+        return cls(
+            z_threshold=float(os.environ.get('ALERT_Z_THRESHOLD', '4')),
+            max_temperature_rate=float(os.environ.get('ALERT_MAX_TEMPERATURE_RATE', '3')),
+            max_battery_drain=float(os.environ.get('ALERT_MAX_BATTERY_DRAIN', '5')),
+            drift_radius_m=float(os.environ.get('ALERT_DRIFT_RADIUS_M', '50')),
+            cooldown_seconds=float(os.environ.get('ALERT_COOLDOWN_SECONDS', '900')),
+        )
+
+
+class Alert(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    type: str
+    severity: str
+    metric: str
+    value: float
+    message: str
+    timestamp: datetime
+    reading_id: Optional[str] = None
+    buoy_id: Optional[str] = None
+    details: Dict[str, float] = {}
+
+
+class Ewma:
+    """Exponentially weighted mean and variance, updated in O(1)."""
+
+    __slots__ = ("alpha", "mean", "var", "count")
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, value: float) -> float:
+        """Fold in a value and return its z-score against the state before it."""
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return 0.0
+        diff = value - self.mean
+        z = diff / math.sqrt(self.var) if self.var > 0 else 0.0
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+        return z
+
+
+class Slope:
+    """Smoothed rate of change per hour.
+
+    Raw rates are taken over at least ``min_interval`` seconds and folded into
+    an EWMA, so single noisy samples do not look like a trend.
+    """
+
+    __slots__ = ("min_interval", "alpha", "value", "timestamp", "slope", "count")
+
+    def __init__(self, min_interval: float, alpha: float):
+        self.min_interval = min_interval
+        self.alpha = alpha
+        self.value = 0.0
+        self.timestamp: Optional[datetime] = None
+        self.slope = 0.0
+        self.count = 0
+
+    def update(self, value: float, timestamp: datetime) -> bool:
+        """Fold in a value; returns True when the slope was updated."""
+        if self.timestamp is None:
+            self.value, self.timestamp = value, timestamp
+            return False
+        seconds = (timestamp - self.timestamp).total_seconds()
+        if seconds < self.min_interval:
+            return False
+        rate = (value - self.value) * 3600 / seconds
+        self.value, self.timestamp = value, timestamp
+        self.count += 1
+        if self.count == 1:
+            self.slope = rate
+        else:
+            self.slope += self.alpha * (rate - self.slope)
+        return True
+
+
+class BuoyAlertState:
+    __slots__ = ("turbidity", "temperature", "temperature_slope", "battery_slope",
+                 "latitude", "longitude", "positions", "last_timestamp", "last_fired")
+
+    def __init__(self, config: AlertConfig):
+        self.turbidity = Ewma(config.ewma_alpha)
+        self.temperature = Ewma(config.ewma_alpha)
+        self.temperature_slope = Slope(config.min_rate_interval, config.slope_alpha)
+        self.battery_slope = Slope(config.min_rate_interval, config.slope_alpha)
+        self.latitude = 0.0
+        self.longitude = 0.0
+        self.positions = 0
+        self.last_timestamp: Optional[datetime] = None
+        self.last_fired: Dict[str, datetime] = {}
+
+
+class AlertEngine:
+    """Evaluate readings as they are ingested and return the alerts they raise."""
+
+    def __init__(self, config: Optional[AlertConfig] = None, default_buoy: str = "default"):
+        self.config = config or AlertConfig()
+        self.default_buoy = default_buoy
+        self.states: Dict[str, BuoyAlertState] = {}
+        self.evaluated = 0
+        self.skipped_out_of_order = 0
+
+    def _fire(self, state: BuoyAlertState, alerts: List[Alert], timestamp: datetime, **fields):
+        last = state.last_fired.get(fields["type"])
+        if last is not None and (timestamp - last).total_seconds() < self.config.cooldown_seconds:
+            return
+        state.last_fired[fields["type"]] = timestamp
+        alerts.append(Alert(timestamp=timestamp, **fields))
+
+    def evaluate(self, reading: dict, buoy: Optional[str] = None, emit: bool = True) -> List[Alert]:
+        """Update the buoy's rolling state with one reading.
+
+        The buoy defaults to the reading's ``buoy_id``. Readings older than
+        the last one evaluated for that buoy (replays) are skipped so the
+        state only moves forward in time. With ``emit=False`` the state is
+        warmed up without producing alerts.
+        """
+        config = self.config
+        buoy = buoy or reading.get("buoy_id") or self.default_buoy
+        state = self.states.get(buoy)
+        if state is None:
+            state = self.states[buoy] = BuoyAlertState(config)
+        timestamp = reading["timestamp"]
+        if state.last_timestamp is not None and timestamp < state.last_timestamp:
+            self.skipped_out_of_order += 1
+            return []
+        state.last_timestamp = timestamp
+        self.evaluated += 1
+        alerts: List[Alert] = []
+        reading_id = reading.get("id")
+
+        turbidity = reading["water_turbidity"]
+        warm = state.turbidity.count >= config.warmup
+        z = state.turbidity.update(turbidity)
+        if emit and warm and z > config.z_threshold:
+            self._fire(state, alerts, timestamp, type="turbidity_spike", severity="warning",
+                       metric="water_turbidity", value=turbidity, reading_id=reading_id,
+                       message=f"Turbidity {turbidity:.1f} NTU is {z:.1f} sd above its recent mean",
+                       details={"z": z, "mean": state.turbidity.mean})
+
+        temperature = reading["water_temperature"]
+        warm = state.temperature.count >= config.warmup
+        z = state.temperature.update(temperature)
+        slope = state.temperature_slope
+        sloped = slope.update(temperature, timestamp)
+        if emit and warm and abs(z) > config.z_threshold:
+            self._fire(state, alerts, timestamp, type="temperature_excursion", severity="warning",
+                       metric="water_temperature", value=temperature, reading_id=reading_id,
+                       message=f"Temperature {temperature:.2f} C is {z:+.1f} sd from its recent mean",
+                       details={"z": z, "mean": state.temperature.mean})
+        elif (emit and sloped and slope.count >= config.warmup
+              and abs(slope.slope) > config.max_temperature_rate):
+            self._fire(state, alerts, timestamp, type="temperature_excursion", severity="warning",
+                       metric="water_temperature", value=temperature, reading_id=reading_id,
+                       message=f"Temperature changing at {slope.slope:+.2f} C/h",
+                       details={"rate_per_hour": slope.slope})
+
+        battery = reading["battery_percentage"]
+        slope = state.battery_slope
+        if (slope.update(battery, timestamp) and emit and slope.count >= config.warmup
+                and slope.slope < -config.max_battery_drain):
+            self._fire(state, alerts, timestamp, type="battery_drain", severity="critical",
+                       metric="battery_percentage", value=battery, reading_id=reading_id,
+                       message=f"Battery draining at {-slope.slope:.1f} %/h",
+                       details={"slope_per_hour": slope.slope})
+
+        latitude = reading["gps_latitude"]
+        longitude = reading["gps_longitude"]
+        state.positions += 1
+        if state.positions == 1:
+            state.latitude, state.longitude = latitude, longitude
+        else:
+            distance = distance_m(state.latitude, state.longitude, latitude, longitude)
+            if emit and state.positions > config.warmup and distance > config.drift_radius_m:
+                self._fire(state, alerts, timestamp, type="drift", severity="critical",
+                           metric="gps", value=distance, reading_id=reading_id,
+                           message=f"Buoy is {distance:.0f} m from its usual position",
+                           details={"distance_m": distance, "reference_latitude": state.latitude,
+                                    "reference_longitude": state.longitude})
+            state.latitude += config.position_alpha * (latitude - state.latitude)
+            state.longitude += config.position_alpha * (longitude - state.longitude)
+
+        for alert in alerts:
+            alert.buoy_id = buoy
+        return alerts
+
+    async def warm_up(self, readings, count: int) -> int:
+        """Prime the rolling state from the newest ``count`` stored readings, without alerting."""
+        docs = await readings.find({"timestamp": {"$type": "date"}})\
+            .sort("timestamp", -1)\
+            .limit(count)\
+            .to_list(length=count)
+        self.reset()
+        for doc in reversed(docs):
+            self.evaluate(doc, emit=False)
+        return len(docs)
+
+    def reset(self):
+        self.states.clear()
+
+    def stats(self) -> dict:
+        return {
+            "buoys": len(self.states),
+            "evaluated": self.evaluated,
+            "skipped_out_of_order": self.skipped_out_of_order,
+        }
+
+
+async def ensure_alert_indexes(collection):
+    await collection.create_index([("timestamp", -1)], name="timestamp_desc")
+    await collection.create_index([("type", 1), ("timestamp", -1)], name="type_timestamp_desc")
+    await collection.create_index([("buoy_id", 1), ("timestamp", -1)], name="buoy_timestamp_desc")
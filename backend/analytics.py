@@ -0,0 +1,234 @@
+"""Vectorized analytics over a time range of buoy readings.
+
+A range is loaded with one projected, time-ordered cursor pass into
+columnar NumPy arrays, resampled onto a regular grid and analysed without
+per-reading Python loops: rolling mean and standard deviation, exponential
+moving average, rate of change and pairwise Pearson correlation between
+metrics. Results are memoized in ``AnalyticsCache``, which ingest
+invalidates for the time ranges (and buoys) that new readings fall into.
+"""
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Documents pulled from the cursor per round trip while loading a range
+LOAD_BATCH_SIZE = 10000
+
+
+async def load_columns(collection, match: dict, fields: Sequence[str],
+                       max_readings: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Load matching readings in time order as epoch seconds and a (readings, fields) float array.
+
+    Missing values become NaN. Raises ``ValueError`` when more than
+    ``max_readings`` readings match.
+    """
+    projection = {"_id": 0, "timestamp": 1, **{field: 1 for field in fields}}
+    cursor = collection.find(match, projection).sort("timestamp", 1).batch_size(LOAD_BATCH_SIZE)
+    rows: List[tuple] = []
+    while True:
+        docs = await cursor.to_list(length=LOAD_BATCH_SIZE)
+        if not docs:
+            break
+        rows.extend((doc["timestamp"].timestamp(), *(doc.get(field) for field in fields)) for doc in docs)
+        if len(rows) > max_readings:
+            await cursor.close()
+            raise ValueError(f"More than {max_readings} readings in range")
+    data = np.array(rows, dtype=float).reshape(len(rows), len(fields) + 1)
+    return data[:, 0], data[:, 1:]
+
+
+def resample(times: np.ndarray, values: np.ndarray, start: float, step: float, bins: int) -> np.ndarray:
+    """Mean of each column per ``step``-second bin from ``start``; empty bins are NaN."""
+    index = np.floor((times - start) / step).astype(np.int64)
+    in_range = (index >= 0) & (index < bins)
+    result = np.full((bins, values.shape[1]), np.nan)
+    for column in range(values.shape[1]):
+        mask = in_range & ~np.isnan(values[:, column])
+        counts = np.bincount(index[mask], minlength=bins)
+        sums = np.bincount(index[mask], weights=values[mask, column], minlength=bins)
+        filled = counts > 0
+        result[filled, column] = sums[filled] / counts[filled]
+    return result
+
+
+def rolling_mean_std(x: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Trailing mean and population standard deviation over ``window`` bins, ignoring NaN.
+
+    Uses prefix sums of values centred on their overall mean, which keeps
+    the variance accurate for large, slowly varying values like pressure.
+    """
+    valid = ~np.isnan(x)
+    if not valid.any():
+        return np.full_like(x, np.nan), np.full_like(x, np.nan)
+    center = x[valid].mean()
+    centred = np.where(valid, x - center, 0.0)
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    sums = np.concatenate(([0.0], np.cumsum(centred)))
+    squares = np.concatenate(([0.0], np.cumsum(centred * centred)))
+    hi = np.arange(1, len(x) + 1)
+    lo = np.maximum(hi - window, 0)
+    n = counts[hi] - counts[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums[hi] - sums[lo]) / n
+        variance = np.maximum((squares[hi] - squares[lo]) / n - mean * mean, 0.0)
+    empty = n == 0
+    mean[empty] = np.nan
+    variance[empty] = np.nan
+    return mean + center, np.sqrt(variance)
+
+
+def forward_fill(x: np.ndarray) -> np.ndarray:
+    """Replace NaN with the previous valid value (leading NaN stay NaN)."""
+    valid = ~np.isnan(x)
+    index = np.maximum.accumulate(np.where(valid, np.arange(len(x)), -1))
+    filled = x[np.maximum(index, 0)]
+    filled[index < 0] = np.nan
+    return filled
+
+
+def ema(x: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average with ``alpha = 2 / (span + 1)``, gaps carried forward.
+
+    The recurrence ``y[i] = (1 - alpha) * y[i-1] + alpha * x[i]`` is solved
+    in closed form with a cumulative sum, block by block so the scaling
+    factors stay within float range; the blocks are thousands of bins long
+    for typical spans.
+    """
+    alpha = 2.0 / (span + 1)
+    x = forward_fill(x)
+    result = np.full_like(x, np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if not len(valid) or alpha >= 1:
+        return x if alpha >= 1 else result
+    first = valid[0]
+    decay = 1.0 - alpha
+    # decay ** -block stays below 1e100
+    block = max(1, int(100 * math.log(10) / -math.log(decay)))
+    state = x[first]
+    for offset in range(first, len(x), block):
+        chunk = x[offset:offset + block]
+        k = np.arange(len(chunk))
+        values = decay ** (k + 1) * state + alpha * decay ** k * np.cumsum(chunk * decay ** -k)
+        result[offset:offset + len(chunk)] = values
+        state = values[-1]
+    return result
+
+
+def derivative_per_hour(x: np.ndarray, step: float) -> np.ndarray:
+    """Rate of change per hour (central differences; NaN next to empty bins)."""
+    if len(x) < 2:
+        return np.full_like(x, np.nan)
+    return np.gradient(x, step / 3600.0)
+
+
+def correlations(names: Sequence[str], grid: np.ndarray) -> Dict[str, Dict[str, Optional[float]]]:
+    """Pairwise Pearson correlation over the bins where both metrics have data."""
+    matrix: Dict[str, Dict[str, Optional[float]]] = {name: {} for name in names}
+    for i, a in enumerate(names):
+        for j in range(i, len(names)):
+            b = names[j]
+            both = ~np.isnan(grid[:, i]) & ~np.isnan(grid[:, j])
+            r = None
+            if both.sum() >= 3:
+                x, y = grid[both, i], grid[both, j]
+                if x.std() > 0 and y.std() > 0:
+                    r = round(float(np.corrcoef(x, y)[0, 1]), 4)
+            matrix[a][b] = matrix[b][a] = r
+    return matrix
+
+
+def series(values: np.ndarray, digits: int = 4) -> list:
+    """JSON-ready list with NaN as None."""
+    return np.where(np.isnan(values), None, np.round(values, digits)).tolist()
+
+
+def analyze(times: np.ndarray, values: np.ndarray, names: Sequence[str], start: datetime,
+            step: int, bins: int, window: int, ema_span: int) -> dict:
+    """Resample ``values`` (columns named ``names``) and compute the per-metric statistics."""
+    origin = start.timestamp()
+    grid = resample(times, values, origin, step, bins)
+    metrics = {}
+    for column, name in enumerate(names):
+        x = grid[:, column]
+        rolling_mean, rolling_std = rolling_mean_std(x, window)
+        metrics[name] = {
+            "mean": series(x),
+            "rolling_mean": series(rolling_mean),
+            "rolling_std": series(rolling_std),
+            "ema": series(ema(x, ema_span)),
+            "derivative_per_hour": series(derivative_per_hour(x, step)),
+        }
+    return {
+        "readings": int(len(times)),
+        "timestamps": [f"{t}Z" for t in np.datetime_as_string(
+            np.datetime64(int(origin), "s") + np.arange(bins) * np.timedelta64(int(step), "s"), unit="s"
+        )],
+        "metrics": metrics,
+        "correlations": correlations(names, grid),
+    }
+
+
+class AnalyticsEntry(NamedTuple):
+    body: bytes
+    start: datetime
+    end: datetime
+    buoy_id: Optional[str]
+    created_at: float
+
+
+class AnalyticsCache:
+    """LRU of rendered analytics keyed by (range, metrics, parameters).
+
+    Ingest calls ``invalidate`` with the new readings' time span, dropping
+    only entries whose range (and buoy) they fall into; ``ttl`` bounds how
+    long readings ingested by other workers can go unnoticed.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, AnalyticsEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.created_at >= self.ttl:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.body
+
+    def put(self, key: Hashable, start: datetime, end: datetime, buoy_id: Optional[str], body: bytes):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        self._entries[key] = AnalyticsEntry(body, start, end, buoy_id, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, first: datetime, last: datetime, buoy_ids: Optional[set] = None):
+        """Drop entries covering any time in [first, last] for any of ``buoy_ids`` (None: all buoys)."""
+        stale = [
+            key for key, entry in self._entries.items()
+            if entry.start <= last and first < entry.end
+            and (buoy_ids is None or entry.buoy_id is None or entry.buoy_id in buoy_ids)
+        ]
+        for key in stale:
+            del self._entries[key]
+        self.invalidated += len(stale)
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "size": len(self._entries), "max_entries": self.max_entries, "hits": self.hits,
+            "misses": self.misses, "invalidated": self.invalidated,
+        }
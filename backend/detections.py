@@ -0,0 +1,235 @@
+"""Detection events split out of readings, with incrementally maintained counts.
+
+Readings carry the camera classifier's ``detected_object_class`` (and, when
+the firmware sends it, ``detection_confidence``). Every reading with a class
+also becomes a small event document, indexed by class, buoy and time, and
+hourly and daily counts per (buoy, class) are upserted alongside. Class
+histograms and timelines then read a handful of count documents per bucket
+in the range instead of scanning readings.
+
+Events use the reading id as ``_id`` and counts are only incremented for
+events that were actually inserted, so replaying readings (an import rerun,
+a rebuild, a replayed buffer batch) does not count them twice.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from rollups import GRANULARITIES, floor_time, plan_segments
+
+# Class values that mean "nothing detected"
+NO_DETECTION = {"", "none", "null", "nan", "unknown"}
+
+# Readings scanned per batch when rebuilding events from stored readings
+REBUILD_BATCH_SIZE = 5000
+
+
+class DetectionEvent(BaseModel):
+    reading_id: str
+    buoy_id: Optional[str] = None
+    object_class: str
+    confidence: Optional[float] = None
+    timestamp: datetime
+    gps_latitude: Optional[float] = None
+    gps_longitude: Optional[float] = None
+
+
+def detection_class(value: Optional[str]) -> Optional[str]:
+    """The detected class of a reading, or None when nothing was detected."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    return None if value.lower() in NO_DETECTION else value
+
+
+def detection_events(readings: List[dict]) -> List[dict]:
+    """Event documents for the readings that carry a detection."""
+    events = []
+    for reading in readings:
+        object_class = detection_class(reading.get("detected_object_class"))
+        if object_class is None:
+            continue
+        events.append({
+            "_id": reading["id"],
+            "reading_id": reading["id"],
+            "buoy_id": reading.get("buoy_id"),
+            "object_class": object_class,
+            "confidence": reading.get("detection_confidence"),
+            "timestamp": reading["timestamp"],
+            "gps_latitude": reading.get("gps_latitude"),
+            "gps_longitude": reading.get("gps_longitude"),
+        })
+    return events
+
+
+def count_id(granularity: str, buoy_id: Optional[str], object_class: str, bucket_start: datetime) -> str:
+    return f"{granularity}:{buoy_id}:{object_class}:{bucket_start.isoformat()}"
+
+
+def count_updates(events: List[dict]) -> List[UpdateOne]:
+    """Hourly and daily count upserts for newly stored events, one per (granularity, buoy, class, bucket)."""
+    partials: Dict[Tuple[str, Optional[str], str, datetime], List[float]] = defaultdict(lambda: [0, 0.0, 0])
+    for event in events:
+        for granularity, width in GRANULARITIES.items():
+            key = (granularity, event["buoy_id"], event["object_class"], floor_time(event["timestamp"], width))
+            partial = partials[key]
+            partial[0] += 1
+            if event["confidence"] is not None:
+                partial[1] += event["confidence"]
+                partial[2] += 1
+    return [
+        UpdateOne(
+            {"_id": count_id(granularity, buoy_id, object_class, bucket_start)},
+            {
+                "$setOnInsert": {
+                    "granularity": granularity, "buoy_id": buoy_id,
+                    "object_class": object_class, "bucket_start": bucket_start,
+                },
+                "$inc": {"count": count, "confidence_sum": confidence_sum, "confidence_count": confidence_count},
+            },
+            upsert=True,
+        )
+        for (granularity, buoy_id, object_class, bucket_start), (count, confidence_sum, confidence_count)
+        in partials.items()
+    ]
+
+
+async def insert_events(events_collection, events: List[dict]) -> List[dict]:
+    """Insert events unordered; returns the ones stored (events already stored are skipped)."""
+    if not events:
+        return []
+    try:
+        await events_collection.insert_many(events, ordered=False)
+        return events
+    except BulkWriteError as e:
+        rejected = {write_error["index"] for write_error in e.details.get("writeErrors", [])}
+        return [event for i, event in enumerate(events) if i not in rejected]
+
+
+async def apply_detections(events_collection, counts, readings: List[dict]) -> int:
+    """Store the detections of newly stored readings and fold them into the counts."""
+    stored = await insert_events(events_collection, detection_events(readings))
+    if stored:
+        await counts.bulk_write(count_updates(stored), ordered=False)
+    return len(stored)
+
+
+def _count_match(buoy_id: Optional[str], object_class: Optional[str]) -> dict:
+    match = {}
+    if buoy_id:
+        match["buoy_id"] = buoy_id
+    if object_class:
+        match["object_class"] = object_class
+    return match
+
+
+async def class_histogram(events_collection, counts, start: datetime, end: datetime,
+                          buoy_id: Optional[str] = None) -> Dict[str, dict]:
+    """Detections per class in [start, end) with their mean confidence.
+
+    Whole days and hours come from the counts; only the unaligned edges of
+    the range (less than an hour each) are counted from events.
+    """
+    queries = []
+    for source, segment_start, segment_end in plan_segments(start, end):
+        if source == "raw":
+            pipeline = [
+                {"$match": {**_count_match(buoy_id, None), "timestamp": {"$gte": segment_start, "$lt": segment_end}}},
+                {"$group": {
+                    "_id": "$object_class",
+                    "count": {"$sum": 1},
+                    "confidence_sum": {"$sum": "$confidence"},
+                    "confidence_count": {"$sum": {"$cond": [{"$eq": [{"$ifNull": ["$confidence", None]}, None]}, 0, 1]}},
+                }},
+            ]
+            queries.append(events_collection.aggregate(pipeline).to_list(length=None))
+        else:
+            pipeline = [
+                {"$match": {
+                    **_count_match(buoy_id, None),
+                    "granularity": source,
+                    "bucket_start": {"$gte": segment_start, "$lt": segment_end},
+                }},
+                {"$group": {
+                    "_id": "$object_class",
+                    "count": {"$sum": "$count"},
+                    "confidence_sum": {"$sum": "$confidence_sum"},
+                    "confidence_count": {"$sum": "$confidence_count"},
+                }},
+            ]
+            queries.append(counts.aggregate(pipeline).to_list(length=None))
+
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0])
+    for rows in await asyncio.gather(*queries):
+        for row in rows:
+            total = totals[row["_id"]]
+            total[0] += row["count"]
+            total[1] += row["confidence_sum"] or 0.0
+            total[2] += row["confidence_count"]
+    return {
+        object_class: {
+            "count": count,
+            "mean_confidence": round(confidence_sum / confidence_count, 4) if confidence_count else None,
+        }
+        for object_class, (count, confidence_sum, confidence_count)
+        in sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+    }
+
+
+async def class_timeline(counts, start: datetime, end: datetime, granularity: str,
+                         buoy_id: Optional[str] = None, object_class: Optional[str] = None) -> List[Tuple[datetime, Dict[str, int]]]:
+    """Detections per class in each ``granularity`` bucket from ``start`` (aligned) to ``end``, empty buckets included."""
+    width = GRANULARITIES[granularity]
+    first = floor_time(start, width)
+    rows = await counts.aggregate([
+        {"$match": {
+            **_count_match(buoy_id, object_class),
+            "granularity": granularity,
+            "bucket_start": {"$gte": first, "$lt": end},
+        }},
+        {"$group": {"_id": {"bucket_start": "$bucket_start", "object_class": "$object_class"}, "count": {"$sum": "$count"}}},
+    ]).to_list(length=None)
+    by_bucket: Dict[datetime, Dict[str, int]] = defaultdict(dict)
+    for row in rows:
+        bucket_start = row["_id"]["bucket_start"].replace(tzinfo=first.tzinfo)
+        by_bucket[bucket_start][row["_id"]["object_class"]] = row["count"]
+    timeline = []
+    bucket_start = first
+    while bucket_start < end:
+        timeline.append((bucket_start, by_bucket.get(bucket_start, {})))
+        bucket_start += width
+    return timeline
+
+
+async def rebuild_detections(readings, events_collection, counts, progress=None) -> int:
+    """Recreate events and counts from stored readings; returns the number of events."""
+    await events_collection.delete_many({})
+    await counts.delete_many({})
+    cursor = readings.find(
+        {"detected_object_class": {"$ne": None}},
+        {"_id": 0, "id": 1, "buoy_id": 1, "timestamp": 1, "detected_object_class": 1,
+         "detection_confidence": 1, "gps_latitude": 1, "gps_longitude": 1},
+    ).batch_size(REBUILD_BATCH_SIZE)
+    total = 0
+    while True:
+        batch = await cursor.to_list(length=REBUILD_BATCH_SIZE)
+        if not batch:
+            break
+        total += await apply_detections(events_collection, counts, batch)
+        if progress:
+            progress(total)
+    return total
+
+
+async def ensure_detection_indexes(events_collection, counts):
+    await events_collection.create_index([("timestamp", -1)], name="timestamp_desc")
+    await events_collection.create_index([("object_class", 1), ("timestamp", -1)], name="class_timestamp_desc")
+    await events_collection.create_index([("buoy_id", 1), ("timestamp", -1)], name="buoy_timestamp_desc")
+    await counts.create_index(
+        [("granularity", 1), ("bucket_start", 1), ("object_class", 1)], name="granularity_bucket_class"
+    )
@@ -0,0 +1,148 @@
+"""Streaming encoders for bulk reading exports (NDJSON, CSV, Parquet).
+
+Each encoder consumes an async iterator of row chunks (lists of dicts) and
+yields encoded bytes chunk by chunk, so memory stays bounded by the chunk
+size rather than the size of the export. Encoding a chunk is CPU-bound, so
+it runs in a worker thread and the event loop keeps serving other requests
+while a large export is written.
+"""
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# (column name, kind) where kind is "string", "float" or "timestamp"
+Columns = List[Tuple[str, str]]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _ndjson_chunk(chunk: List[dict], names: List[str]) -> bytes:
+    lines = [
+        json.dumps({name: row.get(name) for name in names}, default=_json_default)
+        for row in chunk
+    ]
+    return ("\n".join(lines) + "\n").encode()
+
+
+async def encode_ndjson(chunks: AsyncIterator[List[dict]], columns: Columns) -> AsyncIterator[bytes]:
+    names = [name for name, _ in columns]
+    async for chunk in chunks:
+        yield await asyncio.to_thread(_ndjson_chunk, chunk, names)
+
+
+def _csv_chunk(chunk: List[dict], names: List[str], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=names, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    for row in chunk:
+        writer.writerow({
+            name: value.isoformat() if isinstance(value, datetime) else value
+            for name, value in row.items()
+        })
+    return buffer.getvalue().encode()
+
+
+async def encode_csv(chunks: AsyncIterator[List[dict]], columns: Columns) -> AsyncIterator[bytes]:
+    names = [name for name, _ in columns]
+    header = True
+    async for chunk in chunks:
+        yield await asyncio.to_thread(_csv_chunk, chunk, names, header)
+        header = False
+    if header:
+        yield _csv_chunk([], names, header)
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the caller.
+
+    ``tell`` reports the total bytes written so far, which the Parquet writer
+    needs for the footer offsets even though the data has already been sent.
+    """
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_schema(columns: Columns) -> "pa.Schema":
+    types = {
+        "string": pa.string(),
+        "float": pa.float64(),
+        "timestamp": pa.timestamp("ms", tz="UTC"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _parquet_row_group(writer: "pq.ParquetWriter", sink: _ChunkSink, chunk: List[dict],
+                       columns: Columns, schema: "pa.Schema") -> bytes:
+    frame = pd.DataFrame.from_records(chunk).reindex(columns=[name for name, _ in columns])
+    for name, kind in columns:
+        if kind == "timestamp":
+            frame[name] = pd.to_datetime(frame[name], utc=True).dt.floor("ms")
+    writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+    return sink.drain()
+
+
+async def encode_parquet(chunks: AsyncIterator[List[dict]], columns: Columns) -> AsyncIterator[bytes]:
+    """Encode each chunk as one Parquet row group."""
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="snappy")
+    try:
+        async for chunk in chunks:
+            # One row group at a time, so the writer is never used from two threads at once
+            yield await asyncio.to_thread(_parquet_row_group, writer, sink, chunk, columns, schema)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+EXPORT_ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "parquet": encode_parquet,
+}
@@ -0,0 +1,260 @@
+"""Write-behind mirroring of buoy readings to Firebase Realtime Database.
+
+Ingest endpoints only enqueue payloads here; a background worker pushes them
+to Firebase in coalesced multi-path updates, so request latency never depends
+on Firebase round-trips.
+"""
+import asyncio
+import copy
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class FirebaseSyncQueue:
+    """Coalescing, batching, retrying write-behind queue for one Firebase root path.
+
+    * ``current`` is coalesced: only the newest pending value (by its
+      ``timestamp``) is written, and an older replayed reading never
+      overwrites a newer one.
+    * ``historical`` entries are written together as one multi-path update of
+      up to ``max_batch`` children.
+    * Failed updates are retried with exponential backoff and jitter. While the
+      backlog is above ``max_pending`` the oldest historical entries are dropped.
+    """
+
+    def __init__(
+        self,
+        reference: Callable[[str], Any],
+        root: str = "buoy_data",
+        max_batch: int = 500,
+        max_pending: int = 100000,
+        base_delay: float = 0.5,
+        max_delay: float = 60.0,
+        on_send: Optional[Callable[[float, bool], None]] = None,
+    ):
+        self.reference = reference
+        self.root = root
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Called with (seconds, succeeded) after every update attempt
+        self.on_send = on_send
+
+        self._current: Optional[dict] = None
+        self._current_timestamp = ""
+        self._historical: "OrderedDict[str, dict]" = OrderedDict()
+        self._enqueued_at: "OrderedDict[str, float]" = OrderedDict()
+        self._current_enqueued_at: Optional[float] = None
+        self._inflight = 0
+        self._inflight_since: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.synced_entries = 0
+        self.updates_sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.retries = 0
+        self.last_error: Optional[str] = None
+        self.last_sync_at: Optional[float] = None
+
+    def enqueue(self, current: Optional[dict] = None, historical: Optional[Dict[str, dict]] = None):
+        """Queue payloads for mirroring; never blocks."""
+        now = time.time()
+        if current is not None and current.get("timestamp", "") >= self._current_timestamp:
+            if self._current is not None:
+                self.coalesced += 1
+            else:
+                self._current_enqueued_at = now
+            self._current = current
+            self._current_timestamp = current.get("timestamp", "")
+        for key, payload in (historical or {}).items():
+            self._historical[key] = payload
+            self._enqueued_at.setdefault(key, now)
+        while len(self._historical) > self.max_pending:
+            key, _ = self._historical.popitem(last=False)
+            self._enqueued_at.pop(key, None)
+            self.dropped += 1
+        if self._current is not None or self._historical:
+            self._wakeup.set()
+
+    @property
+    def depth(self) -> int:
+        """Entries not yet confirmed by Firebase (queued plus in flight)."""
+        return len(self._historical) + (1 if self._current is not None else 0) + self._inflight
+
+    def lag_seconds(self) -> float:
+        """Age of the oldest entry not yet confirmed by Firebase."""
+        candidates = (
+            self._inflight_since,
+            self._current_enqueued_at,
+            next(iter(self._enqueued_at.values()), None),
+        )
+        oldest = [t for t in candidates if t]
+        return time.time() - min(oldest) if oldest else 0.0
+
+    def _take_batch(self) -> Dict[str, Any]:
+        updates: Dict[str, Any] = {}
+        times = []
+        if self._current is not None:
+            updates["current"] = self._current
+            times.append(self._current_enqueued_at)
+            self._current = None
+            self._current_enqueued_at = None
+        while self._historical and len(updates) < self.max_batch:
+            key, payload = self._historical.popitem(last=False)
+            times.append(self._enqueued_at.pop(key, None))
+            updates[f"historical/{key}"] = payload
+        self._inflight = len(updates)
+        self._inflight_since = min((t for t in times if t), default=None)
+        return updates
+
+    def _finish_batch(self):
+        self._inflight = 0
+        self._inflight_since = None
+
+    def _requeue(self, updates: Dict[str, Any]):
+        """Put a failed batch back at the front of the queue, keeping its age."""
+        since = self._inflight_since or time.time()
+        self._finish_batch()
+        current = updates.pop("current", None)
+        if current is not None and self._current is None:
+            self._current = current
+            self._current_enqueued_at = since
+        restored = OrderedDict((path.split("/", 1)[1], payload) for path, payload in updates.items())
+        restored_at = OrderedDict((key, since) for key in restored)
+        for key, payload in self._historical.items():
+            restored.setdefault(key, payload)
+            restored_at.setdefault(key, self._enqueued_at.get(key, since))
+        self._historical = restored
+        self._enqueued_at = restored_at
+
+    async def _send(self, updates: Dict[str, Any]):
+        ref = self.reference(self.root)
+        await asyncio.to_thread(ref.update, updates)
+
+    async def run(self):
+        """Worker loop: drain the queue, backing off while Firebase is failing."""
+        attempt = 0
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.depth:
+                updates = self._take_batch()
+                started = time.perf_counter()
+                try:
+                    await self._send(updates)
+                except asyncio.CancelledError:
+                    self._requeue(updates)
+                    raise
+                except Exception as e:
+                    if self.on_send:
+                        self.on_send(time.perf_counter() - started, False)
+                    self._requeue(updates)
+                    attempt += 1
+                    self.retries += 1
+                    self.last_error = str(e)
+                    delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                    logging.warning(f"Firebase sync failed ({e}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                    continue
+                if self.on_send:
+                    self.on_send(time.perf_counter() - started, True)
+                self._finish_batch()
+                attempt = 0
+                self.updates_sent += 1
+                self.synced_entries += len(updates)
+                self.last_sync_at = time.time()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Give pending writes a chance to flush, then stop the worker."""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": True,
+            "queue_depth": self.depth,
+            "lag_seconds": self.lag_seconds(),
+            "synced_entries": self.synced_entries,
+            "updates_sent": self.updates_sent,
+            "coalesced_current": self.coalesced,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "last_error": self.last_error,
+            "last_sync_at": self.last_sync_at,
+        }
+
+
+class FakeFirebaseDatabase:
+    """In-memory stand-in for the firebase_admin ``db.reference`` API.
+
+    Supports ``get``/``set``/``update`` on slash-separated paths, with optional
+    artificial latency and a failure switch for exercising the retry path.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.data: Dict[str, Any] = {}
+        self.latency = latency
+        self.fail = False
+        self.calls = 0
+
+    def reference(self, path: str) -> "FakeReference":
+        return FakeReference(self, [p for p in path.split("/") if p])
+
+
+class FakeReference:
+    def __init__(self, database: FakeFirebaseDatabase, parts: list):
+        self.database = database
+        self.parts = parts
+
+    def _call(self):
+        self.database.calls += 1
+        if self.database.latency:
+            time.sleep(self.database.latency)
+        if self.database.fail:
+            raise ConnectionError("Fake Firebase is unavailable")
+
+    def _write(self, parts: list, value: Any):
+        node = self.database.data
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        if parts:
+            node[parts[-1]] = copy.deepcopy(value)
+        else:
+            self.database.data = copy.deepcopy(value)
+
+    def get(self) -> Any:
+        self._call()
+        node: Any = self.database.data
+        for part in self.parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return copy.deepcopy(node)
+
+    def set(self, value: Any):
+        self._call()
+        self._write(self.parts, value)
+
+    def update(self, values: Dict[str, Any]):
+        self._call()
+        for path, value in values.items():
+            self._write(self.parts + [p for p in path.split("/") if p], value)
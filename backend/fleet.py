@@ -0,0 +1,146 @@
+"""Per-buoy state for a fleet of buoys.
+
+Readings carry a ``buoy_id``. Alongside the readings, a small registry
+collection keeps one document per buoy with its reading count, first and
+last reading times and its newest reading. Ingest updates the registry
+incrementally, so per-buoy status and the whole-fleet status are a point
+lookup and a scan of a few dozen documents, however much history is stored.
+
+Readings stored before fleet support have no ``buoy_id``; the first startup
+tags them with the default buoy and adds them to the registry
+(``adopt_untagged_readings``).
+"""
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# State document (in the migrations collection) claimed by the worker that
+# adopts readings stored before fleet support
+FLEET_ADOPTION_ID = "fleet_untagged_readings"
+
+
+def _latest_fields(reading: dict, fields: Iterable[str]) -> dict:
+    return {name: reading[name] for name in fields if name in reading}
+
+
+def fleet_updates(readings: List[dict], fields: Iterable[str]) -> List[UpdateOne]:
+    """Registry updates for newly stored readings, two per buoy in the batch.
+
+    The newest-reading update only applies when the reading is newer than
+    the stored one, so concurrent or out-of-order batches cannot move it back.
+    """
+    fields = list(fields)
+    by_buoy: Dict[str, List[dict]] = {}
+    for reading in readings:
+        by_buoy.setdefault(reading["buoy_id"], []).append(reading)
+    operations = []
+    for buoy_id, buoy_readings in by_buoy.items():
+        newest = max(buoy_readings, key=lambda r: r["timestamp"])
+        oldest = min(r["timestamp"] for r in buoy_readings)
+        operations += _buoy_updates(buoy_id, len(buoy_readings), oldest, newest, fields)
+    return operations
+
+
+def _buoy_updates(buoy_id: str, count: int, oldest, newest: dict, fields: List[str]) -> List[UpdateOne]:
+    return [
+        UpdateOne(
+            {"_id": buoy_id},
+            {
+                "$inc": {"total_readings": count},
+                "$min": {"first_reading": oldest},
+                "$max": {"last_reading": newest["timestamp"]},
+            },
+            upsert=True,
+        ),
+        UpdateOne(
+            {"_id": buoy_id, "$or": [
+                {"latest.timestamp": {"$lt": newest["timestamp"]}},
+                {"latest": {"$exists": False}},
+            ]},
+            {"$set": {"latest": _latest_fields(newest, fields)}},
+        ),
+    ]
+
+
+async def apply_fleet_updates(registry, readings: List[dict], fields: Iterable[str]):
+    operations = fleet_updates(readings, fields)
+    if operations:
+        await registry.bulk_write(operations, ordered=True)
+
+
+async def rebuild_fleet(readings, registry, fields: Iterable[str]) -> int:
+    """Recompute the registry from stored readings; returns the number of buoys.
+
+    The newest reading per buoy comes from a sort + $first group that
+    MongoDB answers from the (buoy_id, timestamp) index; the counts need a
+    full pass, which is fine for a maintenance command.
+    """
+    fields = list(fields)
+    latest = {}
+    async for row in readings.aggregate([
+        {"$match": {"timestamp": {"$type": "date"}}},
+        {"$sort": {"buoy_id": 1, "timestamp": -1}},
+        {"$group": {"_id": "$buoy_id", "latest": {"$first": "$$ROOT"}}},
+    ], allowDiskUse=True):
+        latest[row["_id"]] = _latest_fields(row["latest"], fields)
+
+    operations, buoy_ids = [], []
+    async for row in readings.aggregate([
+        {"$match": {"timestamp": {"$type": "date"}}},
+        {"$group": {
+            "_id": "$buoy_id",
+            "total_readings": {"$sum": 1},
+            "first_reading": {"$min": "$timestamp"},
+            "last_reading": {"$max": "$timestamp"},
+        }},
+    ], allowDiskUse=True):
+        if row["_id"] is None:
+            continue
+        buoy_ids.append(row["_id"])
+        operations.append(ReplaceOne({"_id": row["_id"]}, {**row, "latest": latest.get(row["_id"])}, upsert=True))
+    await registry.delete_many({"_id": {"$nin": buoy_ids}})
+    if operations:
+        await registry.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def adopt_untagged_readings(readings, registry, state, buoy_id: str, fields: Iterable[str]) -> Optional[int]:
+    """Tag readings stored without a ``buoy_id`` as ``buoy_id`` and count them in the registry.
+
+    Runs once per database: the first caller records it in ``state`` and
+    returns the number of readings adopted, later callers return None. The
+    registry is updated with increments, so readings stored meanwhile by
+    other workers are not lost. If this fails part-way, the claim is
+    released and the error raised; ``manage.py rebuild-fleet`` recomputes
+    the registry from scratch.
+    """
+    try:
+        await state.insert_one({"_id": FLEET_ADOPTION_ID, "buoy_id": buoy_id})
+    except DuplicateKeyError:
+        return None
+    try:
+        untagged = {"buoy_id": {"$exists": False}, "timestamp": {"$type": "date"}}
+        rows = await readings.aggregate([
+            {"$match": untagged},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "oldest": {"$min": "$timestamp"}}},
+        ]).to_list(length=1)
+        newest = await readings.find_one(untagged, sort=[("timestamp", -1)])
+        await readings.update_many({"buoy_id": {"$exists": False}}, {"$set": {"buoy_id": buoy_id}})
+        if not rows or newest is None:
+            return 0
+        await registry.bulk_write(
+            _buoy_updates(buoy_id, rows[0]["count"], rows[0]["oldest"], newest, list(fields)), ordered=True
+        )
+        await state.update_one({"_id": FLEET_ADOPTION_ID}, {"$set": {"adopted": rows[0]["count"]}})
+        return rows[0]["count"]
+    except Exception:
+        await state.delete_one({"_id": FLEET_ADOPTION_ID})
+        raise
+
+
+async def ensure_fleet_indexes(readings):
+    # Per-buoy history, latest and keyset pagination all walk this index
+    await readings.create_index(
+        [("buoy_id", 1), ("timestamp", -1), ("id", -1)], name="buoy_timestamp_id_desc"
+    )
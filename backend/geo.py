@@ -0,0 +1,122 @@
+"""GeoJSON positions and GPS track simplification for buoy readings.
+
+Readings store their position twice: the original ``gps_latitude`` /
+``gps_longitude`` floats and a GeoJSON ``location`` point backed by a
+``2dsphere`` index, which serves the area, radius and track queries.
+"""
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+LOCATION_FIELD = "location"
+# Radius MongoDB uses to convert $centerSphere distances to radians
+MONGO_EARTH_RADIUS_M = 6378100.0
+EARTH_RADIUS_M = 6371000.0
+
+
+def geojson_point(latitude: float, longitude: float) -> Optional[dict]:
+    """GeoJSON point for a GPS fix, or None if it is outside valid coordinates.
+
+    Out-of-range fixes (a GPS without lock can report garbage) are left
+    without a location rather than failing the 2dsphere index on insert.
+    """
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def bbox_filter(min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> dict:
+    """$geoWithin filter for a latitude/longitude box (not crossing the antimeridian)."""
+    ring = [
+        [min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]
+    ]
+    return {LOCATION_FIELD: {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+
+
+def radius_filter(latitude: float, longitude: float, radius_m: float) -> dict:
+    """$geoWithin filter for readings within ``radius_m`` metres of a point."""
+    return {LOCATION_FIELD: {"$geoWithin": {
+        "$centerSphere": [[longitude, latitude], radius_m / MONGO_EARTH_RADIUS_M]
+    }}}
+
+
+def distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Equirectangular distance, accurate to well under 1% over a few km."""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+def project_m(latitudes: np.ndarray, longitudes: np.ndarray):
+    """Project positions to metres on a plane tangent at the first position."""
+    lat0 = math.radians(latitudes[0])
+    x = np.radians(longitudes - longitudes[0]) * math.cos(lat0) * EARTH_RADIUS_M
+    y = np.radians(latitudes - latitudes[0]) * EARTH_RADIUS_M
+    return x, y
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Indexes of the vertices kept by Douglas-Peucker simplification.
+
+    Distances are to the segment rather than the infinite line, so a buoy
+    that swings out and back on itself keeps the turning point. Uses an
+    explicit stack (tracks can be far longer than the recursion limit) and
+    measures each span's interior points in one vectorized pass.
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return np.flatnonzero(keep)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        px, py = x[start + 1:end], y[start + 1:end]
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        length2 = dx * dx + dy * dy
+        if length2 == 0:
+            distances = np.hypot(px - x[start], py - y[start])
+        else:
+            t = np.clip(((px - x[start]) * dx + (py - y[start]) * dy) / length2, 0.0, 1.0)
+            distances = np.hypot(px - (x[start] + t * dx), py - (y[start] + t * dy))
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def simplify_track(points: List[Dict], tolerance_m: float) -> Dict:
+    """Simplify time-ordered ``{timestamp, gps_latitude, gps_longitude}`` points.
+
+    Points outside valid coordinates are dropped first. Returns the kept
+    points plus the path length of the full track.
+    """
+    points = [p for p in points if geojson_point(p["gps_latitude"], p["gps_longitude"])]
+    if not points:
+        return {"original_points": 0, "distance_m": 0.0, "points": []}
+    latitudes = np.fromiter((p["gps_latitude"] for p in points), dtype=float, count=len(points))
+    longitudes = np.fromiter((p["gps_longitude"] for p in points), dtype=float, count=len(points))
+    x, y = project_m(latitudes, longitudes)
+    kept = douglas_peucker(x, y, tolerance_m)
+    return {
+        "original_points": len(points),
+        "distance_m": float(np.hypot(np.diff(x), np.diff(y)).sum()),
+        "points": [
+            {"timestamp": points[i]["timestamp"], "latitude": points[i]["gps_latitude"],
+             "longitude": points[i]["gps_longitude"]}
+            for i in kept
+        ],
+    }
+
+
+async def ensure_geo_indexes(collection):
+    # Compound with timestamp so area queries over a time window stay indexed
+    await collection.create_index(
+        [(LOCATION_FIELD, "2dsphere"), ("timestamp", -1)], name="location_2dsphere_timestamp"
+    )
@@ -0,0 +1,104 @@
+"""HTTP conditional requests and short-lived response caching.
+
+Polling clients send back the ``ETag`` / ``Last-Modified`` of their last
+response; when nothing has changed they get an empty 304 instead of the same
+payload again. Validators are built from in-memory state (the newest ingest),
+so answering a revalidation does not touch Mongo.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+
+
+def strong_etag(*parts: Any) -> str:
+    """Opaque strong ETag derived from the given values."""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 specifies for GET)."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def is_not_modified(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Whether a request's validators still match; If-None-Match wins over If-Modified-Since."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        since = parse_http_date(if_modified_since)
+        # HTTP dates have whole-second resolution
+        return since is not None and last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    # no-cache: clients may store the response but must revalidate before reuse
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    modified_at: datetime
+    watermark: Hashable
+    created_at: float
+
+
+class ResponseCache:
+    """Rendered responses kept for ``ttl`` seconds or until the watermark moves.
+
+    The ETag is a hash of the body, so a response recomputed with identical
+    content keeps its ETag (and Last-Modified) and clients keep getting 304s.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, CachedResponse] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, watermark: Hashable) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry.watermark != watermark or time.monotonic() - entry.created_at >= self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, watermark: Hashable, body: bytes) -> CachedResponse:
+        etag = strong_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+        previous = self._entries.get(key)
+        modified_at = previous.modified_at if previous and previous.etag == etag else datetime.now(timezone.utc)
+        entry = CachedResponse(body, etag, modified_at, watermark, time.monotonic())
+        if self.ttl <= 0:
+            return entry
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,70 @@
+"""Idempotent ingest: recognising readings that were already stored.
+
+A client may send an ``idempotency_key`` with a reading (the LoRa gateway
+uses sender, message id and the reading's own timestamp, or a payload
+checksum scoped to the minute it was received). Keys of
+recently stored readings are kept in a bounded in-process LRU, so the common
+case (a retransmit seconds after the original) is answered without touching
+Mongo. The unique index on the key is the real guarantee: it catches repeats
+that fell out of the LRU or went to another worker. Time-series collections
+cannot have unique indexes, so there LRU misses are looked up before insert
+(which leaves a small window for concurrent repeats on different workers).
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+IDEMPOTENCY_FIELD = "idempotency_key"
+IDEMPOTENCY_INDEX = "idempotency_key_unique"
+
+
+class IdempotencyCache:
+    """LRU of idempotency key -> (reading id, timestamp) for stored readings."""
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[str, datetime]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[str, datetime]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def add(self, key: str, reading_id: str, timestamp: datetime):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (reading_id, timestamp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+def is_duplicate_key_error(error: dict) -> bool:
+    """Whether a bulk write error is a collision on the idempotency index."""
+    return error.get("code") == 11000 and IDEMPOTENCY_FIELD in str(error.get("keyPattern") or error.get("errmsg", ""))
+
+
+async def ensure_idempotency_index(collection, unique: bool = True):
+    """Index the key; without ``unique`` (time-series collections) callers must look keys up before inserting."""
+    if unique:
+        await collection.create_index(
+            IDEMPOTENCY_FIELD, unique=True, name=IDEMPOTENCY_INDEX,
+            partialFilterExpression={IDEMPOTENCY_FIELD: {"$type": "string"}},
+        )
+    else:
+        await collection.create_index(IDEMPOTENCY_FIELD, name=f"{IDEMPOTENCY_FIELD}_asc")
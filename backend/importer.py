@@ -0,0 +1,377 @@
+"""Bulk import of historical readings from CSV exports of the Google Sheet.
+
+``sendToGoogleSheet`` in Total_Code.ino appends one row per reading, in
+``SHEET_COLUMNS`` order. The timestamp is written as
+``YYYY-MM-DDTHH:MM:SS+05:30``, but the wall time comes from the GPS, which
+reports UTC, so by default (``utc_wall_clock``) it is read as UTC and the
+offset is ignored. Trusting the offset would shift every reading 5.5 hours
+early.
+
+Files are streamed in chunks with pandas. Each chunk is validated with
+column operations mirroring ``BuoyReadingCreate`` (invalid rows are
+counted and skipped) and written as unordered ``insert_many`` batches,
+several in flight at once. Reading ids are derived from a hash of the row's
+values, so rows that were already imported (overlapping exports, or a rerun
+after a crash) collide with stored ids and are skipped as duplicates.
+Rollups, the fleet registry and detection events are updated from each
+batch as it is stored, as ingest does. The number of rows finished in order
+is checkpointed, so an interrupted import resumes where it stopped.
+
+Rows stored before a crash are skipped as duplicates when the import
+resumes, so their derived writes could not be redone from the resumed run.
+Each batch therefore records the ids it is about to insert (and which
+derived writes are done) until all of them are; a resumed import first
+finishes those batches from the stored rows.
+"""
+import asyncio
+import csv
+import math
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pymongo.errors import BulkWriteError
+
+from detections import NO_DETECTION, apply_detections
+from fleet import apply_fleet_updates
+from geo import LOCATION_FIELD
+from rollups import apply_rollups
+
+IMPORT_ID_PREFIX = "csv_import"
+# Checkpoint documents of batches whose derived writes are not all done
+PENDING_BATCH_KIND = "import_batch"
+
+# Column order written by sendToGoogleSheet
+SHEET_COLUMNS = [
+    "gps_latitude", "gps_longitude", "water_temperature", "humidity", "air_pressure",
+    "water_turbidity", "battery_percentage", "detected_object_class", "timestamp",
+]
+
+NUMERIC_COLUMNS = [
+    "gps_latitude", "gps_longitude", "battery_percentage", "water_turbidity",
+    "water_temperature", "humidity", "air_pressure",
+]
+
+# Inclusive (min, max) bounds from BuoyReadingCreate
+BOUNDS = {
+    "battery_percentage": (0.0, 100.0),
+    "water_turbidity": (0.0, math.inf),
+    "humidity": (0.0, 100.0),
+    "air_pressure": (0.0, math.inf),
+}
+
+# Header names seen in sheet exports -> reading fields
+COLUMN_ALIASES = {
+    "latitude": "gps_latitude", "lat": "gps_latitude",
+    "longitude": "gps_longitude", "lng": "gps_longitude", "lon": "gps_longitude",
+    "temperature": "water_temperature", "water temperature": "water_temperature",
+    "pressure": "air_pressure", "air pressure": "air_pressure",
+    "turbidity": "water_turbidity", "water turbidity": "water_turbidity",
+    "battery": "battery_percentage", "battery percentage": "battery_percentage",
+    "object": "detected_object_class", "detected object": "detected_object_class", "class": "detected_object_class",
+    "time": "timestamp", "datetime": "timestamp", "date": "timestamp",
+}
+
+def detect_columns(path: str, columns: Optional[Sequence[str]] = None):
+    """Column names for ``path`` and whether its first line is a header.
+
+    A first line whose first cell is not a number is a header; its names
+    are mapped through ``COLUMN_ALIASES`` (unknown columns are ignored).
+    Without a header, ``columns`` (default ``SHEET_COLUMNS``) is used.
+    """
+    with open(path, newline="") as f:
+        first = next(csv.reader(f), [])
+    try:
+        float(first[0])
+        return list(columns or SHEET_COLUMNS), False
+    except (IndexError, ValueError):
+        pass
+    names = []
+    for cell in first:
+        name = cell.strip().lower().replace("_", " ")
+        field = name.replace(" ", "_")
+        names.append(field if field in SHEET_COLUMNS else COLUMN_ALIASES.get(name, f"ignored_{len(names)}"))
+    missing = set(SHEET_COLUMNS) - {"detected_object_class"} - set(names)
+    if missing:
+        raise ValueError(f"{path}: header has no column for {', '.join(sorted(missing))}")
+    return names, True
+
+
+def read_chunks(path: str, names: List[str], header: bool, chunk_size: int, skip_rows: int = 0):
+    """Iterate ``path`` as string DataFrames of ``chunk_size`` rows, after skipping ``skip_rows`` data rows.
+
+    Malformed lines are skipped (so a resumed import may re-read a few rows,
+    which then count as duplicates).
+    """
+    return pd.read_csv(
+        path, header=None, names=names, skiprows=skip_rows + (1 if header else 0),
+        usecols=[n for n in names if not n.startswith("ignored_")],
+        dtype=str, keep_default_na=False, chunksize=chunk_size, skipinitialspace=True,
+        on_bad_lines="skip",
+    )
+
+
+def _uuid_strings(high: np.ndarray, low: np.ndarray) -> List[str]:
+    """Format pairs of 64-bit hashes as UUID strings, hex-encoding all rows at once."""
+    words = np.stack([high, low], axis=1).astype(">u8")
+    digits = np.frombuffer(words.tobytes().hex().encode(), dtype=np.uint8).reshape(-1, 32)
+    dash = np.full((len(digits), 1), ord("-"), dtype=np.uint8)
+    formatted = np.hstack([digits[:, :8], dash, digits[:, 8:12], dash, digits[:, 12:16], dash,
+                           digits[:, 16:20], dash, digits[:, 20:]])
+    return np.ascontiguousarray(formatted).view("S36").ravel().astype(str).tolist()
+
+
+def validate_chunk(chunk: pd.DataFrame, buoy_id: str, utc_wall_clock: bool = True) -> pd.DataFrame:
+    """Typed, valid rows of a string chunk, with deterministic reading ids."""
+    frame = pd.DataFrame(index=chunk.index)
+    for name in NUMERIC_COLUMNS:
+        frame[name] = pd.to_numeric(chunk[name], errors="coerce")
+    raw_time = chunk["timestamp"].str.strip()
+    if utc_wall_clock:
+        frame["timestamp"] = pd.to_datetime(raw_time.str.slice(0, 19), format="%Y-%m-%dT%H:%M:%S",
+                                            errors="coerce", utc=True)
+    else:
+        frame["timestamp"] = pd.to_datetime(raw_time, format="ISO8601", errors="coerce", utc=True)
+    if "detected_object_class" in chunk:
+        classes = chunk["detected_object_class"].str.strip()
+        frame["detected_object_class"] = classes.where(~classes.str.lower().isin(NO_DETECTION), None)
+    else:
+        frame["detected_object_class"] = None
+
+    valid = frame["timestamp"].notna().to_numpy(copy=True)
+    for name in NUMERIC_COLUMNS:
+        values = frame[name].to_numpy()
+        valid &= np.isfinite(values)
+        if name in BOUNDS:
+            low, high = BOUNDS[name]
+            valid &= (values >= low) & (values <= high)
+    frame = frame[valid].copy()
+
+    frame["buoy_id"] = buoy_id
+    hashed = frame[NUMERIC_COLUMNS + ["timestamp", "detected_object_class", "buoy_id"]]
+    high = pd.util.hash_pandas_object(hashed, index=False, hash_key="buoy-import-id-0").to_numpy()
+    low = pd.util.hash_pandas_object(hashed, index=False, hash_key="buoy-import-id-1").to_numpy()
+    frame["id"] = _uuid_strings(high, low)
+    return frame
+
+
+def build_documents(frame: pd.DataFrame) -> List[dict]:
+    """Reading documents (as ingest stores them) for validated rows."""
+    columns = {
+        "id": frame["id"].tolist(),
+        "timestamp": list(frame["timestamp"].dt.to_pydatetime()),
+        "buoy_id": frame["buoy_id"].tolist(),
+        **{name: frame[name].tolist() for name in NUMERIC_COLUMNS},
+        # Missing classes come back from string columns as NaN
+        "detected_object_class": [
+            value if isinstance(value, str) else None for value in frame["detected_object_class"].tolist()
+        ],
+    }
+    latitudes = frame["gps_latitude"].to_numpy()
+    longitudes = frame["gps_longitude"].to_numpy()
+    positioned = (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+    locations = [
+        {"type": "Point", "coordinates": [lng, lat]}
+        for lng, lat in zip(columns["gps_longitude"], columns["gps_latitude"])
+    ]
+    if positioned.all():
+        columns[LOCATION_FIELD] = locations
+    keys = list(columns)
+    docs = [dict(zip(keys, row)) for row in zip(*columns.values())]
+    if not positioned.all():
+        # Out-of-range fixes get no location, as in prepare_for_mongo
+        for i in np.flatnonzero(positioned).tolist():
+            docs[i][LOCATION_FIELD] = locations[i]
+    return docs
+
+
+async def stored_ids(collection, docs: List[dict]) -> set:
+    """The ids of ``docs`` that are already stored."""
+    if not docs:
+        return set()
+    timestamps = [doc["timestamp"] for doc in docs]
+    return set(await collection.distinct("id", {
+        "id": {"$in": [doc["id"] for doc in docs]},
+        "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)},
+    }))
+
+
+async def insert_batch(collection, docs: List[dict]) -> dict:
+    """Insert one batch unordered; returns the stored documents and duplicate/failure counts.
+
+    Callers filter out ``stored_ids`` first (time-series collections have
+    no unique index on ``id``); duplicates here were stored meanwhile.
+    """
+    duplicates = failed = 0
+    if not docs:
+        return {"stored": [], "duplicates": duplicates, "failed": 0}
+    try:
+        await collection.insert_many(docs, ordered=False)
+        stored = docs
+    except BulkWriteError as e:
+        rejected = set()
+        for write_error in e.details.get("writeErrors", []):
+            rejected.add(write_error["index"])
+            if write_error.get("code") == 11000:
+                duplicates += 1
+            else:
+                failed += 1
+        stored = [doc for i, doc in enumerate(docs) if i not in rejected]
+    return {"stored": stored, "duplicates": duplicates, "failed": failed}
+
+
+async def import_csv(
+    path: str,
+    readings,
+    rollups,
+    registry,
+    events,
+    counts,
+    checkpoints,
+    metrics: Dict[str, str],
+    fields: Sequence[str],
+    buoy_id: str,
+    columns: Optional[Sequence[str]] = None,
+    chunk_size: int = 100000,
+    batch_size: int = 5000,
+    workers: int = 4,
+    utc_wall_clock: bool = True,
+    compacted_until: Optional[datetime] = None,
+    compactor=None,
+    restart: bool = False,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """Import one CSV file; returns cumulative totals (including earlier interrupted runs).
+
+    Up to ``workers`` batches are written concurrently while the next chunk
+    is parsed in a worker thread. ``fields`` are the reading fields kept as
+    a buoy's newest reading in the fleet registry. ``compactor`` (the
+    RetentionCompactor of an enabled retention policy) marks the imported
+    hours late, so compaction covers them again. Resuming with a different
+    ``utc_wall_clock`` than the earlier run raises ValueError, since the ids
+    (and timestamps) of the remaining rows would not match.
+    """
+    names, header = detect_columns(path, columns)
+    checkpoint_id = f"{IMPORT_ID_PREFIX}:{os.path.basename(path)}:{os.path.getsize(path)}"
+    if restart:
+        await checkpoints.delete_one({"_id": checkpoint_id})
+    checkpoint = await checkpoints.find_one({"_id": checkpoint_id}) or {}
+    # Checkpoints written before the default changed read the offset
+    if checkpoint and checkpoint.get("utc_wall_clock", False) != utc_wall_clock:
+        mode = "UTC wall-clock" if checkpoint.get("utc_wall_clock", False) else "offset"
+        raise ValueError(f"{path} was already imported with {mode} timestamps; import it in the same mode")
+    totals = {name: checkpoint.get(name, 0) for name in ("rows", "inserted", "duplicates", "invalid", "failed")}
+    resumed_rows = totals["rows"]
+
+    slots = asyncio.Semaphore(workers)
+    checkpoint_lock = asyncio.Lock()
+    tasks = set()
+    chunk_batches: Dict[int, int] = {}
+    chunk_rows: Dict[int, int] = {}
+    completed = resumed_rows
+    next_chunk = 0
+    errors: List[BaseException] = []
+    started = time.perf_counter()
+
+    async def finish_chunks():
+        """Checkpoint past every chunk whose batches (and all earlier chunks') are stored."""
+        nonlocal completed, next_chunk
+        async with checkpoint_lock:
+            advanced = False
+            while chunk_batches.get(next_chunk) == 0:
+                completed += chunk_rows.pop(next_chunk)
+                del chunk_batches[next_chunk]
+                next_chunk += 1
+                advanced = True
+            if advanced:
+                totals["rows"] = completed
+                await checkpoints.update_one(
+                    {"_id": checkpoint_id}, {"$set": {**totals, "utc_wall_clock": utc_wall_clock}}, upsert=True
+                )
+                if progress:
+                    elapsed = time.perf_counter() - started
+                    progress({**totals, "rows_per_second": (completed - resumed_rows) / elapsed})
+
+    async def derived_writes(pending_id: str, stored: List[dict], done: Sequence[str] = ()):
+        """Update rollups, registry and detections from stored rows, then drop the pending batch."""
+        async def update_rollups():
+            await apply_rollups(rollups, stored, metrics, compacted_until)
+            if compactor:
+                await compactor.mark_late(stored)
+
+        writes = {
+            "rollups": update_rollups,
+            "fleet": lambda: apply_fleet_updates(registry, stored, fields),
+            "detections": lambda: apply_detections(events, counts, stored),
+        }
+        for name, write in writes.items():
+            if name in done:
+                continue
+            if stored:
+                await write()
+            await checkpoints.update_one({"_id": pending_id}, {"$addToSet": {"done": name}})
+        await checkpoints.delete_one({"_id": pending_id})
+
+    # Batches an earlier run stored without finishing their derived writes
+    async for pending in checkpoints.find({"kind": PENDING_BATCH_KIND, "import": checkpoint_id}):
+        stored = await readings.find({"id": {"$in": pending["ids"]}}, {"_id": 0}).to_list(length=None)
+        await derived_writes(pending["_id"], stored, pending.get("done", []))
+
+    async def store(chunk_no: int, docs: List[dict]):
+        try:
+            existing = await stored_ids(readings, docs)
+            fresh = [doc for doc in docs if doc["id"] not in existing]
+            pending_id = f"{checkpoint_id}:batch:{uuid.uuid4().hex}"
+            if fresh:
+                await checkpoints.insert_one({
+                    "_id": pending_id, "kind": PENDING_BATCH_KIND, "import": checkpoint_id,
+                    "ids": [doc["id"] for doc in fresh], "done": [],
+                })
+            result = await insert_batch(readings, fresh)
+            result["duplicates"] += len(existing)
+            if fresh:
+                await derived_writes(pending_id, result["stored"])
+            totals["inserted"] += len(result["stored"])
+            totals["duplicates"] += result["duplicates"]
+            totals["failed"] += result["failed"]
+            chunk_batches[chunk_no] -= 1
+            await finish_chunks()
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            slots.release()
+
+    reader = read_chunks(path, names, header, chunk_size, resumed_rows)
+    chunk_no = 0
+    while not errors:
+        chunk = await asyncio.to_thread(next, reader, None)
+        if chunk is None:
+            break
+        frame = await asyncio.to_thread(validate_chunk, chunk, buoy_id, utc_wall_clock)
+        docs = await asyncio.to_thread(build_documents, frame)
+        totals["invalid"] += len(chunk) - len(frame)
+        batches = [docs[i:i + batch_size] for i in range(0, len(docs), batch_size)]
+        chunk_rows[chunk_no] = len(chunk)
+        chunk_batches[chunk_no] = len(batches)
+        if not batches:
+            await finish_chunks()
+        for batch in batches:
+            await slots.acquire()
+            if errors:
+                slots.release()
+                break
+            task = asyncio.create_task(store(chunk_no, batch))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        chunk_no += 1
+    if tasks:
+        await asyncio.gather(*tasks)
+    if errors:
+        raise errors[0]
+    totals["seconds"] = time.perf_counter() - started
+    totals["rows_per_second"] = (totals["rows"] - resumed_rows) / totals["seconds"] if totals["seconds"] else 0.0
+    return totals
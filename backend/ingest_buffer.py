@@ -0,0 +1,254 @@
+"""Durable store-and-forward buffer between the ingest endpoints and Mongo.
+
+With ``INGEST_BUFFER_PATH`` set, ingest writes readings to a local SQLite
+write-ahead log and acknowledges them once they are on disk; a background
+flusher drains the log into Mongo with bulk inserts. Mongo outages and
+latency spikes then delay when readings become visible instead of failing
+the request (and losing the reading, since the firmware keeps no copy).
+
+* Appends arriving while a commit is in progress are grouped into the next
+  transaction, so concurrent requests share one fsync.
+* Rows are deleted only after Mongo confirmed the batch. A crash in between
+  replays the batch on restart, and the flush callback must skip readings
+  that were already stored.
+* Once pending readings reach ``max_bytes``, appends raise ``BufferFull``
+  (the API answers 503 with ``Retry-After``) until the flusher catches up.
+"""
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+
+class BufferFull(Exception):
+    """The buffer's disk budget is used up."""
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def encode_reading(reading: dict) -> str:
+    return json.dumps(reading, default=_json_default, separators=(",", ":"))
+
+
+def decode_reading(row: str) -> dict:
+    reading = json.loads(row)
+    if isinstance(reading.get("timestamp"), str):
+        reading["timestamp"] = datetime.fromisoformat(reading["timestamp"])
+    return reading
+
+
+class IngestBuffer:
+    """SQLite-backed write-ahead log of readings waiting to be stored in Mongo.
+
+    ``flush`` is called with up to ``max_batch`` readings in ingest order
+    and should raise only for failures worth retrying; the batch is then
+    retried with exponential backoff and jitter.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush: Callable[[List[dict]], Awaitable[None]],
+        max_bytes: int = 256 * 1024 * 1024,
+        max_batch: int = 1000,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.path = path
+        self.flush = flush
+        self.max_bytes = max_bytes
+        self.max_batch = max_batch
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._appends: List[Tuple[List[Tuple[float, str]], asyncio.Future]] = []
+        self._append_bytes = 0
+        self._writer: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.pending = 0
+        self.pending_bytes = 0
+        self.oldest_enqueued_at: Optional[float] = None
+        self.appended = 0
+        self.commits = 0
+        self.flushed = 0
+        self.batches_flushed = 0
+        self.rejected = 0
+        self.retries = 0
+        self.recovered = 0
+        self.last_error: Optional[str] = None
+        self.last_flush_at: Optional[float] = None
+
+    # SQLite calls run in worker threads; the lock serializes them on the one connection
+
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        # FULL fsyncs the WAL on every commit, so an acknowledged reading survives power loss
+        db.execute("PRAGMA synchronous=FULL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS readings ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, enqueued_at REAL NOT NULL, doc TEXT NOT NULL)"
+        )
+        count, size, oldest = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(doc)), 0), MIN(enqueued_at) FROM readings"
+        ).fetchone()
+        self._db = db
+        self.pending, self.pending_bytes, self.oldest_enqueued_at = count, size, oldest
+        self.recovered = count
+
+    def _insert(self, rows: List[Tuple[float, str]]):
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("INSERT INTO readings (enqueued_at, doc) VALUES (?, ?)", rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _read_batch(self) -> List[Tuple[int, float, str]]:
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT seq, enqueued_at, doc FROM readings ORDER BY seq LIMIT ?", (self.max_batch,)
+            ).fetchall()
+
+    def _delete_through(self, seq: int) -> Optional[float]:
+        with self._db_lock:
+            self._db.execute("DELETE FROM readings WHERE seq <= ?", (seq,))
+            row = self._db.execute("SELECT enqueued_at FROM readings ORDER BY seq LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    async def append(self, readings: List[dict]):
+        """Durably queue readings; returns once they are committed to disk."""
+        now = time.time()
+        rows = [(now, encode_reading(reading)) for reading in readings]
+        size = sum(len(doc) for _, doc in rows)
+        if self.pending_bytes + self._append_bytes + size > self.max_bytes:
+            self.rejected += len(rows)
+            raise BufferFull(f"Ingest buffer is full ({self.pending_bytes} bytes pending)")
+        future = asyncio.get_running_loop().create_future()
+        self._appends.append((rows, future))
+        self._append_bytes += size
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._commit_appends())
+        await future
+
+    async def _commit_appends(self):
+        """Group commit: write every append queued so far in one transaction."""
+        while self._appends:
+            appends, self._appends = self._appends, []
+            rows = [row for append_rows, _ in appends for row in append_rows]
+            size = sum(len(doc) for _, doc in rows)
+            try:
+                await asyncio.to_thread(self._insert, rows)
+            except Exception as e:
+                logging.error(f"Error writing ingest buffer: {e}")
+                for _, future in appends:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self._append_bytes -= size
+            self.pending += len(rows)
+            self.pending_bytes += size
+            if self.oldest_enqueued_at is None:
+                self.oldest_enqueued_at = rows[0][0]
+            self.appended += len(rows)
+            self.commits += 1
+            for _, future in appends:
+                if not future.done():
+                    future.set_result(None)
+            self._wakeup.set()
+
+    def lag_seconds(self) -> float:
+        """Age of the oldest reading not yet stored in Mongo."""
+        return time.time() - self.oldest_enqueued_at if self.oldest_enqueued_at else 0.0
+
+    async def run(self):
+        """Flusher loop: drain the log into Mongo, backing off while flushes fail."""
+        attempt = 0
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.pending:
+                rows = await asyncio.to_thread(self._read_batch)
+                if not rows:
+                    break
+                try:
+                    await self.flush([decode_reading(doc) for _, _, doc in rows])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    attempt += 1
+                    self.retries += 1
+                    self.last_error = str(e)
+                    delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                    logging.warning(f"Ingest buffer flush failed ({e}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                    continue
+                attempt = 0
+                self.oldest_enqueued_at = await asyncio.to_thread(self._delete_through, rows[-1][0])
+                self.pending -= len(rows)
+                self.pending_bytes -= sum(len(doc) for _, _, doc in rows)
+                self.flushed += len(rows)
+                self.batches_flushed += 1
+                self.last_flush_at = time.time()
+
+    async def start(self):
+        """Open the log and start flushing, including anything left from a previous run."""
+        if self._task is not None:
+            return
+        await asyncio.to_thread(self._open)
+        if self.recovered:
+            logging.info(f"Ingest buffer: recovered {self.recovered} readings from {self.path}")
+            self._wakeup.set()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Give pending readings a chance to flush, then stop (the rest waits on disk)."""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self.pending or self._appends) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        with self._db_lock:
+            self._db.close()
+        self._db = None
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": True,
+            "path": self.path,
+            "pending": self.pending,
+            "pending_bytes": self.pending_bytes,
+            "max_bytes": self.max_bytes,
+            "lag_seconds": self.lag_seconds(),
+            "appended": self.appended,
+            "commits": self.commits,
+            "flushed": self.flushed,
+            "batches_flushed": self.batches_flushed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "recovered": self.recovered,
+            "last_error": self.last_error,
+            "last_flush_at": self.last_flush_at,
+        }
@@ -0,0 +1,514 @@
+"""Bridge LoRa buoy packets into the backend API.
+
+Frames use the layout written by ``sendMessage`` in LoRaServer.ino: one
+byte each of recipient, sender, message id and payload length, followed by
+the payload. Two payload formats are understood:
+
+* ASCII ``"TT.tt:HH.hh"`` (temperature and humidity) from the existing
+  sensor firmware. The remaining sensor and position fields are filled in
+  from the last full reading seen from the same sender, or from
+  ``--defaults``; a detection is never carried over, so ASCII readings
+  have none.
+* A 23-byte fixed-width binary payload carrying a complete reading (see
+  ``BINARY_PAYLOAD``). Its first byte is ``BINARY_MAGIC``, which can never
+  start an ASCII payload.
+
+Frames come from a serial port (the receiver writing raw frames with
+``Serial.write``), UDP datagrams, or a capture file that can be replayed for
+testing. Decoded readings are batched by count and age and forwarded to
+``/api/buoy/readings/batch``, each with an idempotency key built from the
+sender, message id and the payload's timestamp (or, for payloads without
+one, its checksum and receive-time window), so the API does not store a
+reading twice when several gateways hear the same packet or a capture of
+timestamped payloads is replayed. Readings keep their payload timestamp
+(or the time the gateway received them) and are attributed to buoy
+``lora-<sender>`` unless ``--defaults`` sets a ``buoy_id``.
+
+Run from the backend directory, e.g.
+``python lora_gateway.py replay capture.txt --speed 0``.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import struct
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import requests
+import typer
+
+try:
+    import serial
+    SERIAL_AVAILABLE = True
+except ImportError:
+    SERIAL_AVAILABLE = False
+
+GATEWAY_ADDRESS = 0x01
+HEADER = struct.Struct("<BBBB")
+
+# magic, object class, unix time (0 = use receive time), latitude and
+# longitude in 1e-7 degrees, temperature in 0.01 C, humidity in 0.01 %,
+# pressure in 0.1 hPa, turbidity in 0.1 NTU, battery in 0.5 %
+BINARY_MAGIC = 0xB1
+BINARY_PAYLOAD = struct.Struct("<BBIiihHHHB")
+OBJECT_CLASSES = (None, "marine_debris", "boat")
+
+# Payloads without their own timestamp are only deduplicated against copies
+# received within the same window: the message id wraps every 256 messages,
+# and a stable sensor legitimately repeats the same values later on
+CHECKSUM_DEDUPE_WINDOW = 60
+
+REQUIRED_FIELDS = (
+    "gps_latitude", "gps_longitude", "battery_percentage", "water_turbidity",
+    "water_temperature", "humidity", "air_pressure",
+)
+
+# Fields that describe a single frame and are never carried over to later
+# frames from the same sender (unlike sensor values and position)
+DETECTION_FIELDS = ("detected_object_class", "detection_confidence")
+
+cli = typer.Typer()
+
+
+class Frame(NamedTuple):
+    recipient: int
+    sender: int
+    msg_id: int
+    payload: bytes
+    received_at: float
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_frame(payload: bytes, sender: int, msg_id: int, recipient: int = GATEWAY_ADDRESS) -> bytes:
+    if len(payload) > 255:
+        raise FrameError(f"Payload too long: {len(payload)} bytes")
+    return HEADER.pack(recipient, sender, msg_id & 0xFF, len(payload)) + payload
+
+
+def parse_frame(data: bytes, received_at: Optional[float] = None) -> Frame:
+    """Parse exactly one frame (e.g. a UDP datagram)."""
+    if len(data) < HEADER.size:
+        raise FrameError("Frame shorter than its header")
+    recipient, sender, msg_id, length = HEADER.unpack_from(data)
+    if len(data) - HEADER.size != length:
+        raise FrameError(f"Payload length {len(data) - HEADER.size} does not match header ({length})")
+    return Frame(recipient, sender, msg_id, bytes(data[HEADER.size:]), received_at or time.time())
+
+
+class FrameReader:
+    """Split a byte stream (serial) into frames.
+
+    When ``address`` is set, bytes are skipped until a header addressed to it
+    is found, which resynchronises the stream after line noise.
+    """
+
+    def __init__(self, address: Optional[int] = GATEWAY_ADDRESS):
+        self.address = address
+        self.buffer = bytearray()
+        self.skipped_bytes = 0
+
+    def feed(self, data: bytes) -> List[Frame]:
+        self.buffer.extend(data)
+        frames = []
+        now = time.time()
+        while len(self.buffer) >= HEADER.size:
+            if self.address is not None and self.buffer[0] != self.address:
+                del self.buffer[0]
+                self.skipped_bytes += 1
+                continue
+            length = self.buffer[3]
+            end = HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            frames.append(parse_frame(bytes(self.buffer[:end]), now))
+            del self.buffer[:end]
+        return frames
+
+
+def decode_ascii_payload(payload: bytes) -> Dict[str, Any]:
+    try:
+        temperature, humidity = payload.decode("ascii").split(":")
+        return {"water_temperature": float(temperature), "humidity": float(humidity)}
+    except (UnicodeDecodeError, ValueError):
+        raise FrameError(f"Bad ASCII payload: {payload!r}")
+
+
+def decode_binary_payload(payload: bytes) -> Dict[str, Any]:
+    if len(payload) != BINARY_PAYLOAD.size:
+        raise FrameError(f"Binary payload must be {BINARY_PAYLOAD.size} bytes, got {len(payload)}")
+    (_, object_class, timestamp, latitude, longitude, temperature,
+     humidity, pressure, turbidity, battery) = BINARY_PAYLOAD.unpack(payload)
+    reading = {
+        "gps_latitude": latitude / 1e7,
+        "gps_longitude": longitude / 1e7,
+        "water_temperature": temperature / 100,
+        "humidity": humidity / 100,
+        "air_pressure": pressure / 10,
+        "water_turbidity": turbidity / 10,
+        "battery_percentage": battery / 2,
+        "detected_object_class": OBJECT_CLASSES[object_class] if object_class < len(OBJECT_CLASSES) else None,
+    }
+    if timestamp:
+        reading["timestamp"] = datetime.fromtimestamp(timestamp, timezone.utc)
+    return reading
+
+
+def encode_binary_payload(reading: Dict[str, Any], timestamp: Optional[datetime] = None) -> bytes:
+    """Pack a reading into the fixed-width binary payload (the sender side)."""
+    object_class = reading.get("detected_object_class")
+    return BINARY_PAYLOAD.pack(
+        BINARY_MAGIC,
+        OBJECT_CLASSES.index(object_class) if object_class in OBJECT_CLASSES else 0,
+        int(timestamp.timestamp()) if timestamp else 0,
+        round(reading["gps_latitude"] * 1e7),
+        round(reading["gps_longitude"] * 1e7),
+        round(reading["water_temperature"] * 100),
+        round(reading["humidity"] * 100),
+        round(reading["air_pressure"] * 10),
+        round(reading["water_turbidity"] * 10),
+        round(reading["battery_percentage"] * 2),
+    )
+
+
+def decode_payload(payload: bytes) -> Dict[str, Any]:
+    if payload[:1] == bytes([BINARY_MAGIC]):
+        return decode_binary_payload(payload)
+    return decode_ascii_payload(payload)
+
+
+async def serial_frames(port: str, baudrate: int = 9600,
+                        address: Optional[int] = GATEWAY_ADDRESS) -> AsyncIterator[Frame]:
+    """Frames read from a serial port (reads run in a worker thread)."""
+    if not SERIAL_AVAILABLE:
+        raise RuntimeError("pyserial is not installed")
+    connection = serial.Serial(port, baudrate, timeout=0.5)
+    reader = FrameReader(address)
+    try:
+        while True:
+            data = await asyncio.to_thread(connection.read, max(1, connection.in_waiting))
+            for frame in reader.feed(data):
+                yield frame
+    finally:
+        connection.close()
+
+
+async def udp_frames(host: str = "0.0.0.0", port: int = 1700) -> AsyncIterator[Frame]:
+    """Frames received as UDP datagrams, one frame per datagram."""
+    queue: asyncio.Queue = asyncio.Queue()
+
+    class Protocol(asyncio.DatagramProtocol):
+        def datagram_received(self, data, addr):
+            queue.put_nowait((data, time.time()))
+
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        Protocol, local_addr=(host, port)
+    )
+    try:
+        while True:
+            data, received_at = await queue.get()
+            try:
+                yield parse_frame(data, received_at)
+            except FrameError as e:
+                logging.warning(f"Dropping UDP datagram: {e}")
+    finally:
+        transport.close()
+
+
+def write_capture(path: str, frames: Iterable[Tuple[float, bytes]]):
+    """Write (seconds since start, raw frame) pairs as a replayable capture file."""
+    with open(path, "w") as f:
+        f.write("# offset_seconds frame_hex\n")
+        for offset, data in frames:
+            f.write(f"{offset:.3f} {data.hex()}\n")
+
+
+async def file_frames(path: str, speed: float = 1.0) -> AsyncIterator[Frame]:
+    """Replay a capture file, at ``speed`` times real time (0 = as fast as possible)."""
+    started = time.monotonic()
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            offset, data = line.split()
+            if speed:
+                delay = float(offset) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            try:
+                yield parse_frame(bytes.fromhex(data))
+            except (FrameError, ValueError) as e:
+                logging.warning(f"Skipping capture line {line!r}: {e}")
+
+
+def idempotency_key(frame: Frame, timestamp: Optional[datetime] = None) -> str:
+    """Key identifying one transmitted reading across retransmits and gateways.
+
+    The one-byte message id wraps, so it is paired with the reading's own
+    timestamp when the payload carries one. Otherwise it is paired with a
+    payload checksum and the ``CHECKSUM_DEDUPE_WINDOW`` the frame was
+    received in, so the key of a reading repeated after the id wrapped does
+    not collide with the original's (the unique index never expires).
+    """
+    if timestamp:
+        suffix = str(int(timestamp.timestamp()))
+    else:
+        window = int(frame.received_at // CHECKSUM_DEDUPE_WINDOW)
+        suffix = f"{zlib.crc32(frame.payload):08x}:{window}"
+    return f"lora:{frame.sender:02x}:{frame.msg_id}:{suffix}"
+
+
+class LoRaGateway:
+    """Decode frames into readings and forward them to the API in batches.
+
+    A batch is sent when ``max_batch`` readings are waiting or the oldest has
+    waited ``max_delay`` seconds. Failed posts are retried with exponential
+    backoff; while the API is down at most ``max_pending`` readings are kept
+    and the oldest are dropped beyond that.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        address: Optional[int] = GATEWAY_ADDRESS,
+        max_batch: int = 100,
+        max_delay: float = 1.0,
+        max_pending: int = 10000,
+        defaults: Optional[Dict[str, Any]] = None,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.address = address
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.defaults = defaults or {}
+        self.session = requests.Session()
+
+        self._last_known: Dict[int, Dict[str, Any]] = {}
+        self._last_frame: Dict[int, Tuple[int, bytes]] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_since = 0.0
+        self._has_data = asyncio.Event()
+        self._full = asyncio.Event()
+
+        self.frames = 0
+        self.decoded = 0
+        self.not_for_us = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.incomplete = 0
+        self.forwarded = 0
+        self.rejected = 0
+        self.already_stored = 0
+        self.dropped = 0
+        self.retries = 0
+        self.batches_sent = 0
+
+    def handle(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        """Decode one frame into an API reading, or None if it is skipped."""
+        self.frames += 1
+        if self.address is not None and frame.recipient != self.address:
+            self.not_for_us += 1
+            return None
+        # The firmware retries blindly, so a repeat of the previous frame is a retransmit
+        key = (frame.msg_id, frame.payload)
+        if self._last_frame.get(frame.sender) == key:
+            self.duplicates += 1
+            return None
+        self._last_frame[frame.sender] = key
+        try:
+            decoded = decode_payload(frame.payload)
+        except FrameError as e:
+            self.invalid += 1
+            logging.warning(f"Sender {frame.sender:#04x} msg {frame.msg_id}: {e}")
+            return None
+
+        timestamp = decoded.pop("timestamp", None)
+        detection = {field: decoded.pop(field, None) for field in DETECTION_FIELDS}
+        state = self._last_known.setdefault(frame.sender, {})
+        state.update(decoded)
+        reading = {**self.defaults, **state, **detection}
+        if any(reading.get(field) is None for field in REQUIRED_FIELDS):
+            self.incomplete += 1
+            return None
+        # The measurement time travels with the reading, so a backlog forwarded
+        # after an outage is stored at the time it was measured; payloads
+        # without a clock are stamped when the gateway received them
+        reading["timestamp"] = (timestamp or datetime.fromtimestamp(frame.received_at, timezone.utc)).isoformat()
+        reading.setdefault("buoy_id", f"lora-{frame.sender:02x}")
+        reading["idempotency_key"] = idempotency_key(frame, timestamp)
+        self.decoded += 1
+        return reading
+
+    def enqueue(self, reading: Dict[str, Any]):
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.append(reading)
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            self.dropped += overflow
+        self._has_data.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    def _post(self, batch: List[Dict[str, Any]]) -> dict:
+        response = self.session.post(f"{self.api_url}/api/buoy/readings/batch", json=batch, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    async def _send(self, batch: List[Dict[str, Any]]):
+        """Post one batch, retrying until it is accepted or rejected by the API."""
+        attempt = 0
+        while True:
+            try:
+                result = await asyncio.to_thread(self._post, batch)
+            except requests.HTTPError as e:
+                if e.response is not None and 400 <= e.response.status_code < 500:
+                    logging.error(f"API rejected batch of {len(batch)}: {e}")
+                    self.rejected += len(batch)
+                    return
+                error = e
+            except requests.RequestException as e:
+                error = e
+            else:
+                self.batches_sent += 1
+                self.forwarded += result.get("inserted", 0)
+                self.rejected += result.get("failed", 0)
+                self.already_stored += result.get("duplicates", 0)
+                return
+            attempt += 1
+            self.retries += 1
+            delay = min(30.0, 0.5 * 2 ** (attempt - 1))
+            logging.warning(f"Forwarding failed ({error}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def forward(self):
+        """Forwarder loop: send a batch whenever one is full or old enough."""
+        while True:
+            await self._has_data.wait()
+            wait = self.max_delay - (time.monotonic() - self._pending_since)
+            if len(self._pending) < self.max_batch and wait > 0:
+                try:
+                    await asyncio.wait_for(self._full.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush_batch()
+
+    async def flush_batch(self):
+        batch = self._pending[:self.max_batch]
+        del self._pending[:self.max_batch]
+        self._full.clear()
+        if self._pending:
+            self._pending_since = time.monotonic()
+            if len(self._pending) >= self.max_batch:
+                self._full.set()
+        else:
+            self._has_data.clear()
+        if batch:
+            await self._send(batch)
+
+    async def run(self, frames: AsyncIterator[Frame]):
+        """Consume a frame source until it ends, then flush what is left."""
+        forwarder = asyncio.create_task(self.forward())
+        try:
+            async for frame in frames:
+                reading = self.handle(frame)
+                if reading is not None:
+                    self.enqueue(reading)
+        finally:
+            forwarder.cancel()
+            try:
+                await forwarder
+            except asyncio.CancelledError:
+                pass
+        while self._pending:
+            await self.flush_batch()
+
+    def metrics(self) -> dict:
+        return {
+            "frames": self.frames,
+            "decoded": self.decoded,
+            "not_for_us": self.not_for_us,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "incomplete": self.incomplete,
+            "forwarded": self.forwarded,
+            "rejected": self.rejected,
+            "already_stored": self.already_stored,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "batches_sent": self.batches_sent,
+            "pending": len(self._pending),
+        }
+
+
+def run_gateway(ctx: typer.Context, frames: AsyncIterator[Frame]):
+    gateway = LoRaGateway(**ctx.obj)
+    try:
+        asyncio.run(gateway.run(frames))
+    except KeyboardInterrupt:
+        pass
+    typer.echo(json.dumps(gateway.metrics()))
+
+
+@cli.callback()
+def main(
+    ctx: typer.Context,
+    api_url: str = typer.Option(os.environ.get('BUOY_API_URL', 'http://localhost:8001'), help="Backend base URL"),
+    address: int = typer.Option(GATEWAY_ADDRESS, help="Gateway LoRa address (-1 accepts every recipient)"),
+    max_batch: int = typer.Option(100, help="Readings per forwarded batch"),
+    max_delay: float = typer.Option(1.0, help="Longest a reading waits before its batch is sent"),
+    defaults: Optional[str] = typer.Option(None, help="JSON reading fields used until a full reading is seen"),
+):
+    """Forward LoRa buoy packets to the backend API."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    ctx.obj = {
+        "api_url": api_url,
+        "address": None if address < 0 else address,
+        "max_batch": max_batch,
+        "max_delay": max_delay,
+        "defaults": json.loads(defaults) if defaults else None,
+    }
+
+
+@cli.command("serial")
+def serial_command(
+    ctx: typer.Context,
+    port: str,
+    baudrate: int = typer.Option(9600, help="Serial baud rate"),
+):
+    """Read raw frames from a serial port."""
+    address = ctx.obj["address"]
+    run_gateway(ctx, serial_frames(port, baudrate, address))
+
+
+@cli.command("udp")
+def udp_command(
+    ctx: typer.Context,
+    host: str = typer.Option("0.0.0.0", help="Address to listen on"),
+    port: int = typer.Option(1700, help="UDP port to listen on"),
+):
+    """Receive one frame per UDP datagram."""
+    run_gateway(ctx, udp_frames(host, port))
+
+
+@cli.command("replay")
+def replay_command(
+    ctx: typer.Context,
+    path: str,
+    speed: float = typer.Option(1.0, help="Replay speed relative to capture time (0 = as fast as possible)"),
+):
+    """Replay a capture file written by ``write_capture``."""
+    run_gateway(ctx, file_frames(path, speed))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,379 @@
+"""Maintenance commands for the IoT Buoy backend.
+
+Run from the backend directory, e.g. ``python manage.py migrate-timestamps``.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import typer
+from pymongo import UpdateOne
+
+from fastapi.encoders import jsonable_encoder
+from detections import rebuild_detections
+from fleet import rebuild_fleet
+from geo import LOCATION_FIELD, geojson_point
+from importer import import_csv
+from retention import RetentionCompactor, retention_report
+from rollups import (
+    GRANULARITIES, active_rollup_writers, ceil_time, extend_rollup_coverage, floor_time, load_rollup_coverage,
+    rebuild_rollups
+)
+from server import (
+    db, client, to_utc, ensure_indexes, readings_collection, SUMMARY_METRICS, RETENTION_POLICY,
+    READINGS_COLLECTION, DEFAULT_BUOY_ID, BuoyReading, WORKER_HEARTBEAT_INTERVAL
+)
+from timeseries import MIGRATION_ID_PREFIX, copy_to_timeseries, ensure_timeseries_collection
+
+cli = typer.Typer()
+
+TIMESTAMP_MIGRATION_ID = "timestamps_to_datetime"
+
+
+@cli.callback()
+def main():
+    """IoT Buoy backend maintenance commands."""
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """Parse a legacy ISO timestamp string, returning None if it is malformed."""
+    try:
+        return to_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+    except ValueError:
+        return None
+
+
+async def migrate_collection_timestamps(collection_name: str, batch_size: int, pause: float) -> int:
+    """Convert string timestamps in one collection to BSON datetimes, batch by batch.
+
+    Progress is checkpointed (last converted ``_id``) in the ``migrations``
+    collection so an interrupted run resumes where it stopped. Each update is
+    conditional on the stored string, so the migration is safe to run while the
+    API is serving traffic.
+    """
+    collection = db[collection_name]
+    checkpoint_id = f"{TIMESTAMP_MIGRATION_ID}:{collection_name}"
+    checkpoint = await db.migrations.find_one({"_id": checkpoint_id}) or {}
+    last_id = checkpoint.get("last_id")
+    converted = checkpoint.get("converted", 0)
+
+    while True:
+        query = {"timestamp": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await collection.find(query, {"timestamp": 1})\
+            .sort("_id", 1)\
+            .limit(batch_size)\
+            .to_list(length=batch_size)
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            parsed = parse_timestamp(doc["timestamp"])
+            if parsed is None:
+                logging.warning(f"Skipping {collection_name} {doc['_id']}: bad timestamp {doc['timestamp']!r}")
+                continue
+            operations.append(UpdateOne(
+                {"_id": doc["_id"], "timestamp": doc["timestamp"]},
+                {"$set": {"timestamp": parsed}}
+            ))
+        if operations:
+            result = await collection.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+
+        last_id = docs[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id, "converted": converted}},
+            upsert=True
+        )
+        typer.echo(f"{collection_name}: {converted} documents converted")
+        if pause:
+            await asyncio.sleep(pause)
+
+    return converted
+
+
+@cli.command("migrate-timestamps")
+def migrate_timestamps(
+    batch_size: int = typer.Option(1000, help="Documents converted per batch"),
+    pause: float = typer.Option(0.0, help="Seconds to sleep between batches to throttle load"),
+    collections: List[str] = typer.Option([READINGS_COLLECTION, "status_checks"], "--collection", help="Collections to migrate"),
+    restart: bool = typer.Option(False, help="Ignore saved checkpoints and rescan from the beginning"),
+):
+    """Convert legacy ISO-string timestamps to native BSON datetimes."""
+    async def run():
+        await ensure_indexes()
+        for collection_name in collections:
+            if restart:
+                await db.migrations.delete_one({"_id": f"{TIMESTAMP_MIGRATION_ID}:{collection_name}"})
+            total = await migrate_collection_timestamps(collection_name, batch_size, pause)
+            typer.echo(f"{collection_name}: done, {total} documents converted")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("backfill-locations")
+def backfill_locations(
+    batch_size: int = typer.Option(1000, help="Readings updated per batch"),
+    pause: float = typer.Option(0.0, help="Seconds to sleep between batches to throttle load"),
+):
+    """Add the GeoJSON location used by the 2dsphere index to readings stored without one."""
+    async def run():
+        await ensure_indexes()
+        last_id = None
+        updated = 0
+        while True:
+            query = {LOCATION_FIELD: {"$exists": False}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            docs = await readings_collection.find(query, {"gps_latitude": 1, "gps_longitude": 1})\
+                .sort("_id", 1)\
+                .limit(batch_size)\
+                .to_list(length=batch_size)
+            if not docs:
+                break
+            operations = []
+            for doc in docs:
+                location = geojson_point(doc["gps_latitude"], doc["gps_longitude"])
+                if location is None:
+                    logging.warning(f"Skipping reading {doc['_id']}: invalid position")
+                    continue
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {LOCATION_FIELD: location}}))
+            if operations:
+                result = await readings_collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+            last_id = docs[-1]["_id"]
+            typer.echo(f"{readings_collection.name}: {updated} locations added")
+            if pause:
+                await asyncio.sleep(pause)
+        typer.echo(f"{readings_collection.name}: done, {updated} locations added")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("rebuild-fleet")
+def rebuild_fleet_command(
+    default_buoy_id: str = typer.Option(DEFAULT_BUOY_ID, help="buoy_id given to readings stored without one"),
+):
+    """Tag readings stored without a buoy_id and rebuild the per-buoy registry behind the fleet endpoints."""
+    async def run():
+        await ensure_indexes()
+        result = await readings_collection.update_many(
+            {"buoy_id": {"$exists": False}}, {"$set": {"buoy_id": default_buoy_id}}
+        )
+        typer.echo(f"{readings_collection.name}: {result.modified_count} readings tagged {default_buoy_id}")
+        buoys = await rebuild_fleet(readings_collection, db.buoy_fleet, BuoyReading.model_fields)
+        typer.echo(f"Rebuilt the registry for {buoys} buoys")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("rebuild-detections")
+def rebuild_detections_command():
+    """Recreate detection events and per-class counts from the stored readings."""
+    async def run():
+        await ensure_indexes()
+        events = await rebuild_detections(
+            readings_collection, db.detection_events, db.detection_counts,
+            progress=lambda total: typer.echo(f"{total} detection events")
+        )
+        typer.echo(f"Rebuilt {events} detection events")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("import-csv")
+def import_csv_command(
+    paths: List[str] = typer.Argument(..., help="CSV exports of the Google Sheet"),
+    buoy_id: str = typer.Option(DEFAULT_BUOY_ID, help="buoy_id given to the imported readings"),
+    columns: Optional[str] = typer.Option(
+        None, help="Comma-separated reading fields of header-less files (default: the sendToGoogleSheet order)"
+    ),
+    utc_wall_clock: bool = typer.Option(
+        True, "--utc-wall-clock/--trust-offset",
+        help="Read timestamps as UTC, ignoring the +05:30 the firmware appends to GPS (UTC) times",
+    ),
+    chunk_size: int = typer.Option(100000, help="Rows parsed and validated per chunk"),
+    batch_size: int = typer.Option(5000, help="Readings per insert_many"),
+    workers: int = typer.Option(4, help="Batches inserted concurrently"),
+    restart: bool = typer.Option(False, help="Ignore saved checkpoints and import from the first row"),
+):
+    """Import historical readings from Google Sheet CSV exports (resumable; repeated rows are skipped)."""
+    async def run():
+        await ensure_indexes()
+        compactor = RetentionCompactor(
+            readings_collection, db.buoy_rollups, db.retention, SUMMARY_METRICS, RETENTION_POLICY
+        )
+        compacted_until = await compactor.load_watermark()
+        for path in paths:
+            def progress(totals: dict):
+                typer.echo(f"{path}: {totals['rows']} rows, {totals['inserted']} inserted, "
+                           f"{totals['duplicates']} duplicates, {totals['invalid']} invalid, "
+                           f"{totals['rows_per_second']:.0f} rows/s")
+
+            try:
+                totals = await import_csv(
+                    path, readings_collection, db.buoy_rollups, db.buoy_fleet,
+                    db.detection_events, db.detection_counts, db.migrations,
+                    SUMMARY_METRICS, BuoyReading.model_fields, buoy_id,
+                    columns=columns.split(",") if columns else None,
+                    chunk_size=chunk_size, batch_size=batch_size, workers=workers,
+                    utc_wall_clock=utc_wall_clock,
+                    compacted_until=compacted_until, compactor=compactor if RETENTION_POLICY.enabled else None,
+                    restart=restart, progress=progress,
+                )
+            except ValueError as e:
+                typer.echo(f"Error: {e}", err=True)
+                raise typer.Exit(1)
+            typer.echo(f"{path}: done, {totals['rows']} rows, {totals['inserted']} inserted, "
+                       f"{totals['duplicates']} duplicates, {totals['invalid']} invalid, "
+                       f"{totals['failed']} failed in {totals['seconds']:.1f}s "
+                       f"({totals['rows_per_second']:.0f} rows/s)")
+        if RETENTION_POLICY.raw_days:
+            typer.echo(f"Note: raw readings older than {RETENTION_POLICY.raw_days} days expire; "
+                       f"their rollups are kept")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("migrate-timeseries")
+def migrate_timeseries(
+    target: str = typer.Option("buoy_readings_ts", help="Time-series collection to copy readings into"),
+    batch_size: int = typer.Option(5000, help="Readings copied per batch"),
+    granularity: str = typer.Option("seconds", help="Time-series bucket granularity (seconds, minutes, hours)"),
+    restart: bool = typer.Option(False, help="Ignore the saved checkpoint and copy from the beginning"),
+):
+    """Copy readings from the current collection into a new time-series collection."""
+    async def run():
+        source = readings_collection
+        target_collection = db[target]
+        if not await ensure_timeseries_collection(target_collection, granularity):
+            raise typer.Exit(1)
+        if restart:
+            await db.migrations.delete_one({"_id": f"{MIGRATION_ID_PREFIX}:{source.name}:{target}"})
+
+        def progress(copied: int, skipped: int):
+            typer.echo(f"{target}: {copied} readings copied, {skipped} skipped")
+
+        totals = await copy_to_timeseries(source, target_collection, db.migrations, batch_size, progress)
+        typer.echo(f"{target}: done, {totals['copied']} readings copied, {totals['skipped']} skipped")
+        # Readings stored meanwhile are picked up by running the command again
+        typer.echo(f"Run again to catch up, then start the backend with READINGS_COLLECTION={target} "
+                   f"READINGS_TIMESERIES=true to serve from it (indexes are created on startup)")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("rebuild-rollups")
+def rebuild_rollups_command(
+    start: Optional[str] = typer.Option(None, help="ISO start of the range (default: oldest reading)"),
+    end: Optional[str] = typer.Option(None, help="ISO end of the range (default: newest reading)"),
+    workers: int = typer.Option(4, help="Day chunks rebuilt concurrently"),
+):
+    """Recompute hourly and daily rollups from raw readings in parallel day chunks.
+
+    Stop the backend first: readings stored during a rebuild would be lost
+    from the rollups, so the command refuses to run while a worker is up.
+    """
+    async def run():
+        await ensure_indexes()
+        # A missed heartbeat or two is not enough to call a worker stopped
+        writers = await active_rollup_writers(db.rollup_writers, timedelta(seconds=3 * WORKER_HEARTBEAT_INTERVAL))
+        if writers:
+            hosts = ", ".join(f"{w.get('host')} (pid {w.get('pid')})" for w in writers)
+            typer.echo(f"Error: backend workers are still storing readings: {hosts}. Stop them first.", err=True)
+            raise typer.Exit(1)
+        if start:
+            start_dt = parse_timestamp(start)
+        else:
+            oldest = await readings_collection.find_one({"timestamp": {"$type": "date"}}, sort=[("timestamp", 1)])
+            start_dt = oldest["timestamp"] if oldest else None
+        if end:
+            end_dt = parse_timestamp(end)
+        else:
+            newest = await readings_collection.find_one({"timestamp": {"$type": "date"}}, sort=[("timestamp", -1)])
+            end_dt = newest["timestamp"] + timedelta(milliseconds=1) if newest else None
+        if start_dt is None or end_dt is None:
+            typer.echo("No readings to roll up")
+            return
+        # Days that have partly expired would be rebuilt from incomplete raw
+        # data, overwriting rollups that are meant to be kept forever
+        raw_cutoff = RETENTION_POLICY.cutoffs(datetime.now(timezone.utc))["raw"]
+        if raw_cutoff and start_dt < raw_cutoff:
+            start_dt = ceil_time(raw_cutoff + timedelta(hours=1), GRANULARITIES["day"])
+            typer.echo(f"Raw readings expire after {RETENTION_POLICY.raw_days} days; starting at {start_dt}")
+            if start_dt >= end_dt:
+                return
+
+        def progress(day: datetime, hours: int):
+            typer.echo(f"{day.date()}: {hours} hourly buckets")
+
+        covered_from = await load_rollup_coverage(db.migrations, readings_collection)
+        hours = await rebuild_rollups(
+            readings_collection, db.buoy_rollups, start_dt, end_dt, SUMMARY_METRICS,
+            workers=workers, progress=progress
+        )
+        typer.echo(f"Rebuilt {hours} hourly buckets between {start_dt} and {end_dt}")
+        # Whole days are rebuilt, so rollups are now complete from the first one
+        day = GRANULARITIES["day"]
+        if covered_from and ceil_time(end_dt, day) >= covered_from and floor_time(start_dt, day) < covered_from:
+            await extend_rollup_coverage(db.migrations, floor_time(start_dt, day))
+            typer.echo(f"Rollups now cover readings from {floor_time(start_dt, day)} (restart the backend to use them)")
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+@cli.command("retention")
+def retention_command(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only report what each tier would reclaim"),
+):
+    """Apply the retention TTL indexes and catch up compaction, or report with --dry-run."""
+    async def run():
+        compactor = RetentionCompactor(
+            readings_collection, db.buoy_rollups, db.retention, SUMMARY_METRICS, RETENTION_POLICY
+        )
+        await compactor.load_watermark()
+        if not dry_run:
+            await ensure_indexes()
+            if RETENTION_POLICY.enabled:
+                buckets = await compactor.compact_once()
+                typer.echo(f"Compacted {buckets} minute buckets up to {compactor.compacted_until}")
+        report = await retention_report(
+            readings_collection, db.buoy_rollups, RETENTION_POLICY, compactor.compacted_until
+        )
+        report["policy"] = RETENTION_POLICY.model_dump()
+        typer.echo(json.dumps(jsonable_encoder(report), indent=2))
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    cli()
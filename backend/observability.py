@@ -0,0 +1,246 @@
+"""Prometheus metrics and on-demand profiling for the buoy API.
+
+Everything here degrades to a no-op when ``prometheus_client`` is not
+installed, so instrumentation calls can stay in the hot paths unconditionally.
+"""
+import asyncio
+import collections
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from pymongo import monitoring
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+if PROMETHEUS_AVAILABLE:
+    REQUEST_LATENCY = Histogram(
+        "buoy_http_request_duration_seconds", "HTTP request latency by route template",
+        ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+    )
+    READINGS_INGESTED = Counter(
+        "buoy_readings_ingested_total", "Readings stored, by ingest endpoint", ["endpoint"]
+    )
+    READINGS_REJECTED = Counter(
+        "buoy_readings_rejected_total", "Readings that failed validation or insert, by ingest endpoint", ["endpoint"]
+    )
+    READINGS_DUPLICATE = Counter(
+        "buoy_readings_duplicate_total", "Repeated readings recognised by idempotency key, by endpoint and "
+        "where the repeat was caught (cache or index)", ["endpoint", "source"]
+    )
+    ALERTS_RAISED = Counter("buoy_alerts_raised_total", "Alerts raised by the ingest alert engine", ["type"])
+    MONGO_COMMAND_LATENCY = Histogram(
+        "buoy_mongo_command_duration_seconds", "MongoDB command latency as seen by the driver",
+        ["command", "outcome"], buckets=LATENCY_BUCKETS,
+    )
+    FIREBASE_SYNC_LATENCY = Histogram(
+        "buoy_firebase_sync_duration_seconds", "Latency of Firebase multi-path updates",
+        ["outcome"], buckets=LATENCY_BUCKETS,
+    )
+    FIREBASE_SYNC_FAILURES = Counter("buoy_firebase_sync_failures_total", "Failed Firebase updates")
+    FIREBASE_QUEUE_DEPTH = Gauge("buoy_firebase_sync_queue_depth", "Entries waiting for Firebase")
+    FIREBASE_LAG = Gauge("buoy_firebase_sync_lag_seconds", "Age of the oldest entry not yet in Firebase")
+    INGEST_BUFFER_PENDING = Gauge("buoy_ingest_buffer_pending", "Readings in the local ingest buffer not yet in Mongo")
+    INGEST_BUFFER_BYTES = Gauge("buoy_ingest_buffer_pending_bytes", "Size of the readings waiting in the ingest buffer")
+    INGEST_BUFFER_LAG = Gauge("buoy_ingest_buffer_lag_seconds", "Age of the oldest reading not yet flushed to Mongo")
+    EVENT_LOOP_LAG = Histogram(
+        "buoy_event_loop_lag_seconds", "How late the event loop ran a timer callback",
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+    )
+
+
+def record_ingest(endpoint: str, stored: int, rejected: int = 0):
+    if PROMETHEUS_AVAILABLE:
+        if stored:
+            READINGS_INGESTED.labels(endpoint).inc(stored)
+        if rejected:
+            READINGS_REJECTED.labels(endpoint).inc(rejected)
+
+
+def record_duplicates(endpoint: str, source: str, count: int = 1):
+    if PROMETHEUS_AVAILABLE:
+        READINGS_DUPLICATE.labels(endpoint, source).inc(count)
+
+
+def record_alerts(alerts):
+    if PROMETHEUS_AVAILABLE:
+        for alert in alerts:
+            ALERTS_RAISED.labels(alert.type).inc()
+
+
+def record_firebase_sync(seconds: float, ok: bool):
+    if PROMETHEUS_AVAILABLE:
+        FIREBASE_SYNC_LATENCY.labels("ok" if ok else "error").observe(seconds)
+        if not ok:
+            FIREBASE_SYNC_FAILURES.inc()
+
+
+def track_firebase_queue(queue):
+    """Export a FirebaseSyncQueue's depth and lag, read at scrape time."""
+    if PROMETHEUS_AVAILABLE:
+        FIREBASE_QUEUE_DEPTH.set_function(lambda: queue.depth)
+        FIREBASE_LAG.set_function(queue.lag_seconds)
+
+
+def track_ingest_buffer(buffer):
+    """Export an IngestBuffer's backlog and lag, read at scrape time."""
+    if PROMETHEUS_AVAILABLE:
+        INGEST_BUFFER_PENDING.set_function(lambda: buffer.pending)
+        INGEST_BUFFER_BYTES.set_function(lambda: buffer.pending_bytes)
+        INGEST_BUFFER_LAG.set_function(buffer.lag_seconds)
+
+
+def render_metrics() -> bytes:
+    return generate_latest() if PROMETHEUS_AVAILABLE else b""
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Motor/pymongo command listener timing every command by name.
+
+    Pass an instance in the client's ``event_listeners``. Durations come from
+    the driver's own measurement, so they cover server time plus network.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if PROMETHEUS_AVAILABLE:
+            MONGO_COMMAND_LATENCY.labels(event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        if PROMETHEUS_AVAILABLE:
+            MONGO_COMMAND_LATENCY.labels(event.command_name, "error").observe(event.duration_micros / 1e6)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Sleep ``interval`` repeatedly and record how much later than asked we woke up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = loop.time() - started - interval
+        if PROMETHEUS_AVAILABLE:
+            EVENT_LOOP_LAG.observe(max(0.0, lag))
+
+
+class RouteProfiler:
+    """Sampling profiler for one route, switched on and off at runtime.
+
+    While enabled, a thread samples the event-loop thread's stack every
+    ``interval`` seconds and keeps the samples whose stack runs through the
+    target route's handler, aggregated as collapsed stacks (the input format
+    of flamegraph tools). Only CPU time inside the handler shows up; time the
+    handler spends awaiting I/O is not on the stack and is not sampled.
+    """
+
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.interval = 0.005
+        self.samples: Dict[str, int] = collections.Counter()
+        self.total_samples = 0
+        self.started_at: Optional[float] = None
+        self.stop_at: Optional[float] = None
+        self._code = None
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, route: str, endpoint: Callable, interval: float = 0.005, duration: Optional[float] = None):
+        """Start sampling ``route`` (a path template); call from the event loop thread."""
+        self.stop()
+        self.route = route
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.total_samples = 0
+        self.started_at = time.time()
+        self.stop_at = self.started_at + duration if duration else None
+        self._code = endpoint.__code__
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="route-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            if self.stop_at and time.time() >= self.stop_at:
+                return
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self.total_samples += 1
+            stack = []
+            in_route = False
+            while frame is not None:
+                code = frame.f_code
+                if code is self._code:
+                    in_route = True
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if in_route:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Samples as ``frame;frame;frame count`` lines, hottest first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "route": self.route,
+            "interval_seconds": self.interval,
+            "started_at": self.started_at,
+            "stop_at": self.stop_at,
+            "samples_in_route": sum(self.samples.values()),
+            "total_samples": self.total_samples,
+        }
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording per-route latency histograms.
+
+    Routes are labelled by their path template (``/api/buoy/readings``) rather
+    than the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROMETHEUS_AVAILABLE:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
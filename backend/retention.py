@@ -0,0 +1,383 @@
+"""Tiered retention for buoy readings and their rollups.
+
+Tiers, from finest to coarsest:
+
+* raw readings (``buoy_readings``), kept ``raw_days``
+* minute rollups (``buoy_rollups`` with granularity "minute"), kept ``minute_days``
+* hourly and daily rollups, kept forever
+
+Raw readings are kept forever unless ``RETENTION_RAW_DAYS`` is set (30 is
+a reasonable choice): exports, tracks, per-buoy history, analytics and the
+detection rebuild read raw readings only, so expiring them is opt-in.
+
+Expiry itself is left to MongoDB TTL indexes. ``RetentionCompactor`` rolls
+raw readings up into minute rollups well before they expire and records how
+far it has got (the compaction watermark), so queries know which ranges can
+be answered from minute rollups instead of raw data.
+
+A reading can be stored in a range a compaction pass has already read (it
+arrived late, or while the pass was running). Ingest records the hour of
+every reading near or behind the compaction target (``mark_late``) and the
+lease holder compacts those hours again from raw readings.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from rollups import COMPACTED_GRANULARITY, GRANULARITIES, ROLLUP_WIDTHS, compact_range, floor_time
+from timeseries import is_timeseries, set_expiry
+
+RAW_TTL_INDEX = "timestamp_ttl"
+MINUTE_TTL_INDEX = "minute_bucket_ttl"
+COMPACTION_STATE_ID = "compaction"
+
+# Late hours are recorded in the state collection as documents of this kind
+LATE_HOUR_KIND = "late_hour"
+# Readings stored less than this ahead of the compaction target count as late
+# too, which absorbs clock differences between workers
+LATE_MARGIN = timedelta(minutes=1)
+# Late hours compacted again per compaction pass
+LATE_HOURS_PER_PASS = 24
+
+
+class RetentionPolicy(BaseModel):
+    """How long each tier is kept; 0 days means forever."""
+    raw_days: int = 0
+    minute_days: int = 365
+    # Compaction stays this far behind now so late readings are still raw
+    compaction_lag_seconds: int = 300
+    compaction_interval_seconds: float = 60.0
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            raw_days=int(os.environ.get('RETENTION_RAW_DAYS', '0')),
+            minute_days=int(os.environ.get('RETENTION_MINUTE_DAYS', '365')),
+            compaction_lag_seconds=int(os.environ.get('RETENTION_COMPACTION_LAG', '300')),
+            compaction_interval_seconds=float(os.environ.get('RETENTION_COMPACTION_INTERVAL', '60')),
+        )
+
+    def describe(self) -> str:
+        if not self.raw_days:
+            return "raw readings are kept forever (set RETENTION_RAW_DAYS, e.g. 30, to expire them)"
+        minute = f"{self.minute_days} days" if self.minute_days else "forever"
+        return f"raw readings expire after {self.raw_days} days, minute rollups are kept {minute}"
+
+    @property
+    def enabled(self) -> bool:
+        """Compaction is only needed when raw readings expire."""
+        return self.raw_days > 0
+
+    def cutoffs(self, now: datetime) -> Dict[str, Optional[datetime]]:
+        """Oldest timestamp each tier keeps at ``now`` (None when kept forever)."""
+        return {
+            "raw": now - timedelta(days=self.raw_days) if self.raw_days else None,
+            COMPACTED_GRANULARITY: now - timedelta(days=self.minute_days) if self.minute_days else None,
+            "hour": None,
+            "day": None,
+        }
+
+
+async def ensure_ttl_index(collection, name: str, field: str, days: int, partial: Optional[dict] = None):
+    """Create, retune (via collMod) or drop a TTL index so it matches ``days``."""
+    existing = (await collection.index_information()).get(name)
+    if not days:
+        if existing:
+            await collection.drop_index(name)
+        return
+    seconds = days * 86400
+    if existing is None:
+        options = {"partialFilterExpression": partial} if partial else {}
+        await collection.create_index([(field, 1)], name=name, expireAfterSeconds=seconds, **options)
+    elif existing.get("expireAfterSeconds") != seconds:
+        await collection.database.command(
+            "collMod", collection.name, index={"name": name, "expireAfterSeconds": seconds}
+        )
+
+
+async def ensure_retention_indexes(readings, rollups, policy: RetentionPolicy,
+                                   compacted_until: Optional[datetime] = None):
+    """Apply the policy's TTL indexes; hourly/daily rollups never expire.
+
+    The raw TTL index is only created once compaction has caught up with the
+    raw cutoff, so switching retention on for an existing database does not
+    expire readings that have not been rolled up into minute buckets yet. A
+    time-series readings collection expires through its own
+    ``expireAfterSeconds`` instead of a TTL index.
+    """
+    raw_cutoff = policy.cutoffs(datetime.now(timezone.utc))["raw"]
+    if raw_cutoff is None or (compacted_until and compacted_until >= raw_cutoff):
+        if await is_timeseries(readings):
+            await set_expiry(readings, policy.raw_days)
+        else:
+            await ensure_ttl_index(readings, RAW_TTL_INDEX, "timestamp", policy.raw_days)
+    await ensure_ttl_index(
+        rollups, MINUTE_TTL_INDEX, "bucket_start", policy.minute_days,
+        partial={"granularity": COMPACTED_GRANULARITY},
+    )
+
+
+class RetentionCompactor:
+    """Background task that compacts raw readings into minute rollups.
+
+    Compaction runs in passes of at most ``max_span`` from the watermark up to
+    now minus the policy's lag. The watermark and a lease live in one state
+    document, so with several API workers only the lease holder compacts while
+    the others just pick up the new watermark.
+    """
+
+    def __init__(self, readings, rollups, state, metrics: Dict[str, str], policy: RetentionPolicy,
+                 max_span: timedelta = timedelta(hours=6), lease_seconds: float = 300.0):
+        self.readings = readings
+        self.rollups = rollups
+        self.state = state
+        self.metric_fields = metrics
+        self.policy = policy
+        self.max_span = max_span
+        self.lease_seconds = lease_seconds
+        self.owner = str(uuid.uuid4())
+        self.compacted_until: Optional[datetime] = None
+        self.compacted_buckets = 0
+        self.last_run_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def load_watermark(self) -> Optional[datetime]:
+        state = await self.state.find_one({"_id": COMPACTION_STATE_ID})
+        if state and state.get("watermark"):
+            self.compacted_until = state["watermark"].replace(tzinfo=timezone.utc)
+        return self.compacted_until
+
+    async def _acquire_lease(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        try:
+            return await self.state.find_one_and_update(
+                {"_id": COMPACTION_STATE_ID, "$or": [
+                    {"owner": self.owner},
+                    {"lease_until": {"$lt": now}},
+                    {"lease_until": {"$exists": False}},
+                ]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Another worker holds the lease
+            return None
+
+    async def compact_once(self) -> int:
+        """Run compaction up to the target; returns the minute buckets written."""
+        state = await self._acquire_lease()
+        if state is None:
+            await self.load_watermark()
+            return 0
+
+        minute = ROLLUP_WIDTHS[COMPACTED_GRANULARITY]
+        target = floor_time(
+            datetime.now(timezone.utc) - timedelta(seconds=self.policy.compaction_lag_seconds), minute
+        )
+        watermark = state.get("watermark")
+        if watermark is None:
+            oldest = await self.readings.find_one({"timestamp": {"$type": "date"}}, sort=[("timestamp", 1)])
+            watermark = floor_time(oldest["timestamp"], minute) if oldest else target
+        watermark = watermark.replace(tzinfo=timezone.utc)
+
+        raw_cutoff = self.policy.cutoffs(datetime.now(timezone.utc))["raw"]
+        if raw_cutoff and watermark < raw_cutoff:
+            logging.warning(f"Compaction is behind raw retention: raw readings before {raw_cutoff} "
+                            f"expire uncompacted (watermark {watermark})")
+
+        written = 0
+        while watermark < target:
+            pass_end = min(target, watermark + self.max_span)
+            written += await compact_range(self.readings, self.rollups, watermark, pass_end, self.metric_fields)
+            result = await self.state.update_one(
+                {"_id": COMPACTION_STATE_ID, "owner": self.owner},
+                {"$set": {
+                    "watermark": pass_end,
+                    "lease_until": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds),
+                }},
+            )
+            if not result.matched_count:
+                # The lease expired mid-pass and another worker took over
+                logging.warning("Compaction lease lost; leaving the rest to its new holder")
+                self.compacted_buckets += written
+                await self.load_watermark()
+                return written
+            watermark = pass_end
+            self.compacted_until = watermark
+        if self.compacted_until is None or self.compacted_until < watermark:
+            await self.state.update_one(
+                {"_id": COMPACTION_STATE_ID, "owner": self.owner}, {"$set": {"watermark": watermark}}
+            )
+            self.compacted_until = watermark
+        written += await self._compact_late_hours(watermark)
+        self.compacted_buckets += written
+        await ensure_retention_indexes(self.readings, self.rollups, self.policy, self.compacted_until)
+        return written
+
+    async def mark_late(self, readings: List[dict]) -> int:
+        """Record the hours of just-stored readings that a compaction pass may have missed.
+
+        Call after the readings are stored; returns the number of hours recorded.
+        """
+        threshold = datetime.now(timezone.utc) - timedelta(seconds=self.policy.compaction_lag_seconds) + LATE_MARGIN
+        hours = {floor_time(r["timestamp"], GRANULARITIES["hour"]) for r in readings if r["timestamp"] < threshold}
+        if hours:
+            await self.state.bulk_write([
+                UpdateOne(
+                    {"_id": f"{LATE_HOUR_KIND}:{hour.isoformat()}"},
+                    {"$set": {"kind": LATE_HOUR_KIND, "bucket_start": hour}, "$inc": {"marks": 1}},
+                    upsert=True,
+                )
+                for hour in sorted(hours)
+            ], ordered=False)
+        return len(hours)
+
+    async def _compact_late_hours(self, watermark: datetime) -> int:
+        """Compact late hours below the watermark again (the lease must be held).
+
+        Compaction replaces minute rollups from raw readings, so repeating it is
+        safe. A mark is only cleared if no reading was marked since it was read.
+        """
+        hour = GRANULARITIES["hour"]
+        raw_cutoff = self.policy.cutoffs(datetime.now(timezone.utc))["raw"]
+        marks = await self.state.find(
+            {"kind": LATE_HOUR_KIND, "bucket_start": {"$lt": watermark}}
+        ).sort("bucket_start", 1).to_list(length=LATE_HOURS_PER_PASS)
+        written = 0
+        for mark in marks:
+            start = mark["bucket_start"].replace(tzinfo=timezone.utc)
+            # Once raw readings expire, minute rollups are all that is left of them
+            if not (raw_cutoff and start < raw_cutoff):
+                written += await compact_range(
+                    self.readings, self.rollups, start, min(start + hour, watermark), self.metric_fields
+                )
+            await self.state.delete_one({"_id": mark["_id"], "marks": mark["marks"]})
+        return written
+
+    async def run(self):
+        while True:
+            try:
+                await self.compact_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logging.error(f"Retention compaction failed: {e}")
+            self.last_run_at = time.time()
+            await asyncio.sleep(self.policy.compaction_interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": True,
+            "compacted_until": self.compacted_until,
+            "compacted_buckets": self.compacted_buckets,
+            "last_run_at": self.last_run_at,
+            "last_error": self.last_error,
+        }
+
+
+async def _collection_sizes(collection) -> dict:
+    """Document count, average document size and index sizes from collStats."""
+    try:
+        stats = await collection.database.command("collStats", collection.name)
+    except Exception as e:
+        logging.warning(f"collStats unavailable for {collection.name}: {e}")
+        return {"count": await collection.estimated_document_count(), "avg_obj_size": None,
+                "total_index_size": None, "index_sizes": {}}
+    return {
+        "count": stats.get("count", 0),
+        "avg_obj_size": stats.get("avgObjSize"),
+        "storage_size": stats.get("storageSize"),
+        "total_index_size": stats.get("totalIndexSize"),
+        "index_sizes": stats.get("indexSizes", {}),
+    }
+
+
+def _estimate_bytes(sizes: dict, docs: int) -> dict:
+    """Estimate data and index bytes held by ``docs`` documents of a collection."""
+    data = sizes["avg_obj_size"] * docs if sizes.get("avg_obj_size") else None
+    index = None
+    if sizes.get("total_index_size") is not None and sizes.get("count"):
+        index = int(sizes["total_index_size"] * docs / sizes["count"])
+    return {"data_bytes": data, "index_bytes": index}
+
+
+async def retention_report(readings, rollups, policy: RetentionPolicy,
+                           compacted_until: Optional[datetime] = None,
+                           now: Optional[datetime] = None) -> dict:
+    """Dry run: what each tier would reclaim if the policy's TTLs applied now.
+
+    Nothing is deleted. Sizes are estimates from collStats (average document
+    size and a count-proportional share of the indexes).
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoffs = policy.cutoffs(now)
+    reading_sizes = await _collection_sizes(readings)
+    rollup_sizes = await _collection_sizes(rollups)
+
+    tiers = {}
+    raw_cutoff = cutoffs["raw"]
+    expiring = await readings.count_documents({"timestamp": {"$lt": raw_cutoff}}) if raw_cutoff else 0
+    tiers["raw"] = {
+        "retention_days": policy.raw_days or None,
+        "cutoff": raw_cutoff,
+        "documents": reading_sizes["count"],
+        "expiring_documents": expiring,
+        **_estimate_bytes(reading_sizes, expiring),
+    }
+    if raw_cutoff and (compacted_until is None or compacted_until < raw_cutoff):
+        # Raw readings that would expire before compaction has covered them
+        uncompacted = {"$lt": raw_cutoff}
+        if compacted_until:
+            uncompacted["$gte"] = compacted_until
+        tiers["raw"]["expiring_uncompacted"] = await readings.count_documents({"timestamp": uncompacted})
+    else:
+        tiers["raw"]["expiring_uncompacted"] = 0
+
+    for granularity, cutoff in cutoffs.items():
+        if granularity == "raw":
+            continue
+        total = await rollups.count_documents({"granularity": granularity})
+        expiring = await rollups.count_documents(
+            {"granularity": granularity, "bucket_start": {"$lt": cutoff}}
+        ) if cutoff else 0
+        tiers[granularity] = {
+            "retention_days": (policy.minute_days or None) if granularity == COMPACTED_GRANULARITY else None,
+            "cutoff": cutoff,
+            "documents": total,
+            "expiring_documents": expiring,
+            **_estimate_bytes(rollup_sizes, expiring),
+        }
+
+    return {
+        "dry_run": True,
+        "generated_at": now,
+        "compacted_until": compacted_until,
+        "tiers": tiers,
+        "collections": {"buoy_readings": reading_sizes, "buoy_rollups": rollup_sizes},
+    }
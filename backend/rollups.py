@@ -0,0 +1,455 @@
+"""Incrementally maintained hourly/daily rollups of buoy readings.
+
+One rollup document holds count, sum, sum of squares, min, max, first and
+last for one metric over one time bucket. Ingest paths upsert them as
+readings arrive; summary and series queries combine them with raw data only
+at the unaligned edges of the requested range (see ``plan_segments``).
+Minute rollups are only written by retention compaction (``compact_range``)
+and stand in for raw readings older than the compaction watermark.
+
+Hourly and daily rollups only hold readings stored while they were being
+maintained. The rollup coverage records where that starts (the first hour
+after the newest reading stored before then); queries read raw readings
+below it until ``manage.py rebuild-rollups`` has rolled up older data.
+
+A rebuild replaces whole rollup documents, so it must not run while API
+workers fold new readings into them. Workers record a heartbeat in the
+rollup writers collection and the rebuild refuses to start while one is
+recent (``active_rollup_writers``).
+"""
+import asyncio
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+
+# Rollup granularities maintained on ingest, from finest to coarsest
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Minute rollups are written by background compaction (see retention.py) for
+# data older than the compaction watermark, so raw readings can expire
+COMPACTED_GRANULARITY = "minute"
+ROLLUP_WIDTHS = {COMPACTED_GRANULARITY: timedelta(minutes=1), **GRANULARITIES}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# State document (in the migrations collection) recording rollup coverage
+ROLLUP_COVERAGE_ID = "rollup_coverage"
+
+
+def floor_time(value: datetime, width: timedelta) -> datetime:
+    """Round a UTC datetime down to a multiple of ``width`` since the epoch."""
+    return value - (value - EPOCH) % width
+
+
+def ceil_time(value: datetime, width: timedelta) -> datetime:
+    floored = floor_time(value, width)
+    return floored if floored == value else floored + width
+
+
+def rollup_id(granularity: str, metric: str, bucket_start: datetime) -> str:
+    return f"{granularity}:{metric}:{bucket_start.isoformat()}"
+
+
+def _partial_stats(readings: Iterable[dict], metrics: Dict[str, str],
+                   compacted_until: Optional[datetime] = None) -> Dict[Tuple[str, str, datetime], dict]:
+    """Pre-aggregate readings per (granularity, metric, bucket) in memory."""
+    partials: Dict[Tuple[str, str, datetime], dict] = {}
+    for reading in readings:
+        timestamp = reading["timestamp"]
+        # Readings arriving behind the compaction watermark also go straight
+        # into the minute rollups: regular passes will not revisit them (the
+        # compactor only recompacts hours ingest marked late, from raw)
+        granularities = ROLLUP_WIDTHS if compacted_until and timestamp < compacted_until else GRANULARITIES
+        for granularity, width in granularities.items():
+            bucket_start = floor_time(timestamp, width)
+            for metric, field in metrics.items():
+                value = reading.get(field)
+                if value is None:
+                    continue
+                key = (granularity, metric, bucket_start)
+                stats = partials.get(key)
+                if stats is None:
+                    partials[key] = {
+                        "count": 1, "sum": value, "sum_sq": value * value,
+                        "min": value, "max": value,
+                        "first": value, "first_ts": timestamp,
+                        "last": value, "last_ts": timestamp,
+                    }
+                    continue
+                stats["count"] += 1
+                stats["sum"] += value
+                stats["sum_sq"] += value * value
+                stats["min"] = min(stats["min"], value)
+                stats["max"] = max(stats["max"], value)
+                if timestamp < stats["first_ts"]:
+                    stats["first"], stats["first_ts"] = value, timestamp
+                if timestamp >= stats["last_ts"]:
+                    stats["last"], stats["last_ts"] = value, timestamp
+    return partials
+
+
+def _merge_update(granularity: str, metric: str, bucket_start: datetime, stats: dict) -> UpdateOne:
+    """Upsert that folds partial stats into a rollup document atomically.
+
+    Uses an aggregation-pipeline update so first/last are only replaced when
+    the incoming readings are earlier/later than what is already stored,
+    which keeps out-of-order replays correct.
+    """
+    first_is_earlier = {"$or": [
+        {"$eq": [{"$ifNull": ["$first_ts", None]}, None]},
+        {"$lt": [stats["first_ts"], "$first_ts"]},
+    ]}
+    last_is_later = {"$or": [
+        {"$eq": [{"$ifNull": ["$last_ts", None]}, None]},
+        {"$gte": [stats["last_ts"], "$last_ts"]},
+    ]}
+    return UpdateOne(
+        {"_id": rollup_id(granularity, metric, bucket_start)},
+        [{"$set": {
+            "granularity": granularity,
+            "metric": metric,
+            "bucket_start": bucket_start,
+            "count": {"$add": [{"$ifNull": ["$count", 0]}, stats["count"]]},
+            "sum": {"$add": [{"$ifNull": ["$sum", 0]}, stats["sum"]]},
+            "sum_sq": {"$add": [{"$ifNull": ["$sum_sq", 0]}, stats["sum_sq"]]},
+            "min": {"$min": ["$min", stats["min"]]},
+            "max": {"$max": ["$max", stats["max"]]},
+            "first": {"$cond": [first_is_earlier, stats["first"], "$first"]},
+            "first_ts": {"$cond": [first_is_earlier, stats["first_ts"], "$first_ts"]},
+            "last": {"$cond": [last_is_later, stats["last"], "$last"]},
+            "last_ts": {"$cond": [last_is_later, stats["last_ts"], "$last_ts"]},
+        }}],
+        upsert=True,
+    )
+
+
+async def apply_rollups(collection, readings: List[dict], metrics: Dict[str, str],
+                        compacted_until: Optional[datetime] = None):
+    """Fold newly stored readings into the hourly and daily rollups in one bulk write."""
+    partials = _partial_stats(readings, metrics, compacted_until)
+    if partials:
+        operations = [
+            _merge_update(granularity, metric, bucket_start, stats)
+            for (granularity, metric, bucket_start), stats in partials.items()
+        ]
+        await collection.bulk_write(operations, ordered=False)
+
+
+async def load_rollup_coverage(state, readings) -> Optional[datetime]:
+    """Where hourly/daily rollups become complete (None: they cover everything).
+
+    The first call records it: None for an empty database, otherwise the
+    hour after the newest stored reading, which ingest never rolled up.
+    Concurrent first calls agree on whichever was recorded first.
+    """
+    coverage = await state.find_one({"_id": ROLLUP_COVERAGE_ID})
+    if coverage is None:
+        newest = await readings.find_one({"timestamp": {"$type": "date"}}, sort=[("timestamp", -1)])
+        covered_from = None
+        if newest:
+            newest_at = newest["timestamp"].replace(tzinfo=timezone.utc)
+            covered_from = floor_time(newest_at, GRANULARITIES["hour"]) + GRANULARITIES["hour"]
+        await state.update_one(
+            {"_id": ROLLUP_COVERAGE_ID}, {"$setOnInsert": {"covered_from": covered_from}}, upsert=True
+        )
+        coverage = await state.find_one({"_id": ROLLUP_COVERAGE_ID})
+    covered_from = coverage.get("covered_from")
+    return covered_from.replace(tzinfo=timezone.utc) if covered_from else None
+
+
+async def extend_rollup_coverage(state, covered_from: Optional[datetime]):
+    """Record that rollups are complete from ``covered_from`` (None: everywhere) on."""
+    match = {"_id": ROLLUP_COVERAGE_ID}
+    if covered_from is not None:
+        match["covered_from"] = {"$gt": covered_from}
+    await state.update_one(match, {"$set": {"covered_from": covered_from}})
+
+
+async def record_rollup_writer(writers, writer_id: str, **info):
+    """Record that a process which folds readings into rollups is running."""
+    await writers.update_one(
+        {"_id": writer_id}, {"$set": {**info, "seen_at": datetime.now(timezone.utc)}}, upsert=True
+    )
+
+
+async def active_rollup_writers(writers, max_age: timedelta) -> List[dict]:
+    """Writers whose last heartbeat is newer than ``max_age``."""
+    since = datetime.now(timezone.utc) - max_age
+    return await writers.find({"seen_at": {"$gte": since}}).to_list(length=None)
+
+
+async def ensure_rollup_writer_indexes(writers, expire_after: timedelta):
+    """Expire the heartbeats of writers that stopped without removing theirs."""
+    await writers.create_index(
+        "seen_at", expireAfterSeconds=int(expire_after.total_seconds()), name="seen_at_ttl"
+    )
+
+
+async def ensure_rollup_indexes(collection):
+    await collection.create_index(
+        [("granularity", 1), ("metric", 1), ("bucket_start", 1)], name="granularity_metric_bucket"
+    )
+
+
+def plan_segments(start: datetime, end: datetime, levels: Optional[List[str]] = None) -> List[Tuple[str, datetime, datetime]]:
+    """Split [start, end) into the coarsest rollup buckets that fit, plus raw edges.
+
+    Returns (source, segment_start, segment_end) tuples where source is a
+    granularity name or ``"raw"``.
+    """
+    if levels is None:
+        levels = sorted(GRANULARITIES, key=lambda g: GRANULARITIES[g], reverse=True)
+    if start >= end:
+        return []
+    if not levels:
+        return [("raw", start, end)]
+    width = ROLLUP_WIDTHS[levels[0]]
+    aligned_start = ceil_time(start, width)
+    aligned_end = floor_time(end, width)
+    if aligned_start >= aligned_end:
+        return plan_segments(start, end, levels[1:])
+    return (
+        plan_segments(start, aligned_start, levels[1:])
+        + [(levels[0], aligned_start, aligned_end)]
+        + plan_segments(aligned_end, end, levels[1:])
+    )
+
+
+def _raw_stats_group(metrics: Dict[str, str], group_id: Any = None) -> dict:
+    """$group stage computing rollup statistics from time-sorted raw readings."""
+    group: Dict[str, Any] = {"_id": group_id}
+    for metric, field in metrics.items():
+        group[f"{metric}__count"] = {"$sum": {"$cond": [{"$eq": [{"$ifNull": [f"${field}", None]}, None]}, 0, 1]}}
+        group[f"{metric}__sum"] = {"$sum": f"${field}"}
+        group[f"{metric}__sum_sq"] = {"$sum": {"$multiply": [f"${field}", f"${field}"]}}
+        group[f"{metric}__min"] = {"$min": f"${field}"}
+        group[f"{metric}__max"] = {"$max": f"${field}"}
+        group[f"{metric}__first"] = {"$first": f"${field}"}
+        group[f"{metric}__last"] = {"$last": f"${field}"}
+    group["first_ts"] = {"$first": "$timestamp"}
+    group["last_ts"] = {"$last": "$timestamp"}
+    return group
+
+
+def _raw_row_stats(row: dict, metric: str) -> dict:
+    """Pick one metric's statistics out of a ``_raw_stats_group`` result row."""
+    return {
+        "count": row[f"{metric}__count"],
+        "sum": row[f"{metric}__sum"],
+        "sum_sq": row[f"{metric}__sum_sq"],
+        "min": row[f"{metric}__min"],
+        "max": row[f"{metric}__max"],
+        "first": row[f"{metric}__first"],
+        "first_ts": row["first_ts"],
+        "last": row[f"{metric}__last"],
+        "last_ts": row["last_ts"],
+    }
+
+
+def merge_stats(target: Optional[dict], stats: dict) -> dict:
+    """Combine two sets of rollup statistics for the same metric."""
+    if not stats or not stats.get("count"):
+        return target
+    if not target:
+        return dict(stats)
+    target["count"] += stats["count"]
+    target["sum"] += stats["sum"]
+    target["sum_sq"] += stats["sum_sq"]
+    target["min"] = min(target["min"], stats["min"])
+    target["max"] = max(target["max"], stats["max"])
+    if stats["first_ts"] < target["first_ts"]:
+        target["first"], target["first_ts"] = stats["first"], stats["first_ts"]
+    if stats["last_ts"] >= target["last_ts"]:
+        target["last"], target["last_ts"] = stats["last"], stats["last_ts"]
+    return target
+
+
+def plan_range(start: datetime, end: datetime, compacted_until: Optional[datetime] = None,
+               covered_from: Optional[datetime] = None) -> List[Tuple[str, datetime, datetime]]:
+    """Plan [start, end), also using minute rollups below the compaction watermark.
+
+    Below ``covered_from`` hourly and daily rollups are incomplete, so that
+    part is read from minute rollups where compacted and raw readings otherwise.
+    """
+    if covered_from is not None and start < covered_from:
+        split = min(end, covered_from)
+        segments = []
+        if compacted_until is not None and compacted_until > start:
+            compacted = min(split, compacted_until)
+            segments += plan_segments(start, compacted, [COMPACTED_GRANULARITY])
+            start = compacted
+        if start < split:
+            segments.append(("raw", start, split))
+        return segments + plan_range(split, end, compacted_until)
+    if compacted_until is None or compacted_until <= start:
+        return plan_segments(start, end)
+    levels = ["day", "hour", COMPACTED_GRANULARITY]
+    split = min(end, compacted_until)
+    return plan_segments(start, split, levels) + plan_segments(split, end)
+
+
+async def range_stats(readings, rollups, start: datetime, end: datetime, metrics: Dict[str, str],
+                      compacted_until: Optional[datetime] = None,
+                      covered_from: Optional[datetime] = None) -> Dict[str, dict]:
+    """Statistics per metric over [start, end), read from rollups wherever possible."""
+    totals: Dict[str, Optional[dict]] = {metric: None for metric in metrics}
+    queries = []
+    for source, segment_start, segment_end in plan_range(start, end, compacted_until, covered_from):
+        if source == "raw":
+            pipeline = [
+                {"$match": {"timestamp": {"$gte": segment_start, "$lt": segment_end}}},
+                {"$sort": {"timestamp": 1}},
+                {"$group": _raw_stats_group(metrics)},
+            ]
+            queries.append(("raw", readings.aggregate(pipeline).to_list(length=1)))
+        else:
+            pipeline = [
+                {"$match": {
+                    "granularity": source,
+                    "metric": {"$in": list(metrics)},
+                    "bucket_start": {"$gte": segment_start, "$lt": segment_end},
+                }},
+                {"$sort": {"bucket_start": 1}},
+                {"$group": {
+                    "_id": "$metric",
+                    "count": {"$sum": "$count"},
+                    "sum": {"$sum": "$sum"},
+                    "sum_sq": {"$sum": "$sum_sq"},
+                    "min": {"$min": "$min"},
+                    "max": {"$max": "$max"},
+                    "first": {"$first": "$first"},
+                    "first_ts": {"$first": "$first_ts"},
+                    "last": {"$last": "$last"},
+                    "last_ts": {"$last": "$last_ts"},
+                }},
+            ]
+            queries.append(("rollup", rollups.aggregate(pipeline).to_list(length=len(metrics))))
+
+    for kind, rows in zip([k for k, _ in queries], await asyncio.gather(*[q for _, q in queries])):
+        if kind == "raw":
+            for row in rows:
+                for metric in metrics:
+                    totals[metric] = merge_stats(totals[metric], _raw_row_stats(row, metric))
+        else:
+            for row in rows:
+                totals[row["_id"]] = merge_stats(totals[row["_id"]], row)
+    return {metric: stats for metric, stats in totals.items() if stats}
+
+
+def describe(stats: dict) -> dict:
+    """Derive avg and population standard deviation from rollup statistics."""
+    count = stats["count"]
+    mean = stats["sum"] / count
+    variance = max(0.0, stats["sum_sq"] / count - mean * mean)
+    return {**stats, "avg": mean, "std": math.sqrt(variance)}
+
+
+async def _raw_buckets(readings, start: datetime, end: datetime, metrics: Dict[str, str],
+                       width: timedelta) -> List[Tuple[datetime, Dict[str, dict]]]:
+    """Aggregate raw readings in [start, end) into epoch-aligned buckets of ``width``."""
+    width_ms = int(width.total_seconds() * 1000)
+    bucket_start = {"$subtract": ["$timestamp", {"$mod": [{"$subtract": ["$timestamp", EPOCH]}, width_ms]}]}
+    pipeline = [
+        {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+        {"$sort": {"timestamp": 1}},
+        {"$group": _raw_stats_group(metrics, bucket_start)},
+    ]
+    rows = await readings.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    buckets = []
+    for row in rows:
+        started = row["_id"]
+        if started.tzinfo is None:
+            started = started.replace(tzinfo=timezone.utc)
+        buckets.append((started, {
+            metric: _raw_row_stats(row, metric) for metric in metrics if row[f"{metric}__count"]
+        }))
+    return buckets
+
+
+def _replace_rollup(granularity: str, metric: str, bucket_start: datetime, stats: dict) -> ReplaceOne:
+    return ReplaceOne(
+        {"_id": rollup_id(granularity, metric, bucket_start)},
+        {"granularity": granularity, "metric": metric, "bucket_start": bucket_start, **stats},
+        upsert=True,
+    )
+
+
+async def _rebuild_chunk(readings, rollups, chunk_start: datetime, chunk_end: datetime, metrics: Dict[str, str]) -> int:
+    """Recompute the hourly and daily rollups of one day-aligned chunk from raw data.
+
+    Not safe against concurrent ingest: rollups updated between the read and
+    the replace lose those updates (see ``rebuild_rollups``).
+    """
+    hours = await _raw_buckets(readings, chunk_start, chunk_end, metrics, GRANULARITIES["hour"])
+
+    operations = []
+    rollup_ids = []
+    daily: Dict[Tuple[str, datetime], Optional[dict]] = defaultdict(lambda: None)
+    for bucket_start, per_metric in hours:
+        day_start = floor_time(bucket_start, GRANULARITIES["day"])
+        for metric, stats in per_metric.items():
+            operations.append(_replace_rollup("hour", metric, bucket_start, stats))
+            rollup_ids.append(rollup_id("hour", metric, bucket_start))
+            daily[(metric, day_start)] = merge_stats(daily[(metric, day_start)], dict(stats))
+    for (metric, day_start), stats in daily.items():
+        operations.append(_replace_rollup("day", metric, day_start, stats))
+        rollup_ids.append(rollup_id("day", metric, day_start))
+
+    # Drop rollups in this chunk that no longer have any raw data behind them
+    await rollups.delete_many({
+        "granularity": {"$in": list(GRANULARITIES)},
+        "bucket_start": {"$gte": chunk_start, "$lt": chunk_end},
+        "_id": {"$nin": rollup_ids},
+    })
+    if operations:
+        await rollups.bulk_write(operations, ordered=False)
+    return len(hours)
+
+
+async def compact_range(readings, rollups, start: datetime, end: datetime, metrics: Dict[str, str]) -> int:
+    """Write minute rollups for raw readings in [start, end); safe to repeat."""
+    minutes = await _raw_buckets(readings, start, end, metrics, ROLLUP_WIDTHS[COMPACTED_GRANULARITY])
+    operations = [
+        _replace_rollup(COMPACTED_GRANULARITY, metric, bucket_start, stats)
+        for bucket_start, per_metric in minutes
+        for metric, stats in per_metric.items()
+    ]
+    if operations:
+        await rollups.bulk_write(operations, ordered=False)
+    return len(minutes)
+
+
+async def rebuild_rollups(readings, rollups, start: datetime, end: datetime, metrics: Dict[str, str],
+                          workers: int = 4, progress=None) -> int:
+    """Recompute rollups for [start, end) from raw readings in parallel day chunks.
+
+    Run it offline: readings folded into the rollups while a chunk is being
+    rebuilt are overwritten by the replace. ``manage.py rebuild-rollups``
+    refuses to start while ``active_rollup_writers`` reports a running worker.
+    """
+    day = GRANULARITIES["day"]
+    chunk_start = floor_time(start, day)
+    chunks = []
+    while chunk_start < end:
+        chunks.append((chunk_start, chunk_start + day))
+        chunk_start += day
+
+    semaphore = asyncio.Semaphore(workers)
+    rebuilt_hours = 0
+
+    async def run(chunk: Tuple[datetime, datetime]):
+        nonlocal rebuilt_hours
+        async with semaphore:
+            hours = await _rebuild_chunk(readings, rollups, chunk[0], chunk[1], metrics)
+            rebuilt_hours += hours
+            if progress:
+                progress(chunk[0], hours)
+
+    await asyncio.gather(*[run(chunk) for chunk in chunks])
+    return rebuilt_hours
@@ -1,15 +1,56 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, WebSocket, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
+import time
+import asyncio
 from datetime import datetime, timezone, timedelta
 import json
+import base64
+import socket
+
+from alerts import Alert, AlertConfig, AlertEngine, ensure_alert_indexes
+from analytics import AnalyticsCache, analyze, load_columns
+from detections import (
+    DetectionEvent, apply_detections, class_histogram, class_timeline, ensure_detection_indexes
+)
+from exporters import EXPORT_ENCODERS, EXPORT_MEDIA_TYPES, PARQUET_AVAILABLE
+from firebase_sync import FirebaseSyncQueue, FakeFirebaseDatabase
+from fleet import adopt_untagged_readings, apply_fleet_updates, ensure_fleet_indexes
+from geo import LOCATION_FIELD, bbox_filter, ensure_geo_indexes, geojson_point, radius_filter, simplify_track
+from http_cache import ResponseCache, is_not_modified, strong_etag, validator_headers
+from ingest_buffer import BufferFull, IngestBuffer
+from idempotency import (
+    IDEMPOTENCY_FIELD, IdempotencyCache, ensure_idempotency_index, is_duplicate_key_error
+)
+from observability import (
+    CONTENT_TYPE_LATEST, MongoCommandMetrics, RequestMetricsMiddleware, RouteProfiler,
+    monitor_event_loop_lag, record_alerts, record_duplicates, record_firebase_sync, record_ingest, render_metrics,
+    track_firebase_queue, track_ingest_buffer
+)
+from retention import RetentionCompactor, RetentionPolicy, ensure_retention_indexes, retention_report
+from rollups import (
+    COMPACTED_GRANULARITY, GRANULARITIES, ROLLUP_WIDTHS, apply_rollups, describe,
+    ceil_time, ensure_rollup_indexes, ensure_rollup_writer_indexes, extend_rollup_coverage, floor_time,
+    load_rollup_coverage, range_stats, record_rollup_writer
+)
+from stream_hub import StreamHub
+from timeseries import ensure_timeseries_collection
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Firebase Admin SDK imports
 try:
@@ -25,9 +66,19 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection (keeping existing setup)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
+# Readings live in a plain collection by default; READINGS_TIMESERIES=true
+# uses a MongoDB time-series collection instead (see timeseries.py, and
+# `python manage.py migrate-timeseries` to copy existing data across)
+READINGS_COLLECTION = os.environ.get('READINGS_COLLECTION', 'buoy_readings')
+READINGS_TIMESERIES = os.environ.get('READINGS_TIMESERIES', 'false').lower() == 'true'
+READINGS_TIMESERIES_GRANULARITY = os.environ.get('READINGS_TIMESERIES_GRANULARITY', 'seconds')
+# Time-series collections cannot have unique secondary indexes
+UNIQUE_READING_INDEXES = not READINGS_TIMESERIES
+readings_collection = db[READINGS_COLLECTION]
+
 # Create the main app without a prefix
 app = FastAPI(title="IoT Buoy Dashboard API", version="1.0.0")
 
@@ -62,10 +113,39 @@ if FIREBASE_AVAILABLE and os.getenv("FIREBASE_CONFIGURED", "false").lower() == "
     except Exception as e:
         logging.error(f"Firebase initialization failed: {e}")
 
+# Firebase reference factory used by the sync worker; FIREBASE_FAKE=true swaps in
+# an in-memory database so the write-behind path can be exercised locally
+firebase_reference = None
+if firebase_app:
+    firebase_reference = lambda path: firebase_db.reference(path, app=firebase_app)
+elif os.getenv("FIREBASE_FAKE", "false").lower() == "true":
+    firebase_reference = FakeFirebaseDatabase().reference
+
+firebase_sync = FirebaseSyncQueue(
+    firebase_reference,
+    max_batch=int(os.environ.get('FIREBASE_SYNC_MAX_BATCH', '500')),
+    max_pending=int(os.environ.get('FIREBASE_SYNC_MAX_PENDING', '100000')),
+    on_send=record_firebase_sync,
+) if firebase_reference else None
+if firebase_sync:
+    track_firebase_queue(firebase_sync)
+
+# Buoy id given to readings that do not name their buoy (single-buoy
+# deployments and readings stored before the fleet endpoints existed)
+DEFAULT_BUOY_ID = os.environ.get('DEFAULT_BUOY_ID', 'buoy-1')
+
+# Clients forwarding a backlog (the LoRa gateway) send each reading's
+# measurement time. It may run at most MAX_CLOCK_SKEW_SECONDS ahead of the
+# server clock and MAX_BACKFILL_DAYS behind it (older history goes through
+# `python manage.py import-csv`)
+MAX_CLOCK_SKEW_SECONDS = float(os.environ.get('MAX_CLOCK_SKEW_SECONDS', '300'))
+MAX_BACKFILL_DAYS = float(os.environ.get('MAX_BACKFILL_DAYS', '30'))
+
 # Pydantic Models
 class BuoyReading(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    buoy_id: str = DEFAULT_BUOY_ID
     gps_latitude: float
     gps_longitude: float
     battery_percentage: float
@@ -74,8 +154,10 @@ class BuoyReading(BaseModel):
     humidity: float  # Percentage
     air_pressure: float  # hPa
     detected_object_class: Optional[str] = None
+    detection_confidence: Optional[float] = None  # Classifier score, 0-1
 
 class BuoyReadingCreate(BaseModel):
+    buoy_id: str = Field(default=DEFAULT_BUOY_ID, min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_.:-]+$")
     gps_latitude: float
     gps_longitude: float
     battery_percentage: float = Field(ge=0, le=100)
@@ -84,6 +166,42 @@ class BuoyReadingCreate(BaseModel):
     humidity: float = Field(ge=0, le=100)
     air_pressure: float = Field(ge=0)
     detected_object_class: Optional[str] = None
+    detection_confidence: Optional[float] = Field(default=None, ge=0, le=1)
+    # Measurement time; the server's clock is used when omitted
+    timestamp: Optional[datetime] = None
+    # Repeats of a reading with the same key are acknowledged but not stored again
+    idempotency_key: Optional[str] = Field(default=None, min_length=1, max_length=200)
+
+    @field_validator("timestamp")
+    @classmethod
+    def timestamp_within_skew(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is None:
+            return None
+        value = to_utc(value)
+        now = datetime.now(timezone.utc)
+        if value > now + timedelta(seconds=MAX_CLOCK_SKEW_SECONDS):
+            raise ValueError(f"timestamp is more than {MAX_CLOCK_SKEW_SECONDS:g}s ahead of the server clock")
+        if value < now - timedelta(days=MAX_BACKFILL_DAYS):
+            raise ValueError(f"timestamp is more than {MAX_BACKFILL_DAYS:g} days old")
+        return value
+
+    def to_reading(self) -> "BuoyReading":
+        """The reading to store, stamped with the server's clock unless a timestamp was sent."""
+        return BuoyReading(**self.model_dump(exclude={"timestamp"} if self.timestamp is None else set()))
+
+class BatchItemResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+    duplicate: bool = False
+
+class BatchIngestResult(BaseModel):
+    total: int
+    inserted: int
+    failed: int
+    duplicates: int = 0
+    results: List[BatchItemResult]
 
 class BuoyStatus(BaseModel):
     is_online: bool
@@ -91,20 +209,141 @@ class BuoyStatus(BaseModel):
     connection_quality: str  # "excellent", "good", "poor", "offline"
     total_readings: int
 
+class FleetBuoyStatus(BuoyStatus):
+    buoy_id: str
+    first_reading: Optional[datetime] = None
+    latest: Optional[BuoyReading] = None
+
 class HistoricalDataQuery(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     limit: int = Field(default=168, ge=1, le=1000)  # Default: 7 days * 24 hours
 
+# Public metric names (as used by the summary and Firebase payloads) -> reading fields
+SUMMARY_METRICS = {
+    "temperature": "water_temperature",
+    "turbidity": "water_turbidity",
+    "battery": "battery_percentage",
+    "humidity": "humidity",
+    "pressure": "air_pressure",
+}
+
+# Maximum number of points a single series request may ask for
+MAX_SERIES_POINTS = 5000
+
+# Metrics a live-stream client may filter on -> reading fields delivered for each
+STREAM_METRIC_FIELDS = {
+    **{name: (field,) for name, field in SUMMARY_METRICS.items()},
+    "gps": ("gps_latitude", "gps_longitude"),
+    "object": ("detected_object_class", "detection_confidence"),
+}
+
+# Live stream tuning: per-client queue length, subscriber cap and keep-alive interval
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', '100'))
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', '2000'))
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', '15'))
+
+# Columns (and their export types) written by the bulk export endpoint
+EXPORT_COLUMNS = [
+    ("id", "string"),
+    ("timestamp", "timestamp"),
+    ("buoy_id", "string"),
+    ("gps_latitude", "float"),
+    ("gps_longitude", "float"),
+    ("battery_percentage", "float"),
+    ("water_turbidity", "float"),
+    ("water_temperature", "float"),
+    ("humidity", "float"),
+    ("air_pressure", "float"),
+    ("detected_object_class", "string"),
+    ("detection_confidence", "float"),
+]
+
+# Rows fetched from the cursor and encoded per export chunk (one Parquet row group)
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '5000'))
+
+# Answer summary/series queries from the hourly/daily rollups where possible (data
+# stored before rollups existed is read raw until `python manage.py rebuild-rollups`)
+USE_ROLLUPS = os.environ.get('USE_ROLLUPS', 'true').lower() == 'true'
+
+# Seconds between the heartbeats that tell `manage.py rebuild-rollups` this
+# worker is folding readings into the rollups (it refuses to run meanwhile)
+WORKER_HEARTBEAT_INTERVAL = float(os.environ.get('WORKER_HEARTBEAT_INTERVAL', '10'))
+WORKER_ID = uuid.uuid4().hex
+
+# Upper bound on readings accepted by a single batch ingest request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '1000'))
+
+# Seconds the in-memory latest-state cache may serve before re-reading Mongo
+# (covers writes made by other workers; 0 re-reads on every request)
+LATEST_CACHE_MAX_AGE = float(os.environ.get('LATEST_CACHE_MAX_AGE', '10'))
+
+# List endpoints serialize stored documents straight to JSON bytes instead
+# of building and re-validating a model per row (FAST_JSON=false disables)
+FAST_JSON = os.environ.get('FAST_JSON', 'true').lower() == 'true'
+
+# Seconds a rendered summary is reused while no new reading arrives
+# (conditional GETs are answered from it with 304; 0 disables the cache)
+SUMMARY_CACHE_SECONDS = float(os.environ.get('SUMMARY_CACHE_SECONDS', '10'))
+
+# Runtime profiling of a single route is opt-in (PROFILER_ENABLED=true)
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true'
+EVENT_LOOP_LAG_INTERVAL = float(os.environ.get('EVENT_LOOP_LAG_INTERVAL', '0.5'))
+
+# Tiered retention: raw readings and minute rollups expire via TTL indexes
+# (RETENTION_RAW_DAYS / RETENTION_MINUTE_DAYS, 0 = keep forever). Raw expiry
+# is off unless RETENTION_RAW_DAYS is set, e.g. RETENTION_RAW_DAYS=30
+RETENTION_POLICY = RetentionPolicy.from_env()
+
+# Idempotency keys of recently stored readings kept in memory, so retransmits
+# are recognised without a Mongo round trip (the unique index backs it up)
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '100000'))
+
+# Streaming anomaly alerts evaluated on ingest (ALERTS_ENABLED=false disables);
+# the rolling state is primed from the newest ALERT_WARMUP_READINGS on startup
+ALERTS_ENABLED = os.environ.get('ALERTS_ENABLED', 'true').lower() == 'true'
+ALERT_WARMUP_READINGS = int(os.environ.get('ALERT_WARMUP_READINGS', '500'))
+
+# Analytics results are cached per (range, metrics, parameters) until an
+# ingest lands in the range; ANALYTICS_CACHE_SECONDS bounds how long readings
+# stored by other workers can go unseen. ANALYTICS_MAX_READINGS caps the
+# readings one request may load into memory.
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', '128'))
+ANALYTICS_CACHE_SECONDS = float(os.environ.get('ANALYTICS_CACHE_SECONDS', '60'))
+ANALYTICS_MAX_READINGS = int(os.environ.get('ANALYTICS_MAX_READINGS', '1000000'))
+
+# Optional store-and-forward buffer: with INGEST_BUFFER_PATH set, ingest is
+# acknowledged once readings are in a local SQLite write-ahead log and a
+# background flusher bulk-inserts them into Mongo. Beyond INGEST_BUFFER_MAX_MB
+# of unflushed readings, ingest answers 503 until the backlog drains.
+INGEST_BUFFER_PATH = os.environ.get('INGEST_BUFFER_PATH', '')
+INGEST_BUFFER_MAX_MB = float(os.environ.get('INGEST_BUFFER_MAX_MB', '256'))
+INGEST_BUFFER_FLUSH_BATCH = int(os.environ.get('INGEST_BUFFER_FLUSH_BATCH', '1000'))
+
 # Helper functions
+def to_utc(value: datetime) -> datetime:
+    """Return an aware UTC datetime (naive values are assumed to be UTC)."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def to_mongo_precision(value: datetime) -> datetime:
+    """Truncate to the millisecond precision BSON dates are stored with."""
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
 def prepare_for_mongo(data: dict) -> dict:
-    """Prepare data for MongoDB storage by converting datetime objects."""
+    """Prepare data for MongoDB storage by normalising timestamps to UTC datetimes."""
     if isinstance(data.get('timestamp'), datetime):
-        data['timestamp'] = data['timestamp'].isoformat()
+        data['timestamp'] = to_utc(data['timestamp'])
+    # Readings also store their position as GeoJSON for the 2dsphere index
+    if 'gps_latitude' in data and 'gps_longitude' in data:
+        location = geojson_point(data['gps_latitude'], data['gps_longitude'])
+        if location:
+            data[LOCATION_FIELD] = location
     return data
 
 def parse_from_mongo(item: dict) -> dict:
-    """Parse data from MongoDB by converting ISO strings back to datetime."""
+    """Parse data from MongoDB, converting legacy ISO string timestamps to datetime."""
     if isinstance(item.get('timestamp'), str):
         try:
             item['timestamp'] = datetime.fromisoformat(item['timestamp'].replace('Z', '+00:00'))
@@ -112,29 +351,478 @@ def parse_from_mongo(item: dict) -> dict:
             pass
     return item
 
+def projection_for(model) -> dict:
+    """Mongo projection returning just a model's fields, without ``_id``."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat().replace('+00:00', 'Z')
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def documents_to_json(docs: List[dict], model) -> bytes:
+    """Serialize projected documents as a JSON array, matching ``model``'s output.
+    
+    Documents were validated on ingest, so only legacy string timestamps are
+    parsed and missing defaulted fields filled in; UTC timestamps get a ``Z``
+    suffix like the pydantic models give them.
+    """
+    defaults = [
+        (name, field.default) for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    ]
+    for doc in docs:
+        parse_from_mongo(doc)
+        for name, default in defaults:
+            doc.setdefault(name, default)
+    return render_json(docs)
+
+def render_json(content: Any) -> bytes:
+    """Serialize plain JSON-compatible data (datetimes allowed) without model validation."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=json_default, separators=(',', ':')).encode()
+
+def build_summary_pipeline(match: dict, stddev: bool = False, percentiles: bool = False) -> List[dict]:
+    """Build a $match/$group pipeline computing per-metric statistics server-side."""
+    group: Dict[str, Any] = {"_id": None, "count": {"$sum": 1}}
+    for name, field in SUMMARY_METRICS.items():
+        group[f"{name}_avg"] = {"$avg": f"${field}"}
+        group[f"{name}_min"] = {"$min": f"${field}"}
+        group[f"{name}_max"] = {"$max": f"${field}"}
+        if stddev:
+            group[f"{name}_std"] = {"$stdDevPop": f"${field}"}
+        if percentiles:
+            group[f"{name}_pct"] = {
+                "$percentile": {"input": f"${field}", "p": [0.5, 0.95], "method": "approximate"}
+            }
+    # Battery reports its most recent value; sorting first lets $last pick it
+    group["battery_current"] = {"$last": "$battery_percentage"}
+    return [
+        {"$match": match},
+        {"$sort": {"timestamp": 1}},
+        {"$group": group},
+    ]
+
+def format_summary(group: dict, stddev: bool = False, percentiles: bool = False) -> dict:
+    """Shape a summary $group result into the per-metric response structure."""
+    summary = {}
+    for name in SUMMARY_METRICS:
+        stats = {
+            "avg": group.get(f"{name}_avg") or 0,
+            "min": group.get(f"{name}_min") or 0,
+        }
+        if name == "battery":
+            stats["current"] = group.get("battery_current") or 0
+        else:
+            stats["max"] = group.get(f"{name}_max") or 0
+        if stddev:
+            stats["std"] = group.get(f"{name}_std") or 0
+        if percentiles:
+            p50, p95 = group.get(f"{name}_pct") or [0, 0]
+            stats["p50"] = p50
+            stats["p95"] = p95
+        summary[name] = stats
+    return summary
+
+def lttb(data: List[Tuple[float, float]], threshold: int) -> List[Tuple[float, float]]:
+    """Downsample (x, y) points with Largest-Triangle-Three-Buckets.
+    
+    Keeps the first and last points and, for every bucket in between, the
+    point forming the largest triangle with the previously selected point and
+    the average of the next bucket, which preserves peaks and troughs.
+    """
+    n = len(data)
+    if threshold >= n or threshold < 3:
+        return list(data)
+    
+    sampled = [data[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average point of the next bucket
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_len = avg_end - avg_start
+        avg_x = sum(p[0] for p in data[avg_start:avg_end]) / avg_len
+        avg_y = sum(p[1] for p in data[avg_start:avg_end]) / avg_len
+        
+        # Pick the point in this bucket with the largest triangle area
+        ax, ay = data[a]
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        max_area = -1.0
+        max_index = range_start
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (data[j][1] - ay) - (ax - data[j][0]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                max_index = j
+        sampled.append(data[max_index])
+        a = max_index
+    
+    sampled.append(data[-1])
+    return sampled
+
+def parse_query_datetime(value: Optional[str], default: Optional[datetime]) -> Optional[datetime]:
+    """Parse an ISO datetime query parameter, raising 400 if it is malformed."""
+    if not value:
+        return default
+    try:
+        return to_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid datetime: {value}")
+
+def connection_status(last_reading: Optional[datetime], now: datetime) -> Tuple[bool, str, Optional[datetime]]:
+    """Online flag, connection quality and when that status last changed, from a buoy's newest reading time.
+    
+    A buoy is online with a reading in the last 10 minutes; quality is
+    excellent under 2 minutes, good under 5 and poor otherwise. The status
+    also changes when quality degrades without a new reading, so the change
+    time moves forward past each threshold crossed.
+    """
+    if last_reading is None:
+        return False, "offline", None
+    elapsed = (now - last_reading).total_seconds()
+    if elapsed < 120:
+        is_online, quality = True, "excellent"
+    elif elapsed < 300:
+        is_online, quality = True, "good"
+    elif elapsed < 600:
+        is_online, quality = True, "poor"
+    else:
+        is_online, quality = False, "offline"
+    changed_at = last_reading
+    for seconds in (120, 300, 600):
+        if elapsed >= seconds:
+            changed_at = last_reading + timedelta(seconds=seconds)
+    return is_online, quality, changed_at
+
+class LatestStateCache:
+    """Write-through cache of the newest reading and the total reading count.
+    
+    Ingest paths call ``record`` so this worker sees its own writes at once;
+    the cache is re-read from Mongo when it is older than ``max_age`` so
+    writes made by other workers show up within that bound. Recorded
+    readings are truncated to Mongo's millisecond precision and ties are
+    broken on id as in Mongo, so a refresh does not change the watermark.
+    """
+    
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self.latest: Optional[BuoyReading] = None
+        self.total_readings = 0
+        self.refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+    
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.refreshed_at >= self.max_age
+    
+    async def refresh(self):
+        """Rebuild the cache from Mongo."""
+        total_readings = await readings_collection.estimated_document_count()
+        latest = await readings_collection.find_one({}, sort=[("timestamp", -1), ("id", -1)])
+        self.latest = BuoyReading(**parse_from_mongo(latest)) if latest else None
+        self.total_readings = total_readings
+        self.refreshed_at = time.monotonic()
+    
+    async def get(self) -> "LatestStateCache":
+        """Return the cache, refreshing it first if it has gone stale."""
+        if self.is_stale():
+            async with self._lock:
+                if self.is_stale():
+                    await self.refresh()
+        return self
+    
+    def record(self, readings: List[BuoyReading]):
+        """Apply newly stored readings to the cache."""
+        self.total_readings += len(readings)
+        for reading in readings:
+            timestamp = to_mongo_precision(reading.timestamp)
+            if self.latest is None or (timestamp, reading.id) > (self.latest.timestamp, self.latest.id):
+                self.latest = reading.model_copy(update={"timestamp": timestamp})
+    
+    def watermark(self) -> Tuple[Optional[str], Optional[datetime], int]:
+        """Identity of the newest ingest seen, for HTTP validators and response caches."""
+        if self.latest is None:
+            return None, None, self.total_readings
+        return self.latest.id, self.latest.timestamp, self.total_readings
+    
+    def reset(self):
+        """Mark the collection as empty (after all readings were deleted)."""
+        self.latest = None
+        self.total_readings = 0
+        self.refreshed_at = time.monotonic()
+
+latest_cache = LatestStateCache(LATEST_CACHE_MAX_AGE)
+summary_cache = ResponseCache(SUMMARY_CACHE_SECONDS)
+analytics_cache = AnalyticsCache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_SECONDS)
+route_profiler = RouteProfiler()
+background_tasks: List[asyncio.Task] = []
+retention_compactor = RetentionCompactor(
+    readings_collection, db.buoy_rollups, db.retention, SUMMARY_METRICS, RETENTION_POLICY
+) if RETENTION_POLICY.enabled else None
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE)
+alert_engine = AlertEngine(AlertConfig.from_env(), default_buoy=DEFAULT_BUOY_ID) if ALERTS_ENABLED else None
+stream_hub = StreamHub(queue_size=STREAM_QUEUE_SIZE, max_subscribers=STREAM_MAX_SUBSCRIBERS)
+
+def publish_readings(readings: List[BuoyReading]):
+    """Fan newly stored readings out to live stream subscribers."""
+    if stream_hub.subscribers:
+        stream_hub.publish([jsonable_encoder(r) for r in readings])
+
+def parse_stream_metrics(metrics: Optional[str]) -> Optional[frozenset]:
+    """Turn a comma-separated metric filter into the set of reading fields to send."""
+    if not metrics:
+        return None
+    fields = set()
+    for name in metrics.split(','):
+        name = name.strip()
+        if name not in STREAM_METRIC_FIELDS:
+            raise ValueError(f"Unknown metric: {name}")
+        fields.update(STREAM_METRIC_FIELDS[name])
+    return frozenset(fields)
+
+def encode_cursor(reading: dict) -> str:
+    """Encode the (timestamp, id) sort key of a reading as an opaque page cursor."""
+    key = {"t": reading["timestamp"].isoformat(), "id": reading["id"]}
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a page cursor back into its (timestamp, id) sort key."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return to_utc(datetime.fromisoformat(key["t"])), str(key["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 async def get_firebase_data(path: str) -> Optional[Dict[Any, Any]]:
     """Get data from Firebase Realtime Database."""
-    if not firebase_app:
+    if not firebase_reference:
         return None
     try:
-        ref = firebase_db.reference(path, app=firebase_app)
-        return ref.get()
+        ref = firebase_reference(path)
+        return await asyncio.to_thread(ref.get)
     except Exception as e:
         logging.error(f"Firebase read error: {e}")
         return None
 
+def build_firebase_payload(reading_obj: BuoyReading) -> dict:
+    """Build the Firebase representation of a buoy reading."""
+    return {
+        "gps": {
+            "lat": reading_obj.gps_latitude,
+            "lng": reading_obj.gps_longitude
+        },
+        "battery": reading_obj.battery_percentage,
+        "turbidity": reading_obj.water_turbidity,
+        "temperature": reading_obj.water_temperature,
+        "humidity": reading_obj.humidity,
+        "pressure": reading_obj.air_pressure,
+        "objectClass": reading_obj.detected_object_class or "unknown",
+        "timestamp": reading_obj.timestamp.isoformat()
+    }
+
 async def set_firebase_data(path: str, data: dict) -> bool:
     """Set data to Firebase Realtime Database."""
-    if not firebase_app:
+    if not firebase_reference:
         return False
     try:
-        ref = firebase_db.reference(path, app=firebase_app)
-        ref.set(data)
+        ref = firebase_reference(path)
+        await asyncio.to_thread(ref.set, data)
         return True
     except Exception as e:
         logging.error(f"Firebase write error: {e}")
         return False
 
+def compacted_until() -> Optional[datetime]:
+    """Readings before this are also covered by minute rollups (None if not compacting)."""
+    return retention_compactor.compacted_until if retention_compactor else None
+
+# Hourly/daily rollups are complete from here on (None: everywhere); loaded at startup
+rollups_covered_from: Optional[datetime] = None
+
+async def update_rollups(reading_dicts: List[dict]):
+    """Fold stored readings into the hourly/daily rollups (failures are logged, not raised)."""
+    try:
+        await apply_rollups(db.buoy_rollups, reading_dicts, SUMMARY_METRICS, compacted_until())
+        if retention_compactor:
+            await retention_compactor.mark_late(reading_dicts)
+    except Exception as e:
+        logging.error(f"Error updating rollups: {e}")
+
+async def rollup_writer_heartbeat(interval: float):
+    """Keep this worker's rollup writer heartbeat fresh (failures are logged, not raised)."""
+    while True:
+        try:
+            await record_rollup_writer(db.rollup_writers, WORKER_ID, host=socket.gethostname(), pid=os.getpid())
+        except Exception as e:
+            logging.error(f"Error recording worker heartbeat: {e}")
+        await asyncio.sleep(interval)
+
+async def update_fleet(reading_dicts: List[dict]):
+    """Fold stored readings into the per-buoy registry (failures are logged, not raised)."""
+    try:
+        await apply_fleet_updates(db.buoy_fleet, reading_dicts, BuoyReading.model_fields)
+    except Exception as e:
+        logging.error(f"Error updating fleet registry: {e}")
+
+async def update_detections(reading_dicts: List[dict]):
+    """Record detection events and per-class counts for stored readings (failures are logged, not raised)."""
+    try:
+        await apply_detections(db.detection_events, db.detection_counts, reading_dicts)
+    except Exception as e:
+        logging.error(f"Error updating detection events: {e}")
+
+async def get_fleet_entry(buoy_id: str) -> dict:
+    """A buoy's registry document, raising 404 for buoys that never sent a reading."""
+    try:
+        entry = await db.buoy_fleet.find_one({"_id": buoy_id})
+    except Exception as e:
+        logging.error(f"Error getting fleet registry: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get buoy")
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Unknown buoy: {buoy_id}")
+    return entry
+
+def fleet_status(entry: dict, now: datetime) -> FleetBuoyStatus:
+    is_online, connection_quality, _ = connection_status(entry.get("last_reading"), now)
+    return FleetBuoyStatus(
+        buoy_id=entry["_id"],
+        is_online=is_online,
+        last_reading=entry.get("last_reading"),
+        first_reading=entry.get("first_reading"),
+        connection_quality=connection_quality,
+        total_readings=entry.get("total_readings", 0),
+        latest=BuoyReading(**entry["latest"]) if entry.get("latest") else None
+    )
+
+async def find_by_idempotency_keys(keys: List[str]) -> Dict[str, str]:
+    """Ids of stored readings with the given idempotency keys (also cached)."""
+    found = {}
+    async for doc in readings_collection.find(
+        {IDEMPOTENCY_FIELD: {"$in": keys}}, {"_id": 0, "id": 1, "timestamp": 1, IDEMPOTENCY_FIELD: 1}
+    ):
+        found[doc[IDEMPOTENCY_FIELD]] = doc["id"]
+        idempotency_cache.add(doc[IDEMPOTENCY_FIELD], doc["id"], doc["timestamp"])
+    return found
+
+async def evaluate_alerts(reading_dicts: List[dict]):
+    """Run stored readings through the alert engine and persist any alerts raised (failures are logged, not raised)."""
+    if not alert_engine:
+        return
+    alerts: List[Alert] = []
+    try:
+        for reading_dict in sorted(reading_dicts, key=lambda d: d["timestamp"]):
+            alerts.extend(alert_engine.evaluate(reading_dict))
+    except Exception as e:
+        logging.error(f"Error evaluating alerts: {e}")
+    if not alerts:
+        return
+    record_alerts(alerts)
+    try:
+        await db.buoy_alerts.insert_many([prepare_for_mongo(a.model_dump()) for a in alerts])
+    except Exception as e:
+        logging.error(f"Error storing alerts: {e}")
+
+def mirror_to_firebase(readings: List[BuoyReading]):
+    """Queue stored readings for write-behind sync to Firebase (never blocks ingest)."""
+    if not firebase_sync or not readings:
+        return
+    latest = max(readings, key=lambda r: r.timestamp)
+    firebase_sync.enqueue(
+        current=build_firebase_payload(latest),
+        historical={r.id.replace('-', ''): build_firebase_payload(r) for r in readings}
+    )
+
+async def process_stored(readings: List[BuoyReading], reading_dicts: List[dict]):
+    """Bring rollups, fleet registry, detections, alerts, caches, live stream and Firebase up to date with new readings."""
+    if reading_dicts:
+        timestamps = [d["timestamp"] for d in reading_dicts]
+        analytics_cache.invalidate(min(timestamps), max(timestamps), {d["buoy_id"] for d in reading_dicts})
+    # Independent writes, so run them concurrently; each logs its own failure
+    await asyncio.gather(
+        update_rollups(reading_dicts),
+        update_fleet(reading_dicts),
+        update_detections(reading_dicts),
+        evaluate_alerts(reading_dicts),
+    )
+    latest_cache.record(readings)
+    publish_readings(readings)
+    
+    # Sync to Firebase (current + historical) in the background
+    mirror_to_firebase(readings)
+
+async def store_buffered_readings(reading_dicts: List[dict]):
+    """Flush callback of the ingest buffer: insert a drained batch into Mongo.
+    
+    Readings already stored (a batch replayed after a crash, or a repeated
+    idempotency key) are skipped and other rejected documents are logged and
+    dropped, so only failures worth retrying (Mongo unreachable) propagate.
+    """
+    if not UNIQUE_READING_INDEXES:
+        # No unique indexes will reject replays, so look them up first
+        ids = set(await readings_collection.distinct("id", {"id": {"$in": [d["id"] for d in reading_dicts]}}))
+        keys = [d[IDEMPOTENCY_FIELD] for d in reading_dicts if d.get(IDEMPOTENCY_FIELD)]
+        known = await find_by_idempotency_keys(keys) if keys else {}
+        if known:
+            record_duplicates("buffer", "index", len(known))
+        reading_dicts = [
+            d for d in reading_dicts if d["id"] not in ids and d.get(IDEMPOTENCY_FIELD) not in known
+        ]
+    if not reading_dicts:
+        return
+    stored = reading_dicts
+    try:
+        await readings_collection.insert_many(reading_dicts, ordered=False)
+    except BulkWriteError as e:
+        failed = set()
+        for write_error in e.details.get('writeErrors', []):
+            failed.add(write_error['index'])
+            if is_duplicate_key_error(write_error):
+                record_duplicates("buffer", "index")
+            elif write_error.get('code') != 11000:
+                logging.error(f"Dropping buffered reading: {write_error.get('errmsg', 'Write failed')}")
+                record_ingest("buffer", 0, rejected=1)
+        stored = [d for i, d in enumerate(reading_dicts) if i not in failed]
+    record_ingest("buffer", len(stored))
+    await process_stored([BuoyReading(**d) for d in stored], stored)
+
+ingest_buffer = IngestBuffer(
+    INGEST_BUFFER_PATH,
+    store_buffered_readings,
+    max_bytes=int(INGEST_BUFFER_MAX_MB * 1024 * 1024),
+    max_batch=INGEST_BUFFER_FLUSH_BATCH,
+) if INGEST_BUFFER_PATH else None
+if ingest_buffer:
+    track_ingest_buffer(ingest_buffer)
+
+async def append_to_buffer(endpoint: str, reading_dicts: List[dict]):
+    """Write readings to the ingest buffer, answering 503 while its disk budget is used up."""
+    try:
+        await ingest_buffer.append(reading_dicts)
+    except BufferFull as e:
+        record_ingest(endpoint, 0, rejected=len(reading_dicts))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        logging.error(f"Error buffering readings: {e}")
+        record_ingest(endpoint, 0, rejected=len(reading_dicts))
+        raise HTTPException(status_code=500, detail="Failed to buffer readings")
+
+def batch_result(total: int, results: List[BatchItemResult]) -> BatchIngestResult:
+    inserted = sum(1 for r in results if r.success and not r.duplicate)
+    duplicates = sum(1 for r in results if r.duplicate)
+    failed = total - inserted - duplicates
+    record_ingest("batch", 0, rejected=failed)
+    return BatchIngestResult(
+        total=total,
+        inserted=inserted,
+        failed=failed,
+        duplicates=duplicates,
+        results=results
+    )
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -144,37 +832,41 @@ async def root():
         "firebase_status": "configured" if firebase_app else "not_configured"
     }
 
+@api_router.get("/firebase/sync")
+async def get_firebase_sync_metrics():
+    """Get write-behind Firebase sync queue depth, lag and counters."""
+    if not firebase_sync:
+        return {"enabled": False}
+    return firebase_sync.metrics()
+
+@api_router.get("/buffer")
+async def get_ingest_buffer_metrics():
+    """Get the store-and-forward ingest buffer's backlog, lag and counters."""
+    if not ingest_buffer:
+        return {"enabled": False}
+    return ingest_buffer.metrics()
+
 @api_router.get("/buoy/status", response_model=BuoyStatus)
-async def get_buoy_status():
-    """Get current buoy status and connection info."""
+async def get_buoy_status(request: Request, response: Response):
+    """Get current buoy status and connection info.
+    
+    Supports conditional GETs: the ETag covers the newest reading, the total
+    and the connection quality, and Last-Modified is the newest reading's
+    time or the later moment the quality last degraded.
+    """
     try:
-        # Count total readings
-        total_readings = await db.buoy_readings.count_documents({})
+        # Total count and latest reading come from the in-memory cache
+        state = await latest_cache.get()
+        total_readings = state.total_readings
         
-        # Get latest reading
-        latest_reading = await db.buoy_readings.find_one(
-            {}, sort=[("timestamp", -1)]
-        )
-        
-        last_reading = None
-        is_online = False
-        connection_quality = "offline"
+        last_reading = state.latest.timestamp if state.latest else None
+        is_online, connection_quality, last_modified = connection_status(last_reading, datetime.now(timezone.utc))
         
-        if latest_reading:
-            latest_reading = parse_from_mongo(latest_reading)
-            last_reading = latest_reading.get('timestamp')
-            
-            # Determine if buoy is online (reading within last 10 minutes)
-            if last_reading:
-                time_diff = datetime.now(timezone.utc) - last_reading
-                if time_diff.total_seconds() < 600:  # 10 minutes
-                    is_online = True
-                    if time_diff.total_seconds() < 120:  # 2 minutes
-                        connection_quality = "excellent"
-                    elif time_diff.total_seconds() < 300:  # 5 minutes
-                        connection_quality = "good"
-                    else:
-                        connection_quality = "poor"
+        etag = strong_etag(*latest_cache.watermark(), connection_quality)
+        headers = validator_headers(etag, last_modified)
+        if is_not_modified(request.headers, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
         
         return BuoyStatus(
             is_online=is_online,
@@ -187,58 +879,186 @@ async def get_buoy_status():
         raise HTTPException(status_code=500, detail="Failed to get buoy status")
 
 @api_router.post("/buoy/readings", response_model=BuoyReading)
-async def create_buoy_reading(reading: BuoyReadingCreate):
-    """Create a new buoy sensor reading."""
+async def create_buoy_reading(reading: BuoyReadingCreate, response: Response):
+    """Create a new buoy sensor reading.
+    
+    A reading repeating an earlier ``idempotency_key`` is not stored again;
+    the stored reading's id and timestamp are returned with ``X-Duplicate: true``.
+    With the ingest buffer enabled the reading is acknowledged once it is on
+    local disk (``X-Buffered: true``) and stored in Mongo shortly after.
+    """
+    key = reading.idempotency_key
+    if key:
+        existing = idempotency_cache.get(key)
+        if existing:
+            record_duplicates("single", "cache")
+            response.headers["X-Duplicate"] = "true"
+            return BuoyReading(**reading.model_dump(exclude={"timestamp"}), id=existing[0], timestamp=existing[1])
     try:
         # Create reading object
-        reading_obj = BuoyReading(**reading.dict())
+        reading_obj = reading.to_reading()
         
         # Store in MongoDB
-        reading_dict = prepare_for_mongo(reading_obj.dict())
-        await db.buoy_readings.insert_one(reading_dict)
-        
-        # Sync to Firebase if available
-        if firebase_app:
-            firebase_data = {
-                "gps": {
-                    "lat": reading.gps_latitude,
-                    "lng": reading.gps_longitude
-                },
-                "battery": reading.battery_percentage,
-                "turbidity": reading.water_turbidity,
-                "temperature": reading.water_temperature,
-                "humidity": reading.humidity,
-                "pressure": reading.air_pressure,
-                "objectClass": reading.detected_object_class or "unknown",
-                "timestamp": reading_obj.timestamp.isoformat()
-            }
-            
-            # Update current reading
-            await set_firebase_data('buoy_data/current', firebase_data)
-            
-            # Add to historical data
-            reading_id = reading_obj.id.replace('-', '')
-            await set_firebase_data(f'buoy_data/historical/{reading_id}', firebase_data)
+        reading_dict = prepare_for_mongo(reading_obj.model_dump())
+        if key:
+            reading_dict[IDEMPOTENCY_FIELD] = key
+        if ingest_buffer:
+            await append_to_buffer("single", [reading_dict])
+            if key:
+                idempotency_cache.add(key, reading_obj.id, reading_obj.timestamp)
+            response.headers["X-Buffered"] = "true"
+            return reading_obj
+        stored = None
+        try:
+            if key and not UNIQUE_READING_INDEXES:
+                # No unique index will reject a repeat, so look it up first
+                stored = await readings_collection.find_one({IDEMPOTENCY_FIELD: key}, projection_for(BuoyReading))
+            if stored is None:
+                await readings_collection.insert_one(reading_dict)
+        except DuplicateKeyError:
+            if not key:
+                raise
+            stored = await readings_collection.find_one({IDEMPOTENCY_FIELD: key}, projection_for(BuoyReading))
+        if stored:
+            # Stored earlier but no longer (or never) in this worker's cache
+            stored = parse_from_mongo(stored)
+            idempotency_cache.add(key, stored["id"], stored["timestamp"])
+            record_duplicates("single", "index")
+            response.headers["X-Duplicate"] = "true"
+            return BuoyReading(**stored)
+        if key:
+            idempotency_cache.add(key, reading_obj.id, reading_obj.timestamp)
+        record_ingest("single", 1)
+        await process_stored([reading_obj], [reading_dict])
         
         return reading_obj
     
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error creating buoy reading: {e}")
+        record_ingest("single", 0, rejected=1)
         raise HTTPException(status_code=500, detail="Failed to create reading")
 
+@api_router.post("/buoy/readings/batch", response_model=BatchIngestResult)
+async def create_buoy_readings_batch(readings: List[Dict[str, Any]]):
+    """Create many buoy readings in one request (gateway replay after an outage).
+    
+    With the ingest buffer enabled the accepted readings are acknowledged
+    once they are on local disk and stored in Mongo shortly after.
+    """
+    if len(readings) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(readings)} readings (max {MAX_BATCH_SIZE})"
+        )
+    
+    # Validate the whole batch up front so one bad item does not abort the rest
+    results: List[BatchItemResult] = []
+    accepted: List[BuoyReading] = []
+    accepted_indexes: List[int] = []
+    accepted_keys: List[Optional[str]] = []
+    batch_keys: Dict[str, str] = {}
+    for index, item in enumerate(readings):
+        try:
+            create = BuoyReadingCreate(**item)
+            reading_obj = create.to_reading()
+        except ValidationError as e:
+            results.append(BatchItemResult(index=index, success=False, error=str(e)))
+            continue
+        key = create.idempotency_key
+        if key:
+            # Repeats already stored, or earlier in this same batch
+            existing = idempotency_cache.get(key)
+            existing_id = existing[0] if existing else batch_keys.get(key)
+            if existing_id:
+                record_duplicates("batch", "cache")
+                results.append(BatchItemResult(index=index, success=True, id=existing_id, duplicate=True))
+                continue
+            batch_keys[key] = reading_obj.id
+        accepted.append(reading_obj)
+        accepted_indexes.append(index)
+        accepted_keys.append(key)
+        results.append(BatchItemResult(index=index, success=True, id=reading_obj.id))
+    
+    if accepted:
+        reading_dicts = [prepare_for_mongo(r.model_dump()) for r in accepted]
+        for reading_dict, key in zip(reading_dicts, accepted_keys):
+            if key:
+                reading_dict[IDEMPOTENCY_FIELD] = key
+        if ingest_buffer:
+            await append_to_buffer("batch", reading_dicts)
+            for reading_obj, key in zip(accepted, accepted_keys):
+                if key:
+                    idempotency_cache.add(key, reading_obj.id, reading_obj.timestamp)
+            return batch_result(len(readings), results)
+        duplicate_keys: Dict[str, BatchItemResult] = {}
+        if not UNIQUE_READING_INDEXES and any(accepted_keys):
+            # No unique index will reject repeats, so look cache misses up first
+            try:
+                known = await find_by_idempotency_keys([key for key in accepted_keys if key])
+            except Exception as e:
+                logging.error(f"Error looking up idempotency keys: {e}")
+                raise HTTPException(status_code=500, detail="Failed to create readings")
+            for index, key in zip(accepted_indexes, accepted_keys):
+                if key in known:
+                    results[index].duplicate = True
+                    results[index].id = known[key]
+            record_duplicates("batch", "index", len(known))
+        pending = [p for p, i in enumerate(accepted_indexes) if not results[i].duplicate]
+        try:
+            # Unordered so a failing document does not stop the remaining inserts
+            if pending:
+                await readings_collection.insert_many([reading_dicts[p] for p in pending], ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                position = pending[write_error['index']]
+                result = results[accepted_indexes[position]]
+                key = accepted_keys[position]
+                if key and is_duplicate_key_error(write_error):
+                    result.duplicate = True
+                    duplicate_keys[key] = result
+                    continue
+                result.success = False
+                result.error = write_error.get('errmsg', 'Write failed')
+        except Exception as e:
+            logging.error(f"Error creating buoy readings batch: {e}")
+            raise HTTPException(status_code=500, detail="Failed to create readings")
+        
+        if duplicate_keys:
+            # Stored earlier but not in this worker's cache: report the stored ids
+            record_duplicates("batch", "index", len(duplicate_keys))
+            try:
+                for key, reading_id in (await find_by_idempotency_keys(list(duplicate_keys))).items():
+                    duplicate_keys[key].id = reading_id
+            except Exception as e:
+                logging.error(f"Error looking up duplicate readings: {e}")
+        
+        new = [results[i].success and not results[i].duplicate for i in accepted_indexes]
+        stored = [r for r, ok in zip(accepted, new) if ok]
+        for reading_obj, key, ok in zip(accepted, accepted_keys, new):
+            if ok and key:
+                idempotency_cache.add(key, reading_obj.id, reading_obj.timestamp)
+        record_ingest("batch", len(stored))
+        await process_stored(stored, [d for d, ok in zip(reading_dicts, new) if ok])
+    
+    return batch_result(len(readings), results)
+
 @api_router.get("/buoy/readings/latest", response_model=BuoyReading)
-async def get_latest_reading():
-    """Get the most recent buoy reading."""
+async def get_latest_reading(request: Request, response: Response):
+    """Get the most recent buoy reading (supports ETag / Last-Modified revalidation)."""
     try:
-        reading = await db.buoy_readings.find_one(
-            {}, sort=[("timestamp", -1)]
-        )
+        state = await latest_cache.get()
         
-        if not reading:
+        if not state.latest:
             raise HTTPException(status_code=404, detail="No readings found")
         
-        reading = parse_from_mongo(reading)
-        return BuoyReading(**reading)
+        etag = strong_etag(state.latest.id, state.latest.timestamp.isoformat())
+        headers = validator_headers(etag, state.latest.timestamp)
+        if is_not_modified(request.headers, etag, state.latest.timestamp):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return state.latest
     
     except HTTPException:
         raise
@@ -248,116 +1068,928 @@ async def get_latest_reading():
 
 @api_router.get("/buoy/readings", response_model=List[BuoyReading])
 async def get_readings(
+    response: Response,
     limit: int = 100,
     skip: int = 0,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    """Get historical buoy readings with optional date filtering."""
+    """Get historical buoy readings with optional date filtering.
+    
+    Pages can be walked with ``skip``/``limit`` or, at constant cost per page,
+    by passing the ``X-Next-Cursor`` response header back as ``cursor``
+    (``skip`` is ignored when a cursor is given).
+    """
+    return await find_readings_page({}, response, limit, skip, start_date, end_date, cursor)
+
+async def find_readings_page(
+    base_filter: dict,
+    response: Response,
+    limit: int,
+    skip: int,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    cursor: Optional[str]
+):
+    """One page of readings matching ``base_filter``, newest first (see ``get_readings``)."""
+    after = decode_cursor(cursor) if cursor else None
     try:
         # Build query filter
-        query_filter = {}
+        query_filter = dict(base_filter)
         
         if start_date:
-            start_dt = datetime.fromisoformat(start_date)
-            query_filter["timestamp"] = {"$gte": start_dt.isoformat()}
+            start_dt = to_utc(datetime.fromisoformat(start_date))
+            query_filter["timestamp"] = {"$gte": start_dt}
         
         if end_date:
-            end_dt = datetime.fromisoformat(end_date)
+            end_dt = to_utc(datetime.fromisoformat(end_date))
             if "timestamp" in query_filter:
-                query_filter["timestamp"]["$lte"] = end_dt.isoformat()
+                query_filter["timestamp"]["$lte"] = end_dt
             else:
-                query_filter["timestamp"] = {"$lte": end_dt.isoformat()}
+                query_filter["timestamp"] = {"$lte": end_dt}
+        
+        # Keyset pagination: continue strictly after the cursor's (timestamp, id)
+        if after:
+            after_ts, after_id = after
+            keyset = {"$or": [
+                {"timestamp": {"$lt": after_ts}},
+                {"timestamp": after_ts, "id": {"$lt": after_id}}
+            ]}
+            query_filter = {"$and": [query_filter, keyset]} if query_filter else keyset
+            skip = 0
         
         # Query database
-        readings = await db.buoy_readings.find(query_filter)\
-            .sort("timestamp", -1)\
+        projection = projection_for(BuoyReading) if FAST_JSON else None
+        readings = await readings_collection.find(query_filter, projection)\
+            .sort([("timestamp", -1), ("id", -1)])\
             .skip(skip)\
             .limit(limit)\
             .to_list(length=limit)
         
+        if FAST_JSON:
+            content = documents_to_json(readings, BuoyReading)
+            headers = {}
+            if limit and len(readings) == limit:
+                headers["X-Next-Cursor"] = encode_cursor(readings[-1])
+            return Response(content=content, media_type="application/json", headers=headers)
+        
         # Parse readings
         parsed_readings = [parse_from_mongo(reading) for reading in readings]
+        if limit and len(parsed_readings) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(parsed_readings[-1])
         return [BuoyReading(**reading) for reading in parsed_readings]
     
     except Exception as e:
         logging.error(f"Error getting readings: {e}")
         raise HTTPException(status_code=500, detail="Failed to get readings")
 
-@api_router.get("/buoy/readings/summary")
-async def get_readings_summary(hours: int = 24):
-    """Get summarized statistics for recent readings."""
+async def find_readings_in_area(geo_filter: dict, start_date: Optional[str], end_date: Optional[str], limit: int):
+    """Readings matching a geospatial filter and optional time window, newest first."""
+    start_dt = parse_query_datetime(start_date, None)
+    end_dt = parse_query_datetime(end_date, None)
+    query_filter = dict(geo_filter)
+    if start_dt or end_dt:
+        query_filter["timestamp"] = {}
+        if start_dt:
+            query_filter["timestamp"]["$gte"] = start_dt
+        if end_dt:
+            query_filter["timestamp"]["$lte"] = end_dt
     try:
-        # Calculate time threshold
-        threshold = datetime.now(timezone.utc) - timedelta(hours=hours)
-        
-        # Query recent readings
-        readings = await db.buoy_readings.find({
-            "timestamp": {"$gte": threshold.isoformat()}
-        }).to_list(length=1000)
-        
-        if not readings:
+        projection = projection_for(BuoyReading) if FAST_JSON else None
+        readings = await readings_collection.find(query_filter, projection)\
+            .sort([("timestamp", -1), ("id", -1)])\
+            .limit(limit)\
+            .to_list(length=limit)
+        if FAST_JSON:
+            return Response(content=documents_to_json(readings, BuoyReading), media_type="application/json")
+        return [BuoyReading(**parse_from_mongo(reading)) for reading in readings]
+    except Exception as e:
+        logging.error(f"Error getting readings by area: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get readings")
+
+@api_router.get("/buoy/readings/area", response_model=List[BuoyReading])
+async def get_readings_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    """Get readings taken inside a latitude/longitude bounding box, newest first."""
+    if min_lat >= max_lat or min_lng >= max_lng:
+        raise HTTPException(status_code=400, detail="Bounding box minimums must be below its maximums")
+    return await find_readings_in_area(bbox_filter(min_lat, min_lng, max_lat, max_lng), start_date, end_date, limit)
+
+@api_router.get("/buoy/readings/nearby", response_model=List[BuoyReading])
+async def get_readings_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(..., gt=0, le=1_000_000),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    """Get readings taken within ``radius_m`` metres of a point, newest first."""
+    return await find_readings_in_area(radius_filter(lat, lng, radius_m), start_date, end_date, limit)
+
+@api_router.get("/buoy/track")
+async def get_track(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    tolerance_m: float = Query(10.0, ge=0),
+    buoy_id: Optional[str] = None
+):
+    """Get a buoy's GPS track between two times (default: the last 7 days).
+    
+    The path is simplified with Douglas-Peucker: every dropped fix lies
+    within ``tolerance_m`` metres of the returned polyline (0 keeps all).
+    Fixes of every buoy are merged unless ``buoy_id`` selects one, so fleet
+    deployments should pass it (or use ``/buoys/{buoy_id}/track``).
+    """
+    end_dt = parse_query_datetime(end_date, datetime.now(timezone.utc))
+    start_dt = parse_query_datetime(start_date, end_dt - timedelta(days=7))
+    if start_dt >= end_dt:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+    try:
+        query: Dict[str, Any] = {"timestamp": {"$gte": start_dt, "$lte": end_dt}}
+        if buoy_id:
+            query["buoy_id"] = buoy_id
+        points = await readings_collection.find(
+            query, {"_id": 0, "timestamp": 1, "gps_latitude": 1, "gps_longitude": 1}
+        ).sort("timestamp", 1).to_list(length=None)
+        track = await asyncio.to_thread(simplify_track, points, tolerance_m)
+        return {"start": start_dt, "end": end_dt, "tolerance_m": tolerance_m, "buoy_id": buoy_id, **track}
+    except Exception as e:
+        logging.error(f"Error getting track: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get track")
+
+@api_router.get("/buoy/readings/summary")
+async def get_readings_summary(request: Request, hours: int = 24, stddev: bool = False, percentiles: bool = False):
+    """Get summarized statistics for recent readings.
+    
+    Statistics come from the hourly/daily rollups plus raw readings at the
+    edges of the window and before the rollups existed (minute rollups where
+    raw data has been compacted). Set ``stddev`` to add the population standard
+    deviation and ``percentiles`` to add approximate p50/p95; percentiles
+    cannot be derived from rollups, so they use a single aggregation over raw
+    readings (requires MongoDB 7.0+).
+    
+    Rendered summaries are reused for ``SUMMARY_CACHE_SECONDS`` while no new
+    reading arrives, and revalidations against them are answered with 304.
+    """
+    return await summary_response(request, hours, stddev, percentiles)
+
+async def summary_response(request: Request, hours: int, stddev: bool, percentiles: bool,
+                           buoy_id: Optional[str] = None) -> Response:
+    """Cached, revalidatable summary response for the whole fleet or one buoy."""
+    key = (hours, stddev, percentiles, buoy_id)
+    watermark = (await latest_cache.get()).watermark()
+    cached = summary_cache.get(key, watermark)
+    if cached is None:
+        try:
+            summary = await compute_summary(hours, stddev, percentiles, buoy_id)
+        except Exception as e:
+            logging.error(f"Error getting summary: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get summary")
+        cached = summary_cache.put(key, watermark, JSONResponse(content=jsonable_encoder(summary)).body)
+    
+    headers = validator_headers(cached.etag, cached.modified_at)
+    if is_not_modified(request.headers, cached.etag, cached.modified_at):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+async def compute_summary(hours: int, stddev: bool, percentiles: bool, buoy_id: Optional[str] = None) -> dict:
+    """Summary statistics over the last ``hours`` (see ``get_readings_summary``).
+    
+    Rollups are kept for the fleet as a whole, so a single buoy's summary
+    aggregates its raw readings over the (buoy_id, timestamp) index.
+    """
+    # Calculate time threshold
+    now = datetime.now(timezone.utc)
+    threshold = now - timedelta(hours=hours)
+    
+    if USE_ROLLUPS and not percentiles and buoy_id is None:
+        stats = await range_stats(
+            readings_collection, db.buoy_rollups, threshold, now, SUMMARY_METRICS,
+            compacted_until=compacted_until(), covered_from=rollups_covered_from
+        )
+        if not stats:
             return {
                 "period_hours": hours,
                 "total_readings": 0,
                 "summary": {}
             }
+        group: Dict[str, Any] = {"count": max(s["count"] for s in stats.values())}
+        for name, metric_stats in stats.items():
+            described = describe(metric_stats)
+            for key in ("avg", "min", "max", "std"):
+                group[f"{name}_{key}"] = described[key]
+        group["battery_current"] = stats.get("battery", {}).get("last")
+        return {
+            "period_hours": hours,
+            "total_readings": group["count"],
+            "summary": format_summary(group, stddev=stddev)
+        }
+    
+    match: Dict[str, Any] = {"timestamp": {"$gte": threshold}}
+    if buoy_id is not None:
+        match["buoy_id"] = buoy_id
+    pipeline = build_summary_pipeline(match, stddev=stddev, percentiles=percentiles)
+    groups = await readings_collection.aggregate(pipeline).to_list(length=1)
+    
+    if not groups:
+        return {
+            "period_hours": hours,
+            "total_readings": 0,
+            "summary": {}
+        }
+    
+    return {
+        "period_hours": hours,
+        "total_readings": groups[0]["count"],
+        "summary": format_summary(groups[0], stddev=stddev, percentiles=percentiles)
+    }
+
+@api_router.get("/fleet/status", response_model=List[FleetBuoyStatus])
+async def get_fleet_status():
+    """Get the status and newest reading of every buoy.
+    
+    Served from the per-buoy registry kept up to date on ingest: a single
+    query over one small document per buoy, however much history is stored.
+    """
+    try:
+        entries = await db.buoy_fleet.find({}).sort("_id", 1).to_list(length=None)
+    except Exception as e:
+        logging.error(f"Error getting fleet status: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get fleet status")
+    now = datetime.now(timezone.utc)
+    return [fleet_status(entry, now) for entry in entries]
+
+@api_router.get("/buoys/{buoy_id}/status", response_model=FleetBuoyStatus)
+async def get_buoy_device_status(buoy_id: str):
+    """Get one buoy's status and connection info."""
+    return fleet_status(await get_fleet_entry(buoy_id), datetime.now(timezone.utc))
+
+@api_router.get("/buoys/{buoy_id}/readings/latest", response_model=BuoyReading)
+async def get_buoy_device_latest(buoy_id: str, request: Request, response: Response):
+    """Get one buoy's most recent reading (supports ETag / Last-Modified revalidation)."""
+    entry = await get_fleet_entry(buoy_id)
+    if not entry.get("latest"):
+        raise HTTPException(status_code=404, detail="No readings found")
+    latest = BuoyReading(**entry["latest"])
+    etag = strong_etag(latest.id, latest.timestamp.isoformat())
+    headers = validator_headers(etag, latest.timestamp)
+    if is_not_modified(request.headers, etag, latest.timestamp):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return latest
+
+@api_router.get("/buoys/{buoy_id}/readings", response_model=List[BuoyReading])
+async def get_buoy_device_readings(
+    buoy_id: str,
+    response: Response,
+    limit: int = 100,
+    skip: int = 0,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    """Get one buoy's historical readings (same paging as ``/buoy/readings``)."""
+    await get_fleet_entry(buoy_id)
+    return await find_readings_page({"buoy_id": buoy_id}, response, limit, skip, start_date, end_date, cursor)
+
+@api_router.get("/buoys/{buoy_id}/readings/summary")
+async def get_buoy_device_summary(
+    buoy_id: str, request: Request, hours: int = 24, stddev: bool = False, percentiles: bool = False
+):
+    """Get summarized statistics for one buoy's recent readings."""
+    await get_fleet_entry(buoy_id)
+    return await summary_response(request, hours, stddev, percentiles, buoy_id)
+
+@api_router.get("/buoys/{buoy_id}/track")
+async def get_buoy_device_track(
+    buoy_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    tolerance_m: float = Query(10.0, ge=0)
+):
+    """Get one buoy's simplified GPS track (same parameters as ``/buoy/track``)."""
+    await get_fleet_entry(buoy_id)
+    return await get_track(start_date, end_date, tolerance_m, buoy_id)
+
+@api_router.get("/buoys/{buoy_id}/readings/series")
+async def get_buoy_device_series(
+    buoy_id: str,
+    metric: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    points: int = Query(500, ge=3, le=MAX_SERIES_POINTS),
+    mode: str = "buckets"
+):
+    """Get a downsampled time series of one buoy's metric (same parameters as ``/buoy/readings/series``)."""
+    await get_fleet_entry(buoy_id)
+    return await get_readings_series(metric, start, end, points, mode, buoy_id)
+
+@api_router.get("/buoy/readings/series")
+async def get_readings_series(
+    metric: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    points: int = Query(500, ge=3, le=MAX_SERIES_POINTS),
+    mode: str = "buckets",
+    buoy_id: Optional[str] = None
+):
+    """Get a downsampled time series of one metric for charting.
+    
+    ``buckets`` mode splits the range into ``points`` equal time buckets and
+    returns min/max/avg per bucket, all computed by Mongo. ``lttb`` mode
+    returns at most ``points`` raw readings chosen with
+    Largest-Triangle-Three-Buckets to preserve the shape of the curve.
+    ``buoy_id`` restricts the series to one buoy (rollups cover the whole
+    fleet, so its buckets are always computed from raw readings).
+    """
+    if metric not in SUMMARY_METRICS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metric: {metric} (expected one of {', '.join(SUMMARY_METRICS)})"
+        )
+    if mode not in ("buckets", "lttb"):
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+    
+    end_dt = parse_query_datetime(end, datetime.now(timezone.utc))
+    start_dt = parse_query_datetime(start, end_dt - timedelta(hours=24))
+    if start_dt >= end_dt:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    field = SUMMARY_METRICS[metric]
+    match: Dict[str, Any] = {"timestamp": {"$gte": start_dt, "$lte": end_dt}}
+    if buoy_id:
+        match["buoy_id"] = buoy_id
+    try:
+        if mode == "lttb":
+            cursor = readings_collection.find(match, {"_id": 0, "timestamp": 1, field: 1})\
+                .sort("timestamp", 1)\
+                .batch_size(5000)
+            raw = []
+            async for doc in cursor:
+                value = doc.get(field)
+                timestamp = parse_from_mongo(doc)["timestamp"]
+                if value is not None and isinstance(timestamp, datetime):
+                    raw.append((timestamp.timestamp(), value))
+            series = [
+                {"timestamp": datetime.fromtimestamp(x, timezone.utc), "value": y}
+                for x, y in lttb(raw, points)
+            ]
+            return {
+                "metric": metric,
+                "mode": mode,
+                "start": start_dt,
+                "end": end_dt,
+                "buoy_id": buoy_id,
+                "source_readings": len(raw),
+                "points": series
+            }
         
-        # Calculate statistics
-        temps = [r.get('water_temperature', 0) for r in readings]
-        turbidities = [r.get('water_turbidity', 0) for r in readings]
-        batteries = [r.get('battery_percentage', 0) for r in readings]
-        humidities = [r.get('humidity', 0) for r in readings]
-        pressures = [r.get('air_pressure', 0) for r in readings]
+        bucket_ms = max(1, -(-int((end_dt - start_dt).total_seconds() * 1000) // points))
         
-        summary = {
-            "temperature": {
-                "avg": sum(temps) / len(temps) if temps else 0,
-                "min": min(temps) if temps else 0,
-                "max": max(temps) if temps else 0
-            },
-            "turbidity": {
-                "avg": sum(turbidities) / len(turbidities) if turbidities else 0,
-                "min": min(turbidities) if turbidities else 0,
-                "max": max(turbidities) if turbidities else 0
-            },
-            "battery": {
-                "avg": sum(batteries) / len(batteries) if batteries else 0,
-                "min": min(batteries) if batteries else 0,
-                "current": batteries[-1] if batteries else 0
-            },
-            "humidity": {
-                "avg": sum(humidities) / len(humidities) if humidities else 0,
-                "min": min(humidities) if humidities else 0,
-                "max": max(humidities) if humidities else 0
-            },
-            "pressure": {
-                "avg": sum(pressures) / len(pressures) if pressures else 0,
-                "min": min(pressures) if pressures else 0,
-                "max": max(pressures) if pressures else 0
+        # Buckets of an hour or more are built from rollups (a minute or more
+        # when the whole range has been compacted): snap the bucket width to
+        # whole rollup buckets and the grid to a rollup boundary
+        granularity = None
+        origin = start_dt
+        if USE_ROLLUPS and not buoy_id:
+            watermark = compacted_until()
+            for name in ("day", "hour", COMPACTED_GRANULARITY):
+                if bucket_ms >= ROLLUP_WIDTHS[name].total_seconds() * 1000:
+                    granularity = name
+                    break
+            if granularity == COMPACTED_GRANULARITY and not (watermark and end_dt <= watermark):
+                granularity = None
+        if granularity:
+            width = ROLLUP_WIDTHS[granularity]
+            width_ms = int(width.total_seconds() * 1000)
+            bucket_ms = -(-bucket_ms // width_ms) * width_ms
+            origin = floor_time(start_dt, width)
+            # Only rollup buckets wholly inside the range (and, for hourly/daily
+            # rollups, inside their coverage) are used; the partial buckets at
+            # either edge are computed from raw readings on the same grid
+            rollups_start = ceil_time(start_dt, width)
+            if granularity in GRANULARITIES and rollups_covered_from:
+                rollups_start = max(rollups_start, ceil_time(rollups_covered_from, width))
+            rollups_end = floor_time(end_dt, width)
+            if rollups_start < rollups_end:
+                raw_ranges = [
+                    {"$gte": start_dt, "$lt": rollups_start},
+                    {"$gte": rollups_end, "$lte": end_dt}
+                ]
+            else:
+                raw_ranges = [match["timestamp"]]
+            queries = [readings_collection.aggregate([
+                {"$match": {
+                    "$or": [{"timestamp": timestamps} for timestamps in raw_ranges],
+                    field: {"$ne": None}
+                }},
+                {"$group": {
+                    "_id": {"$floor": {"$divide": [{"$subtract": ["$timestamp", origin]}, bucket_ms]}},
+                    "min": {"$min": f"${field}"},
+                    "max": {"$max": f"${field}"},
+                    "sum": {"$sum": f"${field}"},
+                    "count": {"$sum": 1}
+                }}
+            ]).to_list(length=points + 1)]
+            if rollups_start < rollups_end:
+                queries.append(db.buoy_rollups.aggregate([
+                    {"$match": {
+                        "granularity": granularity,
+                        "metric": metric,
+                        "bucket_start": {"$gte": rollups_start, "$lt": rollups_end}
+                    }},
+                    {"$group": {
+                        "_id": {"$floor": {"$divide": [{"$subtract": ["$bucket_start", origin]}, bucket_ms]}},
+                        "min": {"$min": "$min"},
+                        "max": {"$max": "$max"},
+                        "sum": {"$sum": "$sum"},
+                        "count": {"$sum": "$count"}
+                    }}
+                ]).to_list(length=points + 1))
+            merged: Dict[int, dict] = {}
+            for rows in await asyncio.gather(*queries):
+                for row in rows:
+                    bucket = merged.get(row["_id"])
+                    if bucket is None:
+                        merged[row["_id"]] = dict(row)
+                        continue
+                    bucket["min"] = min(bucket["min"], row["min"])
+                    bucket["max"] = max(bucket["max"], row["max"])
+                    bucket["sum"] += row["sum"]
+                    bucket["count"] += row["count"]
+            buckets = [merged[key] for key in sorted(merged)]
+            for b in buckets:
+                b["avg"] = b["sum"] / b["count"]
+        else:
+            pipeline = [
+                {"$match": match},
+                {"$group": {
+                    "_id": {"$floor": {"$divide": [{"$subtract": ["$timestamp", start_dt]}, bucket_ms]}},
+                    "min": {"$min": f"${field}"},
+                    "max": {"$max": f"${field}"},
+                    "avg": {"$avg": f"${field}"},
+                    "count": {"$sum": 1}
+                }},
+                {"$sort": {"_id": 1}}
+            ]
+            buckets = await readings_collection.aggregate(pipeline).to_list(length=points + 1)
+        series = [
+            {
+                "timestamp": origin + timedelta(milliseconds=int(b["_id"]) * bucket_ms),
+                "min": b["min"],
+                "max": b["max"],
+                "avg": b["avg"],
+                "count": b["count"]
             }
-        }
-        
+            for b in buckets
+        ]
         return {
-            "period_hours": hours,
-            "total_readings": len(readings),
-            "summary": summary
+            "metric": metric,
+            "mode": mode,
+            "start": start_dt,
+            "end": end_dt,
+            "buoy_id": buoy_id,
+            "bucket_seconds": bucket_ms / 1000,
+            "points": series
         }
     
     except Exception as e:
-        logging.error(f"Error getting summary: {e}")
-        raise HTTPException(status_code=500, detail="Failed to get summary")
+        logging.error(f"Error getting series: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get series")
+
+@api_router.get("/buoy/analytics")
+async def get_analytics(
+    metrics: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    step_seconds: int = Query(600, ge=1),
+    window: int = Query(6, ge=1, le=MAX_SERIES_POINTS),
+    ema_span: int = Query(6, ge=1, le=MAX_SERIES_POINTS),
+    buoy_id: Optional[str] = None
+):
+    """Get resampled metrics with rolling statistics, EMA, rates of change and correlations.
+    
+    Readings in the range (default: the last 24 hours) are averaged onto a
+    ``step_seconds`` grid aligned to multiples of the step. Per metric this
+    returns the bin means, trailing ``window``-bin mean and standard
+    deviation, an EMA over ``ema_span`` bins and the rate of change per hour;
+    ``correlations`` is the Pearson matrix between the requested metrics
+    (comma-separated; default all). Empty bins are null.
+    """
+    names = [name.strip() for name in metrics.split(",") if name.strip()] if metrics else list(SUMMARY_METRICS)
+    unknown = [name for name in names if name not in SUMMARY_METRICS]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metric: {', '.join(unknown)} (expected one of {', '.join(SUMMARY_METRICS)})"
+        )
+    names = list(dict.fromkeys(names))
+    
+    end_dt = parse_query_datetime(end, datetime.now(timezone.utc))
+    start_dt = parse_query_datetime(start, end_dt - timedelta(hours=24))
+    if start_dt >= end_dt:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    # Align the grid to the step, which also makes "the last N hours" reuse cached results
+    start_dt = datetime.fromtimestamp(start_dt.timestamp() // step_seconds * step_seconds, timezone.utc)
+    end_dt = datetime.fromtimestamp(-(-end_dt.timestamp() // step_seconds) * step_seconds, timezone.utc)
+    bins = int((end_dt - start_dt).total_seconds() // step_seconds)
+    if bins > MAX_SERIES_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range has {bins} steps (max {MAX_SERIES_POINTS}); use a larger step_seconds"
+        )
+    
+    key = (start_dt, end_dt, tuple(names), step_seconds, window, ema_span, buoy_id)
+    body = analytics_cache.get(key)
+    if body is None:
+        match: Dict[str, Any] = {"timestamp": {"$gte": start_dt, "$lt": end_dt}}
+        if buoy_id:
+            match["buoy_id"] = buoy_id
+        try:
+            times, values = await load_columns(
+                readings_collection, match, [SUMMARY_METRICS[name] for name in names], ANALYTICS_MAX_READINGS
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{e}; narrow the range")
+        except Exception as e:
+            logging.error(f"Error loading readings for analytics: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get analytics")
+        result = await asyncio.to_thread(
+            analyze, times, values, names, start_dt, step_seconds, bins, window, ema_span
+        )
+        body = render_json({
+            "start": start_dt,
+            "end": end_dt,
+            "step_seconds": step_seconds,
+            "window": window,
+            "ema_span": ema_span,
+            "buoy_id": buoy_id,
+            **result
+        })
+        analytics_cache.put(key, start_dt, end_dt, buoy_id, body)
+    return Response(content=body, media_type="application/json")
+
+@api_router.get("/buoy/readings/export")
+async def export_readings(
+    format: str = "ndjson",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    buoy_id: Optional[str] = None
+):
+    """Stream readings in [start, end] as NDJSON, CSV or Parquet, optionally for one buoy.
+    
+    Rows are read from the cursor and encoded EXPORT_CHUNK_SIZE at a time,
+    so memory use does not grow with the size of the range.
+    """
+    if format not in EXPORT_ENCODERS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+    if format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    
+    query_filter: Dict[str, Any] = {}
+    if buoy_id:
+        query_filter["buoy_id"] = buoy_id
+    start_dt = parse_query_datetime(start, None)
+    end_dt = parse_query_datetime(end, None)
+    if start_dt:
+        query_filter.setdefault("timestamp", {})["$gte"] = start_dt
+    if end_dt:
+        query_filter.setdefault("timestamp", {})["$lte"] = end_dt
+    
+    projection = {"_id": 0, **{name: 1 for name, _ in EXPORT_COLUMNS}}
+    
+    async def chunks():
+        cursor = readings_collection.find(query_filter, projection)\
+            .sort("timestamp", 1)\
+            .batch_size(EXPORT_CHUNK_SIZE)
+        while True:
+            chunk = await cursor.to_list(length=EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            for row in chunk:
+                # Readings stored before fleet support have no buoy_id
+                row.setdefault("buoy_id", DEFAULT_BUOY_ID)
+            yield [parse_from_mongo(row) for row in chunk]
+    
+    filename = f"buoy_readings_{buoy_id}.{format}" if buoy_id else f"buoy_readings.{format}"
+    return StreamingResponse(
+        EXPORT_ENCODERS[format](chunks(), EXPORT_COLUMNS),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/buoy/stream")
+async def stream_readings_sse(metrics: Optional[str] = None):
+    """Stream new readings as Server-Sent Events.
+    
+    ``metrics`` is an optional comma-separated filter (e.g.
+    ``temperature,turbidity``). If the client falls behind, the oldest queued
+    events are dropped and a ``dropped`` event reports how many were lost.
+    """
+    try:
+        fields = parse_stream_metrics(metrics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    subscriber = stream_hub.subscribe(fields)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers")
+    
+    async def event_source():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=STREAM_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                dropped = subscriber.take_dropped()
+                if dropped:
+                    yield f"event: dropped\ndata: {dropped}\n\n"
+                yield f"event: reading\ndata: {message}\n\n"
+        finally:
+            stream_hub.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.websocket("/buoy/stream")
+async def stream_readings_ws(websocket: WebSocket, metrics: Optional[str] = None):
+    """Stream new readings over a WebSocket (same filtering and drop policy as SSE)."""
+    try:
+        fields = parse_stream_metrics(metrics)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    subscriber = stream_hub.subscribe(fields)
+    if subscriber is None:
+        await websocket.close(code=1013, reason="Too many stream subscribers")
+        return
+    
+    await websocket.accept()
+    
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    disconnected = asyncio.create_task(wait_for_disconnect())
+    try:
+        while True:
+            next_message = asyncio.create_task(subscriber.queue.get())
+            done, _ = await asyncio.wait(
+                {next_message, disconnected},
+                timeout=STREAM_HEARTBEAT_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_message not in done:
+                next_message.cancel()
+                if disconnected in done:
+                    break
+                await websocket.send_text('{"type": "heartbeat"}')
+                continue
+            dropped = subscriber.take_dropped()
+            if dropped:
+                await websocket.send_text(json.dumps({"type": "dropped", "count": dropped}))
+            await websocket.send_text(next_message.result())
+    except Exception:
+        # Client went away mid-send
+        pass
+    finally:
+        disconnected.cancel()
+        stream_hub.unsubscribe(subscriber)
 
 @api_router.delete("/buoy/readings")
 async def clear_all_readings():
     """Clear all buoy readings (use with caution)."""
+    global rollups_covered_from
     try:
-        result = await db.buoy_readings.delete_many({})
-        return {"deleted_count": result.deleted_count}
+        if READINGS_TIMESERIES:
+            # Dropping avoids the delete restrictions older servers put on time-series collections
+            deleted_count = await readings_collection.estimated_document_count()
+            await readings_collection.drop()
+            await ensure_indexes()
+        else:
+            deleted_count = (await readings_collection.delete_many({})).deleted_count
+        await db.buoy_rollups.delete_many({})
+        await db.retention.delete_many({})
+        await db.buoy_fleet.delete_many({})
+        await db.detection_events.delete_many({})
+        await db.detection_counts.delete_many({})
+        if retention_compactor:
+            retention_compactor.compacted_until = None
+        # An empty database is fully covered by the (empty) rollups
+        await extend_rollup_coverage(db.migrations, None)
+        rollups_covered_from = None
+        latest_cache.reset()
+        idempotency_cache.clear()
+        analytics_cache.clear()
+        if alert_engine:
+            alert_engine.reset()
+        return {"deleted_count": deleted_count}
     except Exception as e:
         logging.error(f"Error clearing readings: {e}")
         raise HTTPException(status_code=500, detail="Failed to clear readings")
 
+@api_router.get("/buoy/alerts", response_model=List[Alert])
+async def get_alerts(
+    buoy_id: Optional[str] = None,
+    type: Optional[str] = None,
+    severity: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Get alerts raised on ingest, newest first, optionally filtered by buoy, type, severity and time."""
+    start_dt = parse_query_datetime(start_date, None)
+    end_dt = parse_query_datetime(end_date, None)
+    try:
+        query: Dict[str, Any] = {}
+        if buoy_id:
+            query["buoy_id"] = buoy_id
+        if type:
+            query["type"] = type
+        if severity:
+            query["severity"] = severity
+        if start_dt or end_dt:
+            query["timestamp"] = {}
+            if start_dt:
+                query["timestamp"]["$gte"] = start_dt
+            if end_dt:
+                query["timestamp"]["$lte"] = end_dt
+        alerts = await db.buoy_alerts.find(query, projection_for(Alert))\
+            .sort("timestamp", -1)\
+            .limit(limit)\
+            .to_list(length=limit)
+        return [Alert(**a) for a in alerts]
+    except Exception as e:
+        logging.error(f"Error getting alerts: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get alerts")
+
+@api_router.get("/detections", response_model=List[DetectionEvent])
+async def get_detections(
+    object_class: Optional[str] = Query(None, alias="class"),
+    buoy_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Get camera detection events, newest first, optionally filtered by class, buoy and time."""
+    start_dt = parse_query_datetime(start_date, None)
+    end_dt = parse_query_datetime(end_date, None)
+    try:
+        query: Dict[str, Any] = {}
+        if object_class:
+            query["object_class"] = object_class
+        if buoy_id:
+            query["buoy_id"] = buoy_id
+        if start_dt or end_dt:
+            query["timestamp"] = {}
+            if start_dt:
+                query["timestamp"]["$gte"] = start_dt
+            if end_dt:
+                query["timestamp"]["$lte"] = end_dt
+        events = await db.detection_events.find(query, projection_for(DetectionEvent))\
+            .sort("timestamp", -1)\
+            .limit(limit)\
+            .to_list(length=limit)
+        return [DetectionEvent(**e) for e in events]
+    except Exception as e:
+        logging.error(f"Error getting detections: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get detections")
+
+@api_router.get("/detections/histogram")
+async def get_detection_histogram(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    buoy_id: Optional[str] = None
+):
+    """Get the number of detections per class in a time range (default: the last 7 days).
+
+    Served from per-class hourly and daily counts kept up to date on ingest,
+    so the cost depends on the length of the range, not on how many
+    readings or detections it holds.
+    """
+    end_dt = parse_query_datetime(end, datetime.now(timezone.utc))
+    start_dt = parse_query_datetime(start, end_dt - timedelta(days=7))
+    if start_dt >= end_dt:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    try:
+        classes = await class_histogram(db.detection_events, db.detection_counts, start_dt, end_dt, buoy_id)
+    except Exception as e:
+        logging.error(f"Error getting detection histogram: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get detection histogram")
+    return {
+        "start": start_dt,
+        "end": end_dt,
+        "buoy_id": buoy_id,
+        "total": sum(c["count"] for c in classes.values()),
+        "classes": classes
+    }
+
+@api_router.get("/detections/timeline")
+async def get_detection_timeline(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    interval: str = "hour",
+    object_class: Optional[str] = Query(None, alias="class"),
+    buoy_id: Optional[str] = None
+):
+    """Get detections per class in each hour or day of a range (default: the last 7 days).
+
+    Buckets are aligned to whole hours/days (UTC) and read directly from the
+    per-class counts; buckets without detections have empty ``counts``.
+    """
+    if interval not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {', '.join(GRANULARITIES)}")
+    end_dt = parse_query_datetime(end, datetime.now(timezone.utc))
+    start_dt = parse_query_datetime(start, end_dt - timedelta(days=7))
+    if start_dt >= end_dt:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    buckets = int((end_dt - floor_time(start_dt, GRANULARITIES[interval])) / GRANULARITIES[interval]) + 1
+    if buckets > MAX_SERIES_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range has {buckets} {interval}s (max {MAX_SERIES_POINTS}); use interval=day or a shorter range"
+        )
+    try:
+        timeline = await class_timeline(db.detection_counts, start_dt, end_dt, interval, buoy_id, object_class)
+    except Exception as e:
+        logging.error(f"Error getting detection timeline: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get detection timeline")
+    return {
+        "start": start_dt,
+        "end": end_dt,
+        "interval": interval,
+        "buoy_id": buoy_id,
+        "class": object_class,
+        "buckets": [
+            {"bucket_start": bucket_start, "total": sum(counts.values()), "counts": counts}
+            for bucket_start, counts in timeline
+        ]
+    }
+
+@api_router.get("/retention")
+async def get_retention_report():
+    """Dry run of the retention policy: documents and bytes each tier would reclaim now."""
+    try:
+        report = await retention_report(
+            readings_collection, db.buoy_rollups, RETENTION_POLICY, compacted_until()
+        )
+        report["policy"] = RETENTION_POLICY.model_dump()
+        report["compaction"] = retention_compactor.metrics() if retention_compactor else {"enabled": False}
+        return report
+    except Exception as e:
+        logging.error(f"Error building retention report: {e}")
+        raise HTTPException(status_code=500, detail="Failed to build retention report")
+
+def require_profiler():
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled (set PROFILER_ENABLED=true)")
+
+@api_router.post("/debug/profiler", dependencies=[Depends(require_profiler)])
+async def start_profiler(
+    route: str,
+    interval_ms: float = Query(5, ge=1, le=1000),
+    duration_seconds: Optional[float] = Query(300, gt=0)
+):
+    """Start sampling one route (by path template, e.g. ``/api/buoy/readings/summary``)."""
+    endpoints = {r.path: r.endpoint for r in app.routes if getattr(r, "endpoint", None)}
+    if route not in endpoints:
+        raise HTTPException(status_code=400, detail=f"Unknown route: {route}")
+    route_profiler.start(route, endpoints[route], interval=interval_ms / 1000, duration=duration_seconds)
+    return route_profiler.status()
+
+@api_router.get("/debug/profiler", dependencies=[Depends(require_profiler)])
+async def get_profiler(format: str = "json"):
+    """Profiler state and samples; ``format=collapsed`` returns flamegraph input as text."""
+    if format == "collapsed":
+        return Response(content=route_profiler.collapsed(), media_type="text/plain")
+    return {
+        **route_profiler.status(),
+        "top_stacks": [
+            {"stack": stack, "samples": count} for stack, count in route_profiler.samples.most_common(20)
+        ]
+    }
+
+@api_router.delete("/debug/profiler", dependencies=[Depends(require_profiler)])
+async def stop_profiler():
+    route_profiler.stop()
+    return route_profiler.status()
+
 # Original status check endpoints (keeping for compatibility)
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -377,6 +2009,9 @@ async def create_status_check(input: StatusCheckCreate):
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
+    if FAST_JSON:
+        status_checks = await db.status_checks.find({}, projection_for(StatusCheck)).to_list(1000)
+        return Response(content=documents_to_json(status_checks, StatusCheck), media_type="application/json")
     status_checks = await db.status_checks.find().to_list(1000)
     parsed_checks = [parse_from_mongo(check) for check in status_checks]
     return [StatusCheck(**check) for check in parsed_checks]
@@ -384,6 +2019,11 @@ async def get_status_checks():
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -391,8 +2031,12 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Per-route latency histograms (outermost, so CORS handling is included)
+app.add_middleware(RequestMetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -400,8 +2044,113 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_reading_indexes():
+    if READINGS_TIMESERIES:
+        await ensure_timeseries_collection(readings_collection, READINGS_TIMESERIES_GRANULARITY)
+    # (timestamp, id) backs both time-ordered reads and keyset pagination
+    await readings_collection.create_index([("timestamp", -1), ("id", -1)], name="timestamp_id_desc")
+    if UNIQUE_READING_INDEXES:
+        await readings_collection.create_index("id", unique=True, name="id_unique")
+    else:
+        await readings_collection.create_index("id", name="id_asc")
+
+async def ensure_indexes() -> List[str]:
+    """Create the indexes the read endpoints rely on (no-op if they already exist).
+    
+    Each group is created on its own, so one failure (say, a conflicting
+    existing index) does not leave the groups after it missing. Returns the
+    groups that failed.
+    """
+    index_groups = {
+        "readings": ensure_reading_indexes,
+        "status check": lambda: db.status_checks.create_index([("timestamp", -1)], name="timestamp_desc"),
+        "rollup": lambda: ensure_rollup_indexes(db.buoy_rollups),
+        "rollup writer": lambda: ensure_rollup_writer_indexes(
+            db.rollup_writers, timedelta(seconds=10 * WORKER_HEARTBEAT_INTERVAL)
+        ),
+        "geo": lambda: ensure_geo_indexes(readings_collection),
+        "fleet": lambda: ensure_fleet_indexes(readings_collection),
+        "idempotency": lambda: ensure_idempotency_index(readings_collection, unique=UNIQUE_READING_INDEXES),
+        "alert": lambda: ensure_alert_indexes(db.buoy_alerts),
+        "detection": lambda: ensure_detection_indexes(db.detection_events, db.detection_counts),
+        "retention": lambda: ensure_retention_indexes(
+            readings_collection, db.buoy_rollups, RETENTION_POLICY, compacted_until()
+        ),
+    }
+    failed = []
+    for name, create in index_groups.items():
+        try:
+            await create()
+        except Exception as e:
+            logging.error(f"Error creating {name} indexes: {e}")
+            failed.append(name)
+    return failed
+
+@app.on_event("startup")
+async def startup_db_client():
+    global rollups_covered_from
+    logging.info(f"Retention policy: {RETENTION_POLICY.describe()}")
+    await ensure_indexes()
+    try:
+        adopted = await adopt_untagged_readings(
+            readings_collection, db.buoy_fleet, db.migrations, DEFAULT_BUOY_ID, BuoyReading.model_fields
+        )
+        if adopted:
+            logging.info(f"Tagged {adopted} readings stored before fleet support as {DEFAULT_BUOY_ID}")
+    except Exception as e:
+        logging.error(f"Error tagging readings stored without a buoy_id (run `python manage.py rebuild-fleet`): {e}")
+    if USE_ROLLUPS:
+        try:
+            rollups_covered_from = await load_rollup_coverage(db.migrations, readings_collection)
+        except Exception as e:
+            logging.error(f"Error loading rollup coverage: {e}")
+            # Without it, assume nothing before now has been rolled up
+            rollups_covered_from = datetime.now(timezone.utc)
+        if rollups_covered_from:
+            logging.info(
+                f"Rollups cover readings from {rollups_covered_from.isoformat()}; older ranges are read raw "
+                "(run `python manage.py rebuild-rollups` to roll them up)"
+            )
+    background_tasks.append(asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG_INTERVAL)))
+    background_tasks.append(asyncio.create_task(rollup_writer_heartbeat(WORKER_HEARTBEAT_INTERVAL)))
+    if firebase_sync:
+        firebase_sync.start()
+    if ingest_buffer:
+        try:
+            await ingest_buffer.start()
+        except Exception as e:
+            logging.error(f"Error opening ingest buffer: {e}")
+    if retention_compactor:
+        try:
+            await retention_compactor.load_watermark()
+        except Exception as e:
+            logging.error(f"Error loading compaction watermark: {e}")
+        retention_compactor.start()
+    if alert_engine:
+        try:
+            await alert_engine.warm_up(readings_collection, ALERT_WARMUP_READINGS)
+        except Exception as e:
+            logging.error(f"Error warming up alert engine: {e}")
+    try:
+        await latest_cache.refresh()
+    except Exception as e:
+        logging.error(f"Error loading latest-state cache: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    route_profiler.stop()
+    if ingest_buffer:
+        await ingest_buffer.stop()
+    if firebase_sync:
+        await firebase_sync.stop()
+    if retention_compactor:
+        await retention_compactor.stop()
+    try:
+        await db.rollup_writers.delete_one({"_id": WORKER_ID})
+    except Exception as e:
+        logging.error(f"Error removing worker heartbeat: {e}")
     client.close()
 
 if __name__ == "__main__":
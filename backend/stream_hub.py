@@ -0,0 +1,83 @@
+"""In-process pub/sub hub that fans new readings out to live stream clients."""
+import asyncio
+import json
+from typing import Dict, FrozenSet, List, Optional, Set
+
+
+class Subscriber:
+    """One connected stream client with its own bounded message queue."""
+
+    def __init__(self, fields: Optional[FrozenSet[str]], queue_size: int):
+        self.fields = fields
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, message: str):
+        """Queue a message, discarding the oldest one if the client has fallen behind."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    def take_dropped(self) -> int:
+        """Return and reset the number of messages dropped since the last call."""
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class StreamHub:
+    """Fan out JSON events to every subscriber without blocking the publisher.
+
+    Each subscriber has a bounded queue. A slow consumer never delays ingest or
+    other subscribers: when its queue is full the oldest pending message is
+    dropped and the drop count is reported to that client with its next message.
+    """
+
+    def __init__(self, queue_size: int = 100, max_subscribers: int = 2000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers: Set[Subscriber] = set()
+        self.published = 0
+
+    def subscribe(self, fields: Optional[FrozenSet[str]] = None) -> Optional[Subscriber]:
+        """Register a subscriber, or return None if the hub is at capacity.
+
+        ``fields`` restricts delivered events to those keys (plus ``id`` and
+        ``timestamp``); None delivers the whole event.
+        """
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+        subscriber = Subscriber(fields, self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, events: List[dict]):
+        """Deliver events to all subscribers, encoding each distinct field filter once."""
+        if not self.subscribers:
+            return
+        for event in events:
+            encoded: Dict[Optional[FrozenSet[str]], str] = {}
+            for subscriber in self.subscribers:
+                message = encoded.get(subscriber.fields)
+                if message is None:
+                    if subscriber.fields is None:
+                        payload = event
+                    else:
+                        payload = {
+                            key: value for key, value in event.items()
+                            if key in subscriber.fields or key in ("id", "timestamp")
+                        }
+                    message = encoded[subscriber.fields] = json.dumps(payload)
+                subscriber.offer(message)
+            self.published += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "queue_size": self.queue_size,
+            "max_subscribers": self.max_subscribers,
+        }
@@ -0,0 +1,138 @@
+"""MongoDB time-series collection support for buoy readings.
+
+With ``READINGS_TIMESERIES=true`` the readings collection is created as a
+time-series collection: ``timestamp`` is the time field and ``buoy_id`` the
+meta field, so MongoDB stores each buoy's readings in compressed columnar
+buckets. Readings without a ``buoy_id`` (single-buoy deployments) share one
+series. Time-series collections cannot carry unique secondary indexes or
+a TTL index on the time field, so the reading id and idempotency key indexes
+are non-unique and raw retention uses the collection's ``expireAfterSeconds``.
+
+An existing plain collection cannot be converted or renamed in place; it is
+copied into a new collection with ``python manage.py migrate-timeseries``
+and the backend pointed at it with ``READINGS_COLLECTION``.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from geo import LOCATION_FIELD, geojson_point
+
+TIME_FIELD = "timestamp"
+META_FIELD = "buoy_id"
+MIGRATION_ID_PREFIX = "timeseries_copy"
+
+
+async def is_timeseries(collection) -> bool:
+    """Whether ``collection`` exists and is a time-series collection."""
+    async for info in await collection.database.list_collections(filter={"name": collection.name}):
+        return info.get("type") == "timeseries"
+    return False
+
+
+async def ensure_timeseries_collection(collection, granularity: str = "seconds",
+                                       expire_after_seconds: Optional[int] = None) -> bool:
+    """Create ``collection`` as a time-series collection if it does not exist yet.
+
+    Returns whether the collection is (now) time-series; an existing plain
+    collection is left alone and logged, since it has to be migrated.
+    """
+    names = await collection.database.list_collection_names(filter={"name": collection.name})
+    if not names:
+        options = {"expireAfterSeconds": expire_after_seconds} if expire_after_seconds else {}
+        await collection.database.create_collection(
+            collection.name,
+            timeseries={"timeField": TIME_FIELD, "metaField": META_FIELD, "granularity": granularity},
+            **options,
+        )
+        return True
+    if await is_timeseries(collection):
+        return True
+    logging.error(f"{collection.name} is a plain collection; copy it with "
+                  f"'python manage.py migrate-timeseries' before enabling READINGS_TIMESERIES")
+    return False
+
+
+async def set_expiry(collection, days: int):
+    """Set (or with 0 days, switch off) a time-series collection's automatic expiry."""
+    expire = days * 86400 if days else "off"
+    options = {}
+    async for info in await collection.database.list_collections(filter={"name": collection.name}):
+        options = info.get("options", {})
+    if options.get("expireAfterSeconds", "off") != expire:
+        await collection.database.command("collMod", collection.name, expireAfterSeconds=expire)
+
+
+def prepare_for_timeseries(doc: dict) -> Optional[dict]:
+    """Adapt a stored reading for the time-series collection, or None to skip it.
+
+    Legacy string timestamps are parsed (the time field must be a date) and
+    readings stored before positions were indexed get their GeoJSON location.
+    """
+    timestamp = doc.get(TIME_FIELD)
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(timestamp, datetime):
+        return None
+    doc[TIME_FIELD] = timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+    if LOCATION_FIELD not in doc and "gps_latitude" in doc and "gps_longitude" in doc:
+        location = geojson_point(doc["gps_latitude"], doc["gps_longitude"])
+        if location:
+            doc[LOCATION_FIELD] = location
+    return doc
+
+
+async def copy_to_timeseries(source, target, checkpoints, batch_size: int = 5000,
+                             progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """Copy every reading from ``source`` into the time-series ``target`` in batches.
+
+    Batches are read in ``_id`` order and the last copied ``_id`` is
+    checkpointed in ``checkpoints``, so an interrupted copy resumes where it
+    stopped. Time-series collections do not enforce unique ``_id``, so the
+    first batch after resuming skips documents a crashed run already copied.
+    """
+    checkpoint_id = f"{MIGRATION_ID_PREFIX}:{source.name}:{target.name}"
+    checkpoint = await checkpoints.find_one({"_id": checkpoint_id}) or {}
+    last_id = checkpoint.get("last_id")
+    copied = checkpoint.get("copied", 0)
+    skipped = checkpoint.get("skipped", 0)
+    resuming = bool(checkpoint)
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await source.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        batch = []
+        for doc in docs:
+            prepared = prepare_for_timeseries(doc)
+            if prepared is None:
+                logging.warning(f"Skipping reading {doc['_id']}: no usable timestamp")
+                skipped += 1
+                continue
+            batch.append(prepared)
+        if batch and resuming:
+            resuming = False
+            # The time bounds let MongoDB prune buckets instead of scanning them all
+            existing = set(await target.distinct("_id", {
+                "_id": {"$in": [doc["_id"] for doc in batch]},
+                TIME_FIELD: {"$gte": min(doc[TIME_FIELD] for doc in batch),
+                             "$lte": max(doc[TIME_FIELD] for doc in batch)},
+            }))
+            batch = [doc for doc in batch if doc["_id"] not in existing]
+        if batch:
+            await target.insert_many(batch, ordered=False)
+            copied += len(batch)
+        await checkpoints.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id, "copied": copied, "skipped": skipped}},
+            upsert=True
+        )
+        if progress:
+            progress(copied, skipped)
+
+    return {"copied": copied, "skipped": skipped}
@@ -0,0 +1,609 @@
+import requests
+import sys
+import time
+import random
+import statistics
+import asyncio
+import json
+import math
+import os
+import argparse
+import socket
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+from typing import Dict, Any, List
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+from alerts import AlertEngine
+from lora_gateway import LoRaGateway, encode_binary_payload, encode_frame, file_frames, parse_frame, write_capture
+
+class BuoyAPIBenchmark:
+    def __init__(self, base_url="http://localhost:8001"):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def make_reading(self) -> Dict[str, Any]:
+        """Generate one synthetic buoy reading"""
+        return {
+            "gps_latitude": 6.9271 + random.uniform(-0.01, 0.01),
+            "gps_longitude": 79.8612 + random.uniform(-0.01, 0.01),
+            "battery_percentage": random.uniform(20, 100),
+            "water_turbidity": random.uniform(0, 50),
+            "water_temperature": random.uniform(24, 30),
+            "humidity": random.uniform(60, 95),
+            "air_pressure": random.uniform(1000, 1020),
+            "detected_object_class": random.choice([None, "boat", "marine_debris"])
+        }
+
+    def report(self, name: str, count: int, elapsed: float):
+        """Print throughput for a finished run"""
+        rate = count / elapsed if elapsed else float("inf")
+        print(f"   {name}: {count} readings in {elapsed:.2f}s -> {rate:.1f} readings/s")
+        return rate
+
+    def bench_single_ingest(self, count: int) -> float:
+        """POST readings one request at a time"""
+        readings = [self.make_reading() for _ in range(count)]
+        start = time.perf_counter()
+        for reading in readings:
+            response = self.session.post(f"{self.base_url}/api/buoy/readings", json=reading, timeout=10)
+            response.raise_for_status()
+        return self.report("Single ingest", count, time.perf_counter() - start)
+
+    def bench_batch_ingest(self, count: int, batch_size: int) -> float:
+        """POST readings through the batch endpoint"""
+        readings = [self.make_reading() for _ in range(count)]
+        start = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            batch: List[Dict[str, Any]] = readings[offset:offset + batch_size]
+            response = self.session.post(f"{self.base_url}/api/buoy/readings/batch", json=batch, timeout=60)
+            response.raise_for_status()
+            if response.json().get("failed"):
+                print(f"❌ Batch at offset {offset} had failures")
+        return self.report(f"Batch ingest (size {batch_size})", count, time.perf_counter() - start)
+
+    def bench_query_latency(self, name: str, endpoint: str, iterations: int, params: Dict[str, Any] = None) -> Dict[str, float]:
+        """Time repeated GETs against a read endpoint"""
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = self.session.get(f"{self.base_url}/{endpoint}", params=params, timeout=60)
+            timings.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+        timings.sort()
+        result = {
+            "p50_ms": statistics.median(timings),
+            "p95_ms": timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1],
+        }
+        print(f"   {name}: p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms")
+        return result
+
+    def bench_export(self, export_format: str) -> Dict[str, float]:
+        """Stream a full export and report rows/s (NDJSON/CSV) and MB/s"""
+        start = time.perf_counter()
+        total_bytes = 0
+        newlines = 0
+        with self.session.get(f"{self.base_url}/api/buoy/readings/export",
+                              params={"format": export_format}, stream=True, timeout=600) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                total_bytes += len(chunk)
+                newlines += chunk.count(b"\n")
+        elapsed = time.perf_counter() - start
+        rows = newlines - (1 if export_format == "csv" else 0)
+        result = {"seconds": elapsed, "mb_per_s": total_bytes / elapsed / 1e6}
+        if export_format != "parquet":
+            result["rows"] = rows
+            result["rows_per_s"] = rows / elapsed
+            print(f"   Export {export_format}: {rows} rows in {elapsed:.2f}s -> "
+                  f"{result['rows_per_s']:.0f} rows/s, {result['mb_per_s']:.1f} MB/s")
+        else:
+            print(f"   Export {export_format}: {total_bytes / 1e6:.1f} MB in {elapsed:.2f}s -> {result['mb_per_s']:.1f} MB/s")
+        return result
+
+    async def _open_sse(self, path: str) -> "tuple[asyncio.StreamReader, asyncio.StreamWriter]":
+        """Open a raw SSE connection and consume the response headers"""
+        url = urlparse(self.base_url)
+        reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        return reader, writer
+
+    async def _wait_for_reading(self, reader: asyncio.StreamReader, reading_id: str) -> float:
+        """Read SSE lines until the given reading arrives; return arrival time"""
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("stream closed")
+            if b"data: {" in line and reading_id in line.decode(errors="ignore"):
+                return time.perf_counter()
+
+    async def bench_stream_fanout(self, subscribers: int, events: int = 5) -> Dict[str, float]:
+        """Open many SSE subscribers and time delivery of new readings to all of them"""
+        connections = await asyncio.gather(*[self._open_sse("/api/buoy/stream") for _ in range(subscribers)])
+        await asyncio.sleep(1)
+        latencies = []
+        try:
+            for _ in range(events):
+                sent = time.perf_counter()
+                response = await asyncio.to_thread(
+                    self.session.post, f"{self.base_url}/api/buoy/readings", json=self.make_reading(), timeout=10
+                )
+                reading_id = response.json()["id"]
+                arrivals = await asyncio.wait_for(
+                    asyncio.gather(*[self._wait_for_reading(reader, reading_id) for reader, _ in connections]),
+                    timeout=30
+                )
+                latencies.extend((arrival - sent) * 1000 for arrival in arrivals)
+        finally:
+            for _, writer in connections:
+                writer.close()
+        latencies.sort()
+        result = {
+            "subscribers": subscribers,
+            "p50_ms": statistics.median(latencies),
+            "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+            "max_ms": latencies[-1],
+        }
+        print(f"   Fan-out to {subscribers} SSE subscribers: p50 {result['p50_ms']:.1f} ms, "
+              f"p99 {result['p99_ms']:.1f} ms, max {result['max_ms']:.1f} ms")
+        return result
+
+    def bench_list_encoding(self, rows: int, iterations: int = 5) -> Dict[str, float]:
+        """In-process: model-per-row response path vs projected documents to JSON bytes"""
+        from pydantic import TypeAdapter
+        import server
+
+        docs = []
+        for i in range(rows):
+            reading = server.BuoyReading(**self.make_reading())
+            docs.append(server.prepare_for_mongo(reading.dict()))
+        adapter = TypeAdapter(List[server.BuoyReading])
+
+        def model_path(batch):
+            # What get_readings plus FastAPI's response_model handling did per row
+            models = [server.BuoyReading(**server.parse_from_mongo(doc)) for doc in batch]
+            return json.dumps(adapter.dump_python(adapter.validate_python(models), mode="json")).encode()
+
+        def fast_path(batch):
+            return server.documents_to_json(batch, server.BuoyReading)
+
+        result = {}
+        for name, encode in (("model", model_path), ("fast", fast_path)):
+            timings = []
+            for _ in range(iterations):
+                batch = [dict(doc) for doc in docs]
+                start = time.perf_counter()
+                encode(batch)
+                timings.append((time.perf_counter() - start) * 1000)
+            result[f"{name}_ms"] = statistics.median(timings)
+        result["speedup"] = result["model_ms"] / result["fast_ms"]
+        print(f"   {rows} rows: model path {result['model_ms']:.1f} ms, "
+              f"fast path {result['fast_ms']:.1f} ms ({result['speedup']:.1f}x)")
+        return result
+
+    def make_lora_frames(self, count: int) -> List[bytes]:
+        """Synthetic LoRa frames from 4 senders, one in five as legacy ASCII"""
+        frames = []
+        for i in range(count):
+            sender = 0xA0 + i % 4
+            reading = self.make_reading()
+            if i % 5 == 4:
+                payload = f"{reading['water_temperature']:.2f}:{reading['humidity']:.2f}".encode()
+            else:
+                payload = encode_binary_payload(reading)
+            frames.append(encode_frame(payload, sender, i // 4))
+        return frames
+
+    def bench_lora_gateway(self, packets: int) -> Dict[str, float]:
+        """LoRa gateway packets/s: decode only, then replayed end to end into the API"""
+        frames = self.make_lora_frames(packets)
+        gateway = LoRaGateway(self.base_url)
+        start = time.perf_counter()
+        for data in frames:
+            gateway.handle(parse_frame(data))
+        decode_rate = packets / (time.perf_counter() - start)
+        print(f"   Decode: {packets} packets -> {decode_rate:.0f} packets/s")
+
+        fd, path = tempfile.mkstemp(suffix=".lora")
+        os.close(fd)
+        try:
+            write_capture(path, [(0.0, data) for data in frames])
+            gateway = LoRaGateway(self.base_url, max_batch=500)
+            start = time.perf_counter()
+            asyncio.run(gateway.run(file_frames(path, speed=0)))
+            elapsed = time.perf_counter() - start
+        finally:
+            os.remove(path)
+        forward_rate = packets / elapsed
+        print(f"   Replay to API: {gateway.forwarded}/{packets} forwarded in {elapsed:.2f}s "
+              f"-> {forward_rate:.0f} packets/s")
+        return {"decode_packets_per_s": decode_rate, "forward_packets_per_s": forward_rate}
+
+    def bench_alert_engine(self, readings: int, budget_us: float = 50.0) -> Dict[str, float]:
+        """In-process cost of the ingest alert engine per reading, on a 30s-interval series with spikes"""
+        start_time = datetime.now(timezone.utc) - timedelta(seconds=30 * readings)
+        series = []
+        for i in range(readings):
+            reading = self.make_reading()
+            reading["water_turbidity"] = random.gauss(10, 1) + (60 if i % 997 == 996 else 0)
+            reading["water_temperature"] = 27 + math.sin(i / 2880 * 2 * math.pi) + random.gauss(0, 0.05)
+            reading["battery_percentage"] = 100 - i * 0.0005
+            reading["gps_latitude"] = 6.9271 + random.gauss(0, 0.00005)
+            reading["gps_longitude"] = 79.8612 + random.gauss(0, 0.00005)
+            reading["timestamp"] = start_time + timedelta(seconds=30 * i)
+            reading["id"] = str(i)
+            series.append(reading)
+
+        engine = AlertEngine()
+        raised = 0
+        start = time.perf_counter()
+        for reading in series:
+            raised += len(engine.evaluate(reading))
+        per_reading_us = (time.perf_counter() - start) / readings * 1e6
+        verdict = "within" if per_reading_us < budget_us else "OVER"
+        print(f"   Alert engine: {readings} readings -> {per_reading_us:.2f} us/reading "
+              f"({verdict} {budget_us:.0f} us budget), {raised} alerts")
+        return {"us_per_reading": per_reading_us, "alerts": raised}
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+# name -> (method, path, request builder); builders return (params, json body)
+LOAD_SCENARIOS = {
+    "ingest_single": ("POST", "api/buoy/readings", lambda bench, args: (None, bench.make_reading())),
+    "ingest_batch": ("POST", "api/buoy/readings/batch",
+                     lambda bench, args: (None, [bench.make_reading() for _ in range(args.batch_size)])),
+    "latest": ("GET", "api/buoy/readings/latest", lambda bench, args: (None, None)),
+    "status": ("GET", "api/buoy/status", lambda bench, args: (None, None)),
+    "history": ("GET", "api/buoy/readings", lambda bench, args: (history_params(args), None)),
+    "summary": ("GET", "api/buoy/readings/summary", lambda bench, args: ({"hours": 24}, None)),
+}
+
+def history_params(args) -> Dict[str, Any]:
+    """A random 6-hour window inside the seeded history"""
+    end = datetime.now(timezone.utc) - timedelta(hours=random.uniform(0, max(0.0, args.days * 24 - 6)))
+    return {"start_date": (end - timedelta(hours=6)).isoformat(), "end_date": end.isoformat(), "limit": 100}
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_load_scenario(base_url: str, name: str, requests_total: int, concurrency: int, args) -> Dict[str, Any]:
+    """Issue requests_total requests with `concurrency` workers and summarize latencies"""
+    method, path, build = LOAD_SCENARIOS[name]
+    bench = BuoyAPIBenchmark(base_url)
+    timings: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = [requests_total]
+
+    def worker():
+        nonlocal errors
+        session = requests.Session()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            params, body = build(bench, args)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, f"{base_url}/{path}", params=params, json=body, timeout=60)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                timings.append(elapsed)
+                if not ok:
+                    errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - start
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "max_ms": round(timings[-1], 3) if timings else 0.0,
+        "requests_per_s": round(len(timings) / wall, 1) if wall else 0.0,
+    }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 600):
+    """Poll the API root until the server answers (seeding happens before it does)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/api/", timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Benchmark server did not start in time")
+
+async def seed_history(server, readings: int, days: float, buoys: int = 1):
+    """Insert a synthetic history spread evenly over the last `days` and roll it up"""
+    from rollups import rebuild_rollups
+
+    bench = BuoyAPIBenchmark()
+    now = datetime.now(timezone.utc)
+    step = timedelta(days=days) / max(1, readings)
+    batch = []
+    for i in range(readings):
+        reading = server.BuoyReading(**bench.make_reading())
+        reading.timestamp = now - step * (readings - i)
+        batch.append(server.prepare_for_mongo(reading.dict()))
+        if len(batch) == 5000:
+            await server.readings_collection.insert_many(batch)
+            batch = []
+    if batch:
+        await server.readings_collection.insert_many(batch)
+    if readings:
+        await rebuild_rollups(server.readings_collection, server.db.buoy_rollups,
+                              now - timedelta(days=days), now, server.SUMMARY_METRICS)
+    await server.latest_cache.refresh()
+
+def serve(args):
+    """Run server.py in this process, on a real mongod or the in-memory stand-in, after seeding"""
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("RETENTION_RAW_DAYS", "0")
+    if args.mongo == "memory":
+        try:
+            import motor.motor_asyncio
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            print("❌ --mongo memory needs the mongomock-motor package")
+            return 1
+        motor.motor_asyncio.AsyncIOMotorClient = lambda *a, **kw: AsyncMongoMockClient(tz_aware=kw.get("tz_aware", False))
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+    import uvicorn
+    import server
+
+    async def prepare():
+        for name in (server.READINGS_COLLECTION, "buoy_rollups", "status_checks"):
+            await server.db[name].delete_many({})
+        await seed_history(server, args.seed, args.days)
+
+    server.app.add_event_handler("startup", prepare)
+    uvicorn.run(server.app, host="127.0.0.1", port=args.port, log_level="warning")
+    return 0
+
+def load(args):
+    """Boot (or target) a server, run every scenario and print the results as JSON"""
+    process = None
+    started_at = datetime.now(timezone.utc).isoformat()
+    base_url = args.base_url
+    if not base_url:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        command = [sys.executable, str(Path(__file__).resolve()), "serve", "--port", str(port),
+                   "--mongo", args.mongo, "--mongo-url", args.mongo_url, "--db-name", args.db_name,
+                   "--seed", str(args.seed), "--days", str(args.days)]
+        # Keep stdout clean for the JSON report
+        process = subprocess.Popen(command, stdout=sys.stderr)
+    try:
+        if process:
+            wait_for_server(base_url, process)
+        results = {}
+        for name in args.scenarios:
+            results[name] = run_load_scenario(base_url, name, args.requests, args.concurrency, args)
+            print(f"   {name}: {json.dumps(results[name])}", file=sys.stderr)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        "started_at": started_at,
+        "target": "external" if args.base_url else args.mongo,
+        "seeded_readings": None if args.base_url else args.seed,
+        "requests_per_scenario": args.requests,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+    return 0 if all(r["errors"] == 0 for r in results.values()) else 1
+
+# Range-query windows timed by the storage comparison
+STORAGE_WINDOWS = {"1h": timedelta(hours=1), "1d": timedelta(days=1), "7d": timedelta(days=7)}
+
+async def collection_storage(collection) -> Dict[str, Any]:
+    stats = await collection.aggregate([{"$collStats": {"storageStats": {}}}]).to_list(length=1)
+    storage = stats[0]["storageStats"] if stats else {}
+    return {
+        "storage_bytes": storage.get("storageSize"),
+        "index_bytes": storage.get("totalIndexSize"),
+        "uncompressed_bytes": storage.get("size"),
+    }
+
+async def storage_comparison(args) -> Dict[str, Any]:
+    """Load the same synthetic readings into a plain and a time-series collection and compare them"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from geo import ensure_geo_indexes, geojson_point
+    from timeseries import ensure_timeseries_collection
+
+    client = AsyncIOMotorClient(args.mongo_url, tz_aware=True)
+    db = client[args.db_name]
+    collections = {"plain": db.storage_plain, "timeseries": db.storage_timeseries}
+    try:
+        for collection in collections.values():
+            await collection.drop()
+        await ensure_timeseries_collection(collections["timeseries"], "seconds")
+        for kind, collection in collections.items():
+            # The indexes the backend creates in each mode
+            await collection.create_index([("timestamp", -1), ("id", -1)])
+            await collection.create_index("id", unique=kind == "plain")
+            await ensure_geo_indexes(collection)
+
+        bench = BuoyAPIBenchmark()
+        end = datetime.now(timezone.utc).replace(microsecond=0)
+        start = end - timedelta(days=args.days)
+        step = (end - start) / args.readings
+        insert_seconds = {kind: 0.0 for kind in collections}
+        for offset in range(0, args.readings, args.batch_size):
+            batch = []
+            for i in range(offset, min(args.readings, offset + args.batch_size)):
+                reading = bench.make_reading()
+                reading["id"] = f"{i:012d}"
+                reading["timestamp"] = start + step * i
+                reading["location"] = geojson_point(reading["gps_latitude"], reading["gps_longitude"])
+                batch.append(reading)
+            for kind, collection in collections.items():
+                began = time.perf_counter()
+                await collection.insert_many([dict(doc) for doc in batch], ordered=False)
+                insert_seconds[kind] += time.perf_counter() - began
+            if offset // args.batch_size % 100 == 0:
+                print(f"   inserted {offset + len(batch)}/{args.readings}", file=sys.stderr)
+
+        projection = {"_id": 0, "location": 0}
+        report: Dict[str, Any] = {}
+        for kind, collection in collections.items():
+            queries = {}
+            for name, window in STORAGE_WINDOWS.items():
+                timings = []
+                for _ in range(args.queries):
+                    window_start = start + (end - start - window) * random.random()
+                    began = time.perf_counter()
+                    await collection.find(
+                        {"timestamp": {"$gte": window_start, "$lt": window_start + window}}, projection
+                    ).sort("timestamp", 1).to_list(length=None)
+                    timings.append((time.perf_counter() - began) * 1000)
+                timings.sort()
+                queries[name] = {"p50_ms": round(percentile(timings, 50), 2),
+                                 "p95_ms": round(percentile(timings, 95), 2)}
+            report[kind] = {
+                **await collection_storage(collection),
+                "insert_readings_per_s": round(args.readings / insert_seconds[kind], 1),
+                "range_queries": queries,
+            }
+        if not args.keep:
+            for collection in collections.values():
+                await collection.drop()
+        return report
+    finally:
+        client.close()
+
+def storage(args):
+    """Compare storage size and range-query latency of the plain and time-series layouts"""
+    sys.path.insert(0, str(BACKEND_DIR))
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "readings": args.readings,
+        "days": args.days,
+        "queries_per_window": args.queries,
+        "collections": asyncio.run(storage_comparison(args)),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+    return 0
+
+def load_test_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Reproducible load test of the buoy backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("load", "serve"):
+        command = commands.add_parser(name)
+        command.add_argument("--mongo", choices=["mongod", "memory"], default="mongod",
+                             help="Local mongod (MONGO_URL) or the in-process mongomock stand-in")
+        command.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        command.add_argument("--db-name", default="buoy_benchmark", help="Database to (re)seed; it is wiped first")
+        command.add_argument("--seed", type=int, default=10000, help="Synthetic readings to seed")
+        command.add_argument("--days", type=float, default=7, help="History length the seed is spread over")
+    load_command = commands.choices["load"]
+    load_command.add_argument("--base-url", help="Benchmark an already running server instead of booting one")
+    load_command.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    load_command.add_argument("--concurrency", type=int, default=8)
+    load_command.add_argument("--batch-size", type=int, default=100)
+    load_command.add_argument("--scenarios", nargs="+", choices=list(LOAD_SCENARIOS), default=list(LOAD_SCENARIOS))
+    load_command.add_argument("--output", help="Also write the JSON report to this file")
+    commands.choices["serve"].add_argument("--port", type=int, default=8001)
+    storage_command = commands.add_parser("storage", help="Plain vs time-series collection on a real mongod")
+    storage_command.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    storage_command.add_argument("--db-name", default="buoy_benchmark")
+    storage_command.add_argument("--readings", type=int, default=10_000_000, help="Synthetic readings per collection")
+    storage_command.add_argument("--days", type=float, default=365, help="History length the readings span")
+    storage_command.add_argument("--batch-size", type=int, default=10000)
+    storage_command.add_argument("--queries", type=int, default=50, help="Range queries timed per window")
+    storage_command.add_argument("--keep", action="store_true", help="Keep both collections afterwards")
+    storage_command.add_argument("--output", help="Also write the JSON report to this file")
+    return parser
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ("load", "serve", "storage"):
+        args = load_test_parser().parse_args()
+        return {"load": load, "serve": serve, "storage": storage}[args.command](args)
+
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8001"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    print("🚀 Starting IoT Buoy Dashboard API Benchmarks")
+    print(f"   Target: {base_url}, readings per run: {count}")
+    print("=" * 50)
+
+    bench = BuoyAPIBenchmark(base_url)
+
+    print("\n📈 Ingest throughput")
+    single_rate = bench.bench_single_ingest(count)
+    for batch_size in (50, 250, 1000):
+        batch_rate = bench.bench_batch_ingest(count, batch_size)
+        print(f"   Speedup vs single: {batch_rate / single_rate:.1f}x")
+
+    print("\n⏱️  Query latency")
+    bench.bench_query_latency("Latest reading", "api/buoy/readings/latest", 100)
+    bench.bench_query_latency("Status", "api/buoy/status", 100)
+    bench.bench_query_latency("Readings (limit=100)", "api/buoy/readings", 50, params={"limit": 100})
+    bench.bench_query_latency("Summary (24h)", "api/buoy/readings/summary", 20, params={"hours": 24})
+    for rows in (1000, 10000):
+        bench.bench_query_latency(f"Readings (limit={rows})", "api/buoy/readings", 10, params={"limit": rows})
+
+    print("\n🧾 List serialization")
+    for rows in (1000, 10000):
+        bench.bench_list_encoding(rows)
+
+    print("\n🚨 Alert engine")
+    bench.bench_alert_engine(count * 100)
+
+    print("\n📦 Bulk export")
+    for export_format in ("ndjson", "csv", "parquet"):
+        bench.bench_export(export_format)
+
+    print("\n📡 Live stream fan-out")
+    asyncio.run(bench.bench_stream_fanout(1000))
+
+    print("\n📻 LoRa gateway")
+    bench.bench_lora_gateway(count * 10)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
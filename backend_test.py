@@ -101,6 +101,33 @@ class BuoyAPITester:
         
         return success
 
+    def test_create_buoy_readings_batch(self):
+        """Test creating several buoy readings in one batch"""
+        valid_reading = {
+            "gps_latitude": 37.7749,
+            "gps_longitude": -122.4194,
+            "battery_percentage": 84.0,
+            "water_turbidity": 14.1,
+            "water_temperature": 24.6,
+            "humidity": 71.5,
+            "air_pressure": 1013.0
+        }
+        invalid_reading = {"gps_latitude": 37.7749}
+        test_data = [valid_reading, invalid_reading, valid_reading]
+        
+        success, response = self.run_test("Create Buoy Readings Batch", "POST", "api/buoy/readings/batch", 200, test_data)
+        
+        if success:
+            if response.get('inserted') != 2 or response.get('failed') != 1:
+                print(f"❌ Unexpected batch counts: {response.get('inserted')} inserted, {response.get('failed')} failed")
+                return False
+            if response['results'][1].get('success'):
+                print("❌ Invalid item was not reported as failed")
+                return False
+            print("✅ Batch per-item results are valid")
+        
+        return success
+
     def test_get_latest_reading(self):
         """Test getting the latest buoy reading"""
         success, response = self.run_test("Get Latest Reading", "GET", "api/buoy/readings/latest", 200)
@@ -195,13 +222,14 @@ def main():
     print("🚀 Starting IoT Buoy Dashboard API Tests")
     print("=" * 50)
     
-    tester = BuoyAPITester()
+    tester = BuoyAPITester(sys.argv[1]) if len(sys.argv) > 1 else BuoyAPITester()
     
     # Test sequence
     tests = [
         ("API Root", tester.test_api_root),
         ("Buoy Status", tester.test_buoy_status),
         ("Create Buoy Reading", tester.test_create_buoy_reading),
+        ("Create Buoy Readings Batch", tester.test_create_buoy_readings_batch),
         ("Get Latest Reading", tester.test_get_latest_reading),
         ("Get Readings List", tester.test_get_readings_list),
         ("Get Readings with Date Filter", tester.test_get_readings_with_date_filter),
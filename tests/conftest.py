@@ -0,0 +1,34 @@
+"""Shared test setup.
+
+Backend modules are imported flat from ``backend/`` (as the server runs
+them), and API tests run the app against an in-memory mongomock database,
+so the suite needs no MongoDB server or Firebase credentials.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "buoy_test")
+
+
+@pytest.fixture(scope="session")
+def server():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = lambda *args, **kwargs: mongomock_motor.AsyncMongoMockClient(
+        tz_aware=kwargs.get("tz_aware", False)
+    )
+    import server
+    return server
+
+
+@pytest.fixture
+def api(server):
+    from fastapi.testclient import TestClient
+    with TestClient(server.app) as client:
+        client.delete("/api/buoy/readings")
+        yield client
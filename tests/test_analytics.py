@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+import pytest
+
+from analytics import correlations, ema, forward_fill, resample, rolling_mean_std
+
+
+def naive_rolling(x, window):
+    means, stds = [], []
+    for i in range(len(x)):
+        values = [v for v in x[max(0, i - window + 1):i + 1] if not math.isnan(v)]
+        means.append(np.mean(values) if values else np.nan)
+        stds.append(np.std(values) if values else np.nan)
+    return np.array(means), np.array(stds)
+
+
+def naive_ema(x, span):
+    alpha = 2.0 / (span + 1)
+    result, state = [], None
+    for value in x:
+        if not math.isnan(value):
+            state = value if state is None else (1 - alpha) * state + alpha * value
+        elif state is not None:
+            # Gaps carry the last value forward into the average
+            state = (1 - alpha) * state + alpha * last
+        result.append(np.nan if state is None else state)
+        if not math.isnan(value):
+            last = value
+    return np.array(result)
+
+
+def with_gaps(n: int, offset: float = 0.0, seed: int = 3) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    x = offset + np.cumsum(rng.normal(0, 0.5, n))
+    x[rng.random(n) < 0.1] = np.nan
+    x[:3] = np.nan
+    return x
+
+
+def test_rolling_mean_std_matches_a_direct_computation():
+    x = with_gaps(500)
+    mean, std = rolling_mean_std(x, 24)
+    expected_mean, expected_std = naive_rolling(x, 24)
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(std, expected_std, rtol=1e-7, atol=1e-9)
+    assert np.isnan(mean[:3]).all()
+
+
+def test_rolling_std_stays_accurate_for_large_values():
+    # Pressure in Pa: sums of squares near 1e13 would cancel without centring
+    x = with_gaps(500, offset=101325.0)
+    _, std = rolling_mean_std(x, 12)
+    np.testing.assert_allclose(std, naive_rolling(x, 12)[1], rtol=1e-6, atol=1e-6)
+
+
+def test_rolling_of_all_nan_is_nan():
+    mean, std = rolling_mean_std(np.full(5, np.nan), 3)
+    assert np.isnan(mean).all() and np.isnan(std).all()
+
+
+@pytest.mark.parametrize("span", [1, 5, 50])
+def test_ema_matches_the_recurrence_across_blocks(span):
+    # 20000 bins spans several closed-form blocks at span 50
+    x = with_gaps(20000)
+    np.testing.assert_allclose(ema(x, span), naive_ema(x, span), rtol=1e-9, atol=1e-9)
+
+
+def test_forward_fill_keeps_leading_gaps():
+    filled = forward_fill(np.array([np.nan, 1.0, np.nan, np.nan, 4.0]))
+    np.testing.assert_array_equal(filled, [np.nan, 1.0, 1.0, 1.0, 4.0])
+
+
+def test_resample_averages_each_bin():
+    times = np.array([0.0, 10.0, 70.0, 200.0, -5.0])
+    values = np.array([[1.0], [3.0], [np.nan], [8.0], [100.0]])
+    np.testing.assert_array_equal(resample(times, values, 0.0, 60.0, 3)[:, 0], [2.0, np.nan, np.nan])
+
+
+def test_correlations_need_three_overlapping_bins_and_variance():
+    grid = np.array([[1.0, 2.0, 5.0], [2.0, 4.0, 5.0], [3.0, 6.0, 5.0], [np.nan, 1.0, 5.0]])
+    matrix = correlations(["a", "b", "c"], grid)
+    assert matrix["a"]["b"] == matrix["b"]["a"] == 1.0
+    assert matrix["a"]["c"] is None
+    assert correlations(["a", "b"], grid[2:, :2])["a"]["b"] is None
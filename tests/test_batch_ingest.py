@@ -0,0 +1,35 @@
+READING = {
+    "gps_latitude": 6.9271,
+    "gps_longitude": 79.8612,
+    "battery_percentage": 85.0,
+    "water_turbidity": 12.5,
+    "water_temperature": 27.3,
+    "humidity": 78.0,
+    "air_pressure": 1012.0,
+}
+
+
+def test_batch_stores_valid_items_and_reports_invalid_ones(api):
+    batch = [READING, {**READING, "battery_percentage": 150}, {**READING, "water_temperature": 28.0}]
+    result = api.post("/api/buoy/readings/batch", json=batch).json()
+
+    assert (result["total"], result["inserted"], result["failed"]) == (3, 2, 1)
+    assert [r["success"] for r in result["results"]] == [True, False, True]
+    assert len(api.get("/api/buoy/readings").json()) == 2
+
+
+def test_batch_over_the_limit_is_rejected(api, server):
+    response = api.post("/api/buoy/readings/batch", json=[READING] * (server.MAX_BATCH_SIZE + 1))
+    assert response.status_code == 413
+
+
+def test_a_failing_side_write_does_not_stop_the_others(api, server, monkeypatch, caplog):
+    async def broken(*args):
+        raise ConnectionError("rollups unavailable")
+    monkeypatch.setattr(server, "apply_rollups", broken)
+
+    result = api.post("/api/buoy/readings/batch", json=[{**READING, "buoy_id": "east"}]).json()
+    assert result["inserted"] == 1
+    assert "Error updating rollups: rollups unavailable" in caplog.text
+    assert api.get("/api/buoys/east/status").status_code == 200
+    assert api.get("/api/buoy/readings/latest").json()["id"] == result["results"][0]["id"]
@@ -0,0 +1,17 @@
+import math
+
+
+def test_lttb_keeps_endpoints_and_peaks(server):
+    data = [(float(i), math.sin(i / 10)) for i in range(1000)]
+    data[437] = (437.0, 50.0)
+    sampled = server.lttb(data, 50)
+    assert len(sampled) == 50
+    assert sampled[0] == data[0] and sampled[-1] == data[-1]
+    assert (437.0, 50.0) in sampled
+    assert [p[0] for p in sampled] == sorted(p[0] for p in sampled)
+
+
+def test_lttb_returns_short_series_unchanged(server):
+    data = [(float(i), float(i)) for i in range(10)]
+    assert server.lttb(data, 10) == data
+    assert server.lttb(data, 2) == data
@@ -0,0 +1,66 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from exporters import PARQUET_AVAILABLE, encode_csv, encode_ndjson, encode_parquet
+from tests.test_fleet import store_two_buoys
+
+COLUMNS = [("id", "string"), ("timestamp", "timestamp"), ("water_temperature", "float")]
+T0 = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def encode(encoder, chunks):
+    async def rows():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        return [part async for part in encoder(rows(), COLUMNS)]
+    return asyncio.run(run())
+
+
+def chunks_of(count: int, size: int):
+    rows = [{"id": f"r{i}", "timestamp": T0.replace(second=i), "water_temperature": 20.0 + i} for i in range(count)]
+    return [rows[i:i + size] for i in range(0, count, size)]
+
+
+def test_export_carries_and_filters_by_buoy(api):
+    store_two_buoys(api, count=3)
+
+    rows = [json.loads(line) for line in api.get("/api/buoy/readings/export").text.splitlines()]
+    assert sorted(row["buoy_id"] for row in rows) == ["north"] * 3 + ["south"] * 3
+
+    response = api.get("/api/buoy/readings/export", params={"format": "csv", "buoy_id": "south"})
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 3
+    assert {row["buoy_id"] for row in rows} == {"south"}
+    assert rows == sorted(rows, key=lambda row: row["timestamp"])
+
+
+def test_csv_has_one_header_across_chunks():
+    parts = encode(encode_csv, chunks_of(5, 2))
+    assert len(parts) == 3
+    rows = list(csv.DictReader(io.StringIO(b"".join(parts).decode())))
+    assert [row["id"] for row in rows] == ["r0", "r1", "r2", "r3", "r4"]
+    assert rows[1]["timestamp"] == "2024-05-01T00:00:01+00:00"
+    assert encode(encode_csv, []) == [b"id,timestamp,water_temperature\r\n"]
+
+
+def test_ndjson_writes_one_line_per_row():
+    lines = b"".join(encode(encode_ndjson, chunks_of(3, 2))).decode().splitlines()
+    assert [json.loads(line)["water_temperature"] for line in lines] == [20.0, 21.0, 22.0]
+
+
+@pytest.mark.skipif(not PARQUET_AVAILABLE, reason="pyarrow is not installed")
+def test_parquet_writes_a_row_group_per_chunk():
+    import pyarrow.parquet as pq
+    data = b"".join(encode(encode_parquet, chunks_of(5, 2)))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column("id").to_pylist() == ["r0", "r1", "r2", "r3", "r4"]
+    assert table.column("timestamp").to_pylist()[4] == T0.replace(second=4)
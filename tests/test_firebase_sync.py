@@ -0,0 +1,55 @@
+import asyncio
+
+from firebase_sync import FakeFirebaseDatabase, FirebaseSyncQueue
+
+
+def reading(n: int) -> dict:
+    return {"id": f"r{n}", "timestamp": f"2024-05-01T12:00:{n:02d}+00:00", "water_temperature": 20.0 + n}
+
+
+def test_current_is_coalesced_to_the_newest_reading():
+    queue = FirebaseSyncQueue(FakeFirebaseDatabase().reference)
+    queue.enqueue(current=reading(1))
+    queue.enqueue(current=reading(3))
+    # A replayed older reading must not overwrite a newer one
+    queue.enqueue(current=reading(2))
+    assert queue.coalesced == 1
+    assert queue.depth == 1
+    assert queue._take_batch() == {"current": reading(3)}
+
+
+def test_backlog_drops_the_oldest_historical_entries():
+    queue = FirebaseSyncQueue(FakeFirebaseDatabase().reference, max_pending=3)
+    queue.enqueue(historical={f"r{n}": reading(n) for n in range(5)})
+    assert queue.dropped == 2
+    assert list(queue._take_batch()) == ["historical/r2", "historical/r3", "historical/r4"]
+
+
+def test_batches_are_capped_at_max_batch():
+    queue = FirebaseSyncQueue(FakeFirebaseDatabase().reference, max_batch=3)
+    queue.enqueue(current=reading(9), historical={f"r{n}": reading(n) for n in range(5)})
+    assert list(queue._take_batch()) == ["current", "historical/r0", "historical/r1"]
+    assert queue.depth == 6
+
+
+def test_failed_updates_are_retried_in_order():
+    async def run():
+        database = FakeFirebaseDatabase()
+        database.fail = True
+        queue = FirebaseSyncQueue(database.reference, max_batch=2, base_delay=0.01, max_delay=0.02)
+        queue.start()
+        queue.enqueue(current=reading(1), historical={"r0": reading(0), "r1": reading(1)})
+        while queue.retries < 2:
+            await asyncio.sleep(0.005)
+        # Newer entries queued during the outage go after the failed batch
+        queue.enqueue(current=reading(2), historical={"r2": reading(2)})
+        database.fail = False
+        await queue.stop(timeout=2.0)
+        return database, queue
+
+    database, queue = asyncio.run(run())
+    assert queue.depth == 0
+    assert queue.last_error == "Fake Firebase is unavailable"
+    assert database.data["buoy_data"]["current"] == reading(2)
+    assert database.data["buoy_data"]["historical"] == {f"r{n}": reading(n) for n in range(3)}
+    assert queue.synced_entries == 4
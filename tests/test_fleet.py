@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fleet import adopt_untagged_readings, fleet_updates
+
+READING = {
+    "battery_percentage": 85.0, "water_turbidity": 12.5, "water_temperature": 27.3,
+    "humidity": 78.0, "air_pressure": 1012.0,
+}
+
+
+def store_two_buoys(api, count: int = 6):
+    start = datetime.now(timezone.utc) - timedelta(hours=2)
+    batch = []
+    for i in range(count):
+        timestamp = (start + timedelta(minutes=10 * i)).isoformat()
+        batch.append({**READING, "buoy_id": "north", "timestamp": timestamp, "water_temperature": 20.0 + i,
+                      "gps_latitude": 7.0 + i * 0.001, "gps_longitude": 79.8})
+        batch.append({**READING, "buoy_id": "south", "timestamp": timestamp, "water_temperature": 30.0 + i,
+                      "gps_latitude": 6.0, "gps_longitude": 79.8 + i * 0.001})
+    assert api.post("/api/buoy/readings/batch", json=batch).json()["inserted"] == 2 * count
+
+
+def test_fleet_status_lists_each_buoy(api):
+    store_two_buoys(api)
+    status = {s["buoy_id"]: s for s in api.get("/api/fleet/status").json()}
+    assert set(status) == {"north", "south"}
+    assert status["north"]["total_readings"] == 6
+    assert status["north"]["latest"]["water_temperature"] == 25.0
+    assert api.get("/api/buoys/nowhere/status").status_code == 404
+
+
+def test_track_is_per_buoy(api):
+    store_two_buoys(api)
+    track = api.get("/api/buoys/north/track", params={"tolerance_m": 0}).json()
+    assert track["original_points"] == 6
+    assert {p["longitude"] for p in track["points"]} == {79.8}
+
+    merged = api.get("/api/buoy/track", params={"tolerance_m": 0}).json()
+    assert merged["original_points"] == 12
+    assert api.get("/api/buoy/track", params={"buoy_id": "south"}).json()["original_points"] == 6
+
+
+def test_series_is_per_buoy(api):
+    store_two_buoys(api)
+    for mode in ("buckets", "lttb"):
+        series = api.get("/api/buoys/south/readings/series", params={"metric": "temperature", "mode": mode}).json()
+        values = [p.get("value", p.get("avg")) for p in series["points"]]
+        assert values and min(values) >= 30.0
+    assert api.get("/api/buoys/nowhere/readings/series", params={"metric": "temperature"}).status_code == 404
+
+
+def test_readings_stored_before_fleet_support_are_adopted_once():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True).fleet_test
+        start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        legacy = [{**READING, "timestamp": start + timedelta(minutes=i), "water_temperature": 20.0 + i}
+                  for i in range(5)]
+        await db.readings.insert_many(legacy)
+        # A reading stored by an upgraded worker before adoption ran
+        fresh = {**READING, "buoy_id": "buoy-1", "timestamp": start - timedelta(days=1)}
+        await db.readings.insert_one(dict(fresh))
+        fields = [*READING, "timestamp"]
+        await db.fleet.bulk_write(fleet_updates([fresh], fields))
+
+        assert await adopt_untagged_readings(db.readings, db.fleet, db.migrations, "buoy-1", fields) == 5
+        assert await adopt_untagged_readings(db.readings, db.fleet, db.migrations, "buoy-1", fields) is None
+        assert await db.readings.count_documents({"buoy_id": "buoy-1"}) == 6
+        entry = await db.fleet.find_one({"_id": "buoy-1"})
+        assert entry["total_readings"] == 6
+        assert entry["first_reading"] == fresh["timestamp"]
+        assert entry["latest"]["water_temperature"] == 24.0
+
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+import math
+
+import numpy as np
+
+from geo import douglas_peucker, simplify_track
+
+
+def segment_distance(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else min(1.0, max(0.0, ((px - ax) * dx + (py - ay) * dy) / length2))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def test_straight_line_keeps_only_its_endpoints():
+    x = np.linspace(0, 1000, 50)
+    assert douglas_peucker(x, 2 * x, 1.0).tolist() == [0, 49]
+    assert douglas_peucker(np.array([]), np.array([]), 1.0).tolist() == []
+    assert douglas_peucker(np.array([1.0]), np.array([1.0]), 1.0).tolist() == [0]
+
+
+def test_out_and_back_keeps_the_turning_point():
+    # Every point lies on the line through the endpoints, but not on the segment
+    x = np.array([0.0, 50.0, 100.0, 50.0, 10.0])
+    y = np.zeros(5)
+    assert douglas_peucker(x, y, 5.0).tolist() == [0, 2, 4]
+
+
+def test_dropped_points_stay_within_tolerance():
+    rng = np.random.default_rng(7)
+    x = np.cumsum(rng.normal(0, 10, 2000))
+    y = np.cumsum(rng.normal(0, 10, 2000))
+    kept = douglas_peucker(x, y, 25.0)
+    assert 2 < len(kept) < 2000
+    for a, b in zip(kept, kept[1:]):
+        for i in range(a + 1, b):
+            assert segment_distance(x[i], y[i], x[a], y[a], x[b], y[b]) <= 25.0
+
+
+def test_long_tracks_do_not_recurse():
+    # Far more vertices than the recursion limit, nearly all of them kept
+    rng = np.random.default_rng(11)
+    x = np.cumsum(rng.normal(0, 10, 50000))
+    y = np.cumsum(rng.normal(0, 10, 50000))
+    assert len(douglas_peucker(x, y, 0.5)) > 40000
+
+
+def test_simplify_track_drops_invalid_positions():
+    points = [
+        {"timestamp": i, "gps_latitude": 6.9 + i * 0.001, "gps_longitude": 79.8} for i in range(5)
+    ] + [{"timestamp": 5, "gps_latitude": 200.0, "gps_longitude": 79.8}]
+    track = simplify_track(points, tolerance_m=1.0)
+    assert track["original_points"] == 5
+    assert [p["timestamp"] for p in track["points"]] == [0, 4]
+    assert 440 < track["distance_m"] < 450
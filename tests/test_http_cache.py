@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+from http_cache import ResponseCache, etag_matches, http_date, is_not_modified, strong_etag
+from tests.test_batch_ingest import READING
+
+MODIFIED = datetime(2024, 5, 1, 12, 0, 0, 250000, tzinfo=timezone.utc)
+ETAG = strong_etag("reading", MODIFIED.isoformat())
+
+
+def test_etag_matching_is_weak_and_accepts_lists():
+    assert etag_matches(ETAG, ETAG)
+    assert etag_matches(f'"other", W/{ETAG}', ETAG)
+    assert etag_matches("*", ETAG)
+    assert not etag_matches('"other"', ETAG)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    later = http_date(MODIFIED + timedelta(hours=1))
+    # A stale ETag is modified even though the date alone would say otherwise
+    assert not is_not_modified({"if-none-match": '"stale"', "if-modified-since": later}, ETAG, MODIFIED)
+    # A matching ETag is not modified even with an old date
+    earlier = http_date(MODIFIED - timedelta(hours=1))
+    assert is_not_modified({"if-none-match": ETAG, "if-modified-since": earlier}, ETAG, MODIFIED)
+
+
+def test_if_modified_since_compares_whole_seconds():
+    assert is_not_modified({"if-modified-since": http_date(MODIFIED)}, ETAG, MODIFIED)
+    assert not is_not_modified({"if-modified-since": http_date(MODIFIED - timedelta(seconds=1))}, ETAG, MODIFIED)
+    assert not is_not_modified({"if-modified-since": "not a date"}, ETAG, MODIFIED)
+    assert not is_not_modified({}, ETAG, MODIFIED)
+
+
+def test_response_cache_keeps_the_etag_of_identical_bodies():
+    cache = ResponseCache(ttl=60)
+    first = cache.put("summary", 1, b'{"count": 1}')
+    assert cache.get("summary", 1) == first
+    assert cache.get("summary", 2) is None
+    same = cache.put("summary", 2, b'{"count": 1}')
+    assert (same.etag, same.modified_at) == (first.etag, first.modified_at)
+    assert cache.put("summary", 3, b'{"count": 2}').etag != first.etag
+
+
+def test_latest_reading_revalidates_with_a_304(api):
+    api.post("/api/buoy/readings", json=READING)
+    response = api.get("/api/buoy/readings/latest")
+    etag = response.headers["ETag"]
+    assert api.get("/api/buoy/readings/latest", headers={"If-None-Match": etag}).status_code == 304
+    revalidated = api.get("/api/buoy/readings/latest", headers={
+        "If-None-Match": '"stale"', "If-Modified-Since": response.headers["Last-Modified"],
+    })
+    assert revalidated.status_code == 200
+
+    api.post("/api/buoy/readings", json=READING)
+    assert api.get("/api/buoy/readings/latest", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_latest_etag_survives_a_refresh_from_mongo(api, server):
+    timestamp = datetime.now(timezone.utc).replace(microsecond=123456) - timedelta(minutes=1)
+    api.post("/api/buoy/readings", json={**READING, "timestamp": timestamp.isoformat()})
+    api.post("/api/buoy/readings", json={**READING, "timestamp": timestamp.isoformat()})
+    before = api.get("/api/buoy/readings/latest")
+    assert before.json()["timestamp"].startswith(timestamp.strftime("%Y-%m-%dT%H:%M:%S.123"))
+
+    server.latest_cache.refreshed_at = 0.0
+    after = api.get("/api/buoy/readings/latest", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 304
+    assert after.headers["ETag"] == before.headers["ETag"]
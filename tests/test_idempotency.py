@@ -0,0 +1,51 @@
+from idempotency import IdempotencyCache, is_duplicate_key_error
+from tests.test_batch_ingest import READING
+
+
+def test_cache_evicts_the_least_recently_used_key():
+    cache = IdempotencyCache(max_size=2)
+    cache.add("a", "id-a", None)
+    cache.add("b", "id-b", None)
+    assert cache.get("a") == ("id-a", None)
+    cache.add("c", "id-c", None)
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert cache.metrics() == {"size": 2, "max_size": 2, "hits": 1, "misses": 1}
+
+
+def test_cache_of_size_zero_keeps_nothing():
+    cache = IdempotencyCache(max_size=0)
+    cache.add("a", "id-a", None)
+    assert cache.get("a") is None
+
+
+def test_duplicate_key_errors_are_told_apart_from_other_collisions():
+    assert is_duplicate_key_error({"code": 11000, "keyPattern": {"idempotency_key": 1}})
+    assert is_duplicate_key_error({"code": 11000, "errmsg": "E11000 dup key: idempotency_key_unique"})
+    assert not is_duplicate_key_error({"code": 11000, "keyPattern": {"id": 1}})
+    assert not is_duplicate_key_error({"code": 121, "errmsg": "idempotency_key failed validation"})
+
+
+def test_repeat_is_answered_from_the_cache(api):
+    first = api.post("/api/buoy/readings", json={**READING, "idempotency_key": "gw:1"})
+    repeat = api.post("/api/buoy/readings", json={**READING, "idempotency_key": "gw:1"})
+    assert repeat.headers["X-Duplicate"] == "true"
+    assert repeat.json()["id"] == first.json()["id"]
+    assert repeat.json()["timestamp"] == first.json()["timestamp"]
+    assert len(api.get("/api/buoy/readings").json()) == 1
+
+
+def test_repeat_missing_from_the_cache_hits_the_unique_index(api, server):
+    first = api.post("/api/buoy/readings", json={**READING, "idempotency_key": "gw:1"}).json()
+    server.idempotency_cache.clear()
+    repeat = api.post("/api/buoy/readings", json={**READING, "idempotency_key": "gw:1"})
+    assert repeat.headers["X-Duplicate"] == "true"
+    assert repeat.json()["id"] == first["id"]
+
+    server.idempotency_cache.clear()
+    batch = [{**READING, "idempotency_key": key} for key in ("gw:1", "gw:2", "gw:2")]
+    result = api.post("/api/buoy/readings/batch", json=batch).json()
+    assert (result["inserted"], result["duplicates"]) == (1, 2)
+    assert result["results"][0]["id"] == first["id"]
+    assert result["results"][1]["id"] == result["results"][2]["id"]
+    assert len(api.get("/api/buoy/readings").json()) == 2
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from importer import SHEET_COLUMNS, build_documents, import_csv, validate_chunk
+
+ROW = {
+    "gps_latitude": "6.9271", "gps_longitude": "79.8612", "water_temperature": "27.3", "humidity": "78",
+    "air_pressure": "1012", "water_turbidity": "12.5", "battery_percentage": "85",
+    "detected_object_class": "boat", "timestamp": "2024-05-01T08:30:00+05:30",
+}
+
+
+def chunk(*rows: dict) -> pd.DataFrame:
+    return pd.DataFrame([{**ROW, **row} for row in rows], columns=SHEET_COLUMNS, dtype=str)
+
+
+def test_invalid_rows_are_dropped():
+    frame = validate_chunk(chunk(
+        {},
+        {"battery_percentage": "101"},
+        {"humidity": "-1"},
+        {"water_temperature": "warm"},
+        {"air_pressure": "nan"},
+        {"timestamp": "yesterday"},
+        {"battery_percentage": "100", "humidity": "0"},
+    ), "buoy-1", utc_wall_clock=False)
+    assert frame.index.tolist() == [0, 6]
+    assert frame["buoy_id"].tolist() == ["buoy-1", "buoy-1"]
+
+
+def test_timestamps_trust_or_ignore_the_offset():
+    rows = chunk({})
+    assert validate_chunk(rows, "b", utc_wall_clock=False)["timestamp"].iloc[0] == \
+        pd.Timestamp("2024-05-01T03:00:00Z")
+    assert validate_chunk(rows, "b", utc_wall_clock=True)["timestamp"].iloc[0] == \
+        pd.Timestamp("2024-05-01T08:30:00Z")
+
+
+def test_no_detection_classes_become_none():
+    frame = validate_chunk(chunk({"detected_object_class": " None "}, {"detected_object_class": " kayak "}), "b")
+    assert [doc["detected_object_class"] for doc in build_documents(frame)] == [None, "kayak"]
+
+
+def test_ids_are_deterministic_per_row_and_buoy():
+    rows = chunk({}, {"water_temperature": "27.4"})
+    first = validate_chunk(rows, "b")["id"].tolist()
+    assert validate_chunk(rows, "b")["id"].tolist() == first
+    assert len(set(first)) == 2
+    assert validate_chunk(rows, "other")["id"].tolist() != first
+    assert all(len(i) == 36 and i.count("-") == 4 for i in first)
+
+
+def test_documents_match_what_ingest_stores():
+    rows = chunk({}, {"gps_latitude": "95", "detected_object_class": ""})
+    docs = build_documents(validate_chunk(rows, "b", utc_wall_clock=False))
+    assert docs[0]["timestamp"] == datetime(2024, 5, 1, 3, 0, tzinfo=timezone.utc)
+    assert docs[0]["detected_object_class"] == "boat"
+    assert docs[0]["location"] == {"type": "Point", "coordinates": [79.8612, 6.9271]}
+    assert docs[1]["detected_object_class"] is None
+    assert "location" not in docs[1]
+
+
+def test_timestamps_default_to_utc_wall_clock():
+    assert validate_chunk(chunk({}), "b")["timestamp"].iloc[0] == pd.Timestamp("2024-05-01T08:30:00Z")
+
+
+def test_resuming_in_the_other_timestamp_mode_is_refused(tmp_path):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    path = tmp_path / "sheet.csv"
+    chunk({}, {"water_temperature": "27.4"}).to_csv(path, header=False, index=False)
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True).import_test
+        collections = (db.readings, db.rollups, db.fleet, db.events, db.counts, db.checkpoints)
+
+        async def load(**options):
+            return await import_csv(str(path), *collections, {"temp": "water_temperature"}, ["water_temperature"],
+                                    "b", **options)
+
+        assert (await load())["inserted"] == 2
+        stored = await db.readings.find_one({})
+        with pytest.raises(ValueError, match="UTC wall-clock"):
+            await load(utc_wall_clock=False)
+        assert (await load())["inserted"] == 2
+        return stored
+
+    stored = asyncio.run(run())
+    assert stored["timestamp"] == datetime(2024, 5, 1, 8, 30, tzinfo=timezone.utc)
+
+
+def test_derived_writes_are_finished_after_a_crash(tmp_path, monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import importer
+    path = tmp_path / "sheet.csv"
+    chunk({}, {"water_temperature": "27.4"}).to_csv(path, header=False, index=False)
+
+    async def crash(*args):
+        raise ConnectionError("lost the primary")
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True).import_crash_test
+        collections = (db.readings, db.rollups, db.fleet, db.events, db.counts, db.checkpoints)
+
+        async def load():
+            return await import_csv(str(path), *collections, {"temp": "water_temperature"}, ["water_temperature"], "b")
+
+        # The rows and their rollups are stored, then the registry update fails
+        with monkeypatch.context() as patch:
+            patch.setattr(importer, "apply_fleet_updates", crash)
+            with pytest.raises(ConnectionError):
+                await load()
+        assert await db.readings.count_documents({}) == 2
+        assert await db.fleet.count_documents({}) == 0
+
+        totals = await load()
+        assert (totals["inserted"], totals["duplicates"]) == (0, 2)
+        assert (await db.fleet.find_one({"_id": "b"}))["total_readings"] == 2
+        hour = await db.rollups.find_one({"granularity": "hour", "metric": "temp"})
+        assert hour["count"] == 2
+        assert await db.checkpoints.count_documents({"kind": importer.PENDING_BATCH_KIND}) == 0
+
+    asyncio.run(run())
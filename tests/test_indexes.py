@@ -0,0 +1,16 @@
+import asyncio
+
+
+def test_one_failing_index_group_does_not_skip_the_rest(server, monkeypatch, caplog):
+    async def conflicting(*args):
+        raise RuntimeError("index options conflict")
+    monkeypatch.setattr(server, "ensure_rollup_indexes", conflicting)
+
+    async def run():
+        failed = await server.ensure_indexes()
+        return failed, await server.db.detection_events.index_information()
+
+    failed, detection_indexes = asyncio.run(run())
+    assert "rollup" in failed and "detection" not in failed
+    assert "Error creating rollup indexes: index options conflict" in caplog.text
+    assert "class_timestamp_desc" in detection_indexes
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from ingest_buffer import BufferFull, IngestBuffer
+
+T0 = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def reading(n: int) -> dict:
+    return {"id": f"r{n}", "timestamp": T0.replace(second=n % 60), "water_temperature": 20.0 + n}
+
+
+async def until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+
+def test_appends_are_flushed_in_order_and_group_committed(tmp_path):
+    flushed = []
+
+    async def flush(batch):
+        flushed.extend(batch)
+
+    async def run():
+        buffer = IngestBuffer(str(tmp_path / "buffer.db"), flush, max_batch=4)
+        await buffer.start()
+        await asyncio.gather(*(buffer.append([reading(n)]) for n in range(10)))
+        await until(lambda: not buffer.pending)
+        await buffer.stop()
+        return buffer
+
+    buffer = asyncio.run(run())
+    assert flushed == [reading(n) for n in range(10)]
+    assert buffer.commits < 10
+    assert buffer.batches_flushed == 3
+    assert (buffer.pending, buffer.pending_bytes) == (0, 0)
+
+
+def test_append_past_the_budget_raises_buffer_full(tmp_path):
+    async def never(batch):
+        raise ConnectionError("mongo is down")
+
+    async def run():
+        buffer = IngestBuffer(str(tmp_path / "buffer.db"), never, max_bytes=300, base_delay=10)
+        await buffer.start()
+        await buffer.append([reading(1), reading(2)])
+        with pytest.raises(BufferFull):
+            await buffer.append([reading(3), reading(4)])
+        await buffer.stop(timeout=0)
+        return buffer
+
+    buffer = asyncio.run(run())
+    assert buffer.rejected == 2
+    assert buffer.pending == 2
+
+
+def test_failed_flushes_are_retried_and_survive_a_restart(tmp_path):
+    path = str(tmp_path / "buffer.db")
+    attempts = []
+    flushed = []
+
+    async def failing(batch):
+        attempts.append(len(batch))
+        raise ConnectionError("mongo is down")
+
+    async def working(batch):
+        flushed.extend(batch)
+
+    async def run():
+        buffer = IngestBuffer(path, failing, base_delay=0.01, max_delay=0.01)
+        await buffer.start()
+        await buffer.append([reading(n) for n in range(3)])
+        await until(lambda: buffer.retries >= 2)
+        await buffer.stop(timeout=0)
+
+        restarted = IngestBuffer(path, working)
+        await restarted.start()
+        assert restarted.recovered == 3
+        await until(lambda: not restarted.pending)
+        await restarted.stop()
+
+    asyncio.run(run())
+    assert attempts[:2] == [3, 3]
+    assert flushed == [reading(n) for n in range(3)]
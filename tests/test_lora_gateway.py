@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from lora_gateway import (
+    BINARY_PAYLOAD, CHECKSUM_DEDUPE_WINDOW, Frame, FrameError, FrameReader, LoRaGateway,
+    decode_payload, encode_binary_payload, encode_frame, idempotency_key, parse_frame,
+)
+
+DEFAULTS = {
+    "gps_latitude": 6.9, "gps_longitude": 79.8, "battery_percentage": 90.0,
+    "water_turbidity": 10.0, "air_pressure": 1010.0,
+}
+
+
+def ascii_frame(msg_id: int, received_at: float, payload: bytes = b"27.50:80.00") -> Frame:
+    return Frame(0x01, 0x0A, msg_id & 0xFF, payload, received_at)
+
+
+def test_retransmit_in_the_same_window_shares_its_key():
+    first = ascii_frame(7, 1000.0)
+    assert idempotency_key(first) == idempotency_key(first._replace(received_at=1001.0))
+
+
+def test_same_payload_after_msg_id_wraps_gets_a_new_key():
+    gateway = LoRaGateway("http://api", defaults=DEFAULTS)
+    received_at = 10_000.0
+    keys = []
+    for n in range(257):
+        # msg 0 and msg 256 carry the same id and the same values
+        payload = b"27.50:80.00" if n in (0, 256) else f"{20 + n / 100:.2f}:80.00".encode()
+        reading = gateway.handle(ascii_frame(n, received_at + n * 5, payload))
+        keys.append(reading["idempotency_key"])
+    assert 256 * 5 > CHECKSUM_DEDUPE_WINDOW
+    assert keys[0] != keys[256]
+    assert len(set(keys)) == 257
+
+
+def test_immediate_repeat_of_a_frame_is_dropped():
+    gateway = LoRaGateway("http://api", defaults=DEFAULTS)
+    frame = ascii_frame(3, 1000.0)
+    assert gateway.handle(frame) is not None
+    assert gateway.handle(frame) is None
+    assert gateway.duplicates == 1
+
+
+def test_wrapped_repeat_is_stored_by_the_api(api):
+    gateway = LoRaGateway("http://api", defaults=DEFAULTS)
+    start = datetime.now(timezone.utc).timestamp() - 3600
+    original = gateway.handle(ascii_frame(5, start))
+    gateway.handle(ascii_frame(6, start + 1, b"26.00:70.00"))
+    repeat = gateway.handle(ascii_frame(5 + 256, start + 256 * 5))
+
+    result = api.post("/api/buoy/readings/batch", json=[original, repeat]).json()
+    assert (result["inserted"], result["duplicates"]) == (2, 0)
+    result = api.post("/api/buoy/readings/batch", json=[original]).json()
+    assert (result["inserted"], result["duplicates"]) == (0, 1)
+
+
+
+FULL_READING = {
+    **DEFAULTS, "water_temperature": 27.5, "humidity": 80.0, "detected_object_class": "boat",
+}
+
+
+def test_binary_payload_round_trip():
+    measured = datetime(2025, 9, 3, 6, 30, tzinfo=timezone.utc)
+    payload = encode_binary_payload(FULL_READING, measured)
+    assert len(payload) == BINARY_PAYLOAD.size
+
+    decoded = decode_payload(payload)
+    assert decoded["timestamp"] == measured
+    assert decoded["detected_object_class"] == "boat"
+    for field in ("gps_latitude", "gps_longitude", "water_temperature", "humidity", "air_pressure"):
+        assert decoded[field] == pytest.approx(FULL_READING[field])
+
+
+def test_ascii_payload_decode_and_errors():
+    assert decode_payload(b"27.50:80.00") == {"water_temperature": 27.5, "humidity": 80.0}
+    with pytest.raises(FrameError):
+        decode_payload(b"27.50")
+    with pytest.raises(FrameError):
+        parse_frame(encode_frame(b"27.50:80.00", sender=0x0A, msg_id=1)[:-1])
+
+
+def test_frame_reader_resyncs_after_noise_and_split_reads():
+    first = encode_frame(b"27.50:80.00", sender=0x0A, msg_id=1)
+    second = encode_frame(b"26.00:70.00", sender=0x0B, msg_id=2)
+    stream = b"\xff\x00noise" + first + second
+    reader = FrameReader()
+
+    frames = reader.feed(stream[:10]) + reader.feed(stream[10:])
+    assert [(f.sender, f.msg_id, f.payload) for f in frames] == [
+        (0x0A, 1, b"27.50:80.00"), (0x0B, 2, b"26.00:70.00"),
+    ]
+    assert reader.skipped_bytes == len(b"\xff\x00noise")
+
+
+def test_forwarded_readings_keep_their_measurement_time():
+    gateway = LoRaGateway("http://api")
+    measured = datetime(2025, 9, 3, 6, 30, tzinfo=timezone.utc)
+    binary = Frame(0x01, 0x0C, 1, encode_binary_payload(FULL_READING, measured), 2_000_000_000.0)
+    assert gateway.handle(binary)["timestamp"] == measured.isoformat()
+
+    # ASCII payloads have no clock: stamped on receipt, not with the last binary timestamp
+    ascii_reading = gateway.handle(Frame(0x01, 0x0C, 2, b"28.00:81.00", 2_000_000_060.0))
+    assert ascii_reading["timestamp"] == datetime.fromtimestamp(2_000_000_060, timezone.utc).isoformat()
+
+
+def test_detections_are_not_carried_over_to_later_frames():
+    gateway = LoRaGateway("http://api")
+    binary = Frame(0x01, 0x0E, 1, encode_binary_payload(FULL_READING), 2_000_000_000.0)
+    readings = [gateway.handle(binary)] + [
+        gateway.handle(Frame(0x01, 0x0E, n, b"28.00:81.00", 2_000_000_000.0 + 60 * n)) for n in (2, 3)
+    ]
+    assert [r["detected_object_class"] for r in readings] == ["boat", None, None]
+    # Position and sensor values still carry over from the binary frame
+    assert readings[2]["gps_latitude"] == pytest.approx(FULL_READING["gps_latitude"])
+    assert readings[2]["air_pressure"] == pytest.approx(FULL_READING["air_pressure"])
+
+
+def test_backlog_is_stored_at_measurement_time(api):
+    gateway = LoRaGateway("http://api")
+    measured = (datetime.now(timezone.utc) - timedelta(hours=3)).replace(microsecond=0)
+    frame = Frame(0x01, 0x0D, 1, encode_binary_payload(FULL_READING, measured), measured.timestamp() + 7200)
+
+    result = api.post("/api/buoy/readings/batch", json=[gateway.handle(frame)]).json()
+    assert result["inserted"] == 1
+    stored = api.get("/api/buoy/readings").json()[0]
+    assert datetime.fromisoformat(stored["timestamp"].replace("Z", "+00:00")) == measured
+
+
+def test_timestamps_beyond_clock_skew_are_rejected(api, server):
+    now = datetime.now(timezone.utc)
+    batch = [
+        {**FULL_READING, "timestamp": (now + timedelta(seconds=server.MAX_CLOCK_SKEW_SECONDS + 60)).isoformat()},
+        {**FULL_READING, "timestamp": (now - timedelta(days=server.MAX_BACKFILL_DAYS + 1)).isoformat()},
+        {**FULL_READING, "timestamp": (now - timedelta(minutes=5)).isoformat()},
+    ]
+    result = api.post("/api/buoy/readings/batch", json=batch).json()
+    assert [r["success"] for r in result["results"]] == [False, False, True]
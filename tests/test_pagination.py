@@ -0,0 +1,52 @@
+import base64
+from datetime import datetime, timezone
+
+import pytest
+
+from tests.test_fleet import store_two_buoys
+
+
+def test_cursor_round_trips_the_sort_key(server):
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+    cursor = server.encode_cursor({"timestamp": timestamp, "id": "abc"})
+    assert "=" not in cursor
+    assert server.decode_cursor(cursor) == (timestamp, "abc")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"t": "yesterday", "id": "x"}').decode(),
+    base64.urlsafe_b64encode(b'{"id": "x"}').decode(),
+])
+def test_bad_cursor_is_a_400(api, cursor):
+    response = api.get("/api/buoy/readings", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_cursor_pages_cover_every_reading_once(api):
+    # Both buoys share timestamps, so pages must break ties on id
+    store_two_buoys(api, count=6)
+    everything = api.get("/api/buoy/readings", params={"limit": 100}).json()
+    assert "X-Next-Cursor" not in api.get("/api/buoy/readings", params={"limit": 100}).headers
+
+    seen = []
+    params = {"limit": 5}
+    while True:
+        response = api.get("/api/buoy/readings", params=params)
+        seen.extend(reading["id"] for reading in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params = {"limit": 5, "cursor": response.headers["X-Next-Cursor"]}
+    assert seen == [reading["id"] for reading in everything]
+    assert len(seen) == 12
+
+
+def test_skip_is_ignored_with_a_cursor(api):
+    store_two_buoys(api, count=3)
+    first = api.get("/api/buoy/readings", params={"limit": 2})
+    cursor = first.headers["X-Next-Cursor"]
+    with_skip = api.get("/api/buoy/readings", params={"limit": 2, "skip": 3, "cursor": cursor}).json()
+    without = api.get("/api/buoy/readings", params={"limit": 2, "cursor": cursor}).json()
+    assert with_skip == without
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from retention import COMPACTION_STATE_ID, RetentionCompactor, RetentionPolicy
+
+METRICS = {"water_temperature": "water_temperature"}
+
+
+def test_raw_retention_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("RETENTION_RAW_DAYS", raising=False)
+    policy = RetentionPolicy.from_env()
+    assert policy.raw_days == 0
+    assert not policy.enabled
+    assert policy.cutoffs(datetime.now(timezone.utc))["raw"] is None
+    assert "kept forever" in policy.describe()
+
+
+def test_cutoffs_follow_the_policy():
+    now = datetime(2024, 6, 30, 12, tzinfo=timezone.utc)
+    cutoffs = RetentionPolicy(raw_days=30, minute_days=0).cutoffs(now)
+    assert cutoffs == {"raw": now - timedelta(days=30), "minute": None, "hour": None, "day": None}
+    cutoffs = RetentionPolicy(raw_days=30, minute_days=365).cutoffs(now)
+    assert cutoffs["minute"] == now - timedelta(days=365)
+
+
+def test_compaction_advances_the_watermark_and_shares_it(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import retention
+
+    # TTL housekeeping needs list_collections, which mongomock lacks
+    async def no_indexes(*args):
+        pass
+    monkeypatch.setattr(retention, "ensure_retention_indexes", no_indexes)
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True).retention_test
+        now = datetime.now(timezone.utc)
+        start = (now - timedelta(hours=2)).replace(second=0, microsecond=0)
+        await db.readings.insert_many([
+            {"timestamp": start + timedelta(seconds=20 * i), "water_temperature": 20.0 + i}
+            for i in range(9)
+        ])
+        policy = RetentionPolicy(raw_days=30, minute_days=0, compaction_lag_seconds=300)
+        compactor = RetentionCompactor(db.readings, db.rollups, db.retention, METRICS, policy)
+        other = RetentionCompactor(db.readings, db.rollups, db.retention, METRICS, policy)
+
+        written = await compactor.compact_once()
+        assert written == 3
+        target = (now - timedelta(seconds=300)).replace(second=0, microsecond=0)
+        assert compactor.compacted_until == target
+        state = await db.retention.find_one({"_id": COMPACTION_STATE_ID})
+        assert state["watermark"].replace(tzinfo=timezone.utc) == target
+
+        minutes = await db.rollups.find({"granularity": "minute"}).sort("bucket_start", 1).to_list(length=None)
+        assert [m["count"] for m in minutes] == [3, 3, 3]
+        assert (minutes[0]["sum"], minutes[0]["first"], minutes[0]["last"]) == (63.0, 20.0, 22.0)
+
+        # The lease is held, so a second worker only picks up the watermark
+        assert await other.compact_once() == 0
+        assert other.compacted_until == target
+        # Nothing new behind the watermark: a repeat pass writes nothing
+        assert await compactor.compact_once() == 0
+
+    asyncio.run(run())
+
+
+def test_late_readings_behind_the_watermark_are_compacted_again(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import retention
+
+    async def no_indexes(*args):
+        pass
+    monkeypatch.setattr(retention, "ensure_retention_indexes", no_indexes)
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True).retention_late_test
+        now = datetime.now(timezone.utc)
+        start = (now - timedelta(hours=2)).replace(second=0, microsecond=0)
+        await db.readings.insert_many([
+            {"timestamp": start + timedelta(seconds=20 * i), "water_temperature": 20.0 + i} for i in range(3)
+        ])
+        policy = RetentionPolicy(raw_days=30, minute_days=0, compaction_lag_seconds=300)
+        compactor = RetentionCompactor(db.readings, db.rollups, db.retention, METRICS, policy)
+        assert await compactor.compact_once() == 1
+
+        # Stored by a worker that had not seen the new watermark yet, so it
+        # did not go into the minute rollups on ingest
+        late = [{"timestamp": start + timedelta(seconds=50), "water_temperature": 40.0},
+                {"timestamp": now, "water_temperature": 41.0}]
+        await db.readings.insert_many([dict(r) for r in late])
+        assert await compactor.mark_late(late) == 1
+
+        assert await compactor.compact_once() == 1
+        minute = await db.rollups.find_one({"granularity": "minute", "bucket_start": start})
+        assert (minute["count"], minute["last"]) == (4, 40.0)
+        assert await db.retention.count_documents({"kind": retention.LATE_HOUR_KIND}) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,190 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from rollups import (
+    _partial_stats, active_rollup_writers, apply_rollups, describe, extend_rollup_coverage, load_rollup_coverage,
+    merge_stats, plan_range, plan_segments, range_stats, record_rollup_writer
+)
+
+METRICS = {"temp": "water_temperature"}
+T0 = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def readings(count: int, step: timedelta, start: datetime = T0):
+    return [{"timestamp": start + i * step, "water_temperature": 20.0 + (i * 7) % 11} for i in range(count)]
+
+
+def assert_contiguous(segments, start, end):
+    assert segments[0][1] == start and segments[-1][2] == end
+    for (_, _, previous_end), (_, next_start, _) in zip(segments, segments[1:]):
+        assert previous_end == next_start
+
+
+def test_plan_segments_uses_the_coarsest_aligned_buckets():
+    start = T0 + timedelta(hours=22, minutes=30)
+    end = T0 + timedelta(days=3, hours=2, minutes=15)
+    segments = plan_segments(start, end)
+    assert segments == [
+        ("raw", start, T0 + timedelta(hours=23)),
+        ("hour", T0 + timedelta(hours=23), T0 + timedelta(days=1)),
+        ("day", T0 + timedelta(days=1), T0 + timedelta(days=3)),
+        ("hour", T0 + timedelta(days=3), T0 + timedelta(days=3, hours=2)),
+        ("raw", T0 + timedelta(days=3, hours=2), end),
+    ]
+    assert_contiguous(segments, start, end)
+
+
+def test_plan_segments_short_and_empty_ranges():
+    start = T0 + timedelta(minutes=10)
+    assert plan_segments(start, start + timedelta(minutes=20)) == [("raw", start, start + timedelta(minutes=20))]
+    assert plan_segments(start, start) == []
+
+
+def test_plan_range_uses_minute_rollups_below_the_watermark():
+    start = T0 + timedelta(minutes=10, seconds=30)
+    watermark = T0 + timedelta(hours=2)
+    end = T0 + timedelta(hours=3, minutes=5)
+    segments = plan_range(start, end, compacted_until=watermark)
+    assert segments[0] == ("raw", start, T0 + timedelta(minutes=11))
+    assert ("minute", T0 + timedelta(minutes=11), T0 + timedelta(hours=1)) in segments
+    below = [source for source, _, segment_end in segments if segment_end <= watermark]
+    assert below == ["raw", "minute", "hour"]
+    assert_contiguous(segments, start, end)
+    assert plan_range(start, end) == plan_segments(start, end)
+
+
+def test_plan_range_reads_raw_below_the_rollup_coverage():
+    start = T0 + timedelta(minutes=10)
+    watermark = T0 + timedelta(hours=2)
+    covered_from = T0 + timedelta(hours=5)
+    end = T0 + timedelta(days=2)
+    segments = plan_range(start, end, compacted_until=watermark, covered_from=covered_from)
+    assert_contiguous(segments, start, end)
+    assert {source for source, _, segment_end in segments if segment_end <= watermark} == {"minute"}
+    assert ("raw", watermark, covered_from) in segments
+    assert segments[segments.index(("raw", watermark, covered_from)) + 1:] == plan_range(covered_from, end, watermark)
+    assert plan_range(start, end, covered_from=start) == plan_segments(start, end)
+
+
+def test_merged_partials_match_stats_over_all_readings():
+    rows = readings(500, timedelta(minutes=7))
+    whole = _partial_stats(rows, METRICS)
+    merged = {}
+    # Fold the batches in reverse so first/last must come from timestamps, not order
+    for offset in reversed(range(0, len(rows), 60)):
+        for key, stats in _partial_stats(rows[offset:offset + 60], METRICS).items():
+            merged[key] = merge_stats(merged.get(key), stats)
+
+    assert merged.keys() == whole.keys()
+    for key, stats in whole.items():
+        assert merged[key]["count"] == stats["count"]
+        assert merged[key]["sum"] == pytest.approx(stats["sum"])
+        assert merged[key]["sum_sq"] == pytest.approx(stats["sum_sq"])
+        for field in ("min", "max", "first", "first_ts", "last", "last_ts"):
+            assert merged[key][field] == stats[field]
+
+    values = [row["water_temperature"] for row in rows if row["timestamp"] < T0 + timedelta(days=1)]
+    day = describe(whole[("day", "temp", T0)])
+    assert day["count"] == len(values)
+    assert day["avg"] == pytest.approx(sum(values) / len(values))
+    assert (day["first"], day["last"]) == (values[0], values[-1])
+
+
+def test_merge_stats_ignores_empty_stats():
+    stats = _partial_stats(readings(3, timedelta(minutes=1)), METRICS)[("hour", "temp", T0)]
+    assert merge_stats(None, {"count": 0}) is None
+    assert merge_stats(dict(stats), None) == stats
+
+
+def test_readings_behind_the_watermark_also_feed_minute_rollups():
+    rows = readings(4, timedelta(seconds=30))
+    assert {key[0] for key in _partial_stats(rows, METRICS)} == {"hour", "day"}
+    partials = _partial_stats(rows, METRICS, compacted_until=T0 + timedelta(hours=1))
+    assert {key[0] for key in partials} == {"minute", "hour", "day"}
+    assert partials[("minute", "temp", T0)]["count"] == 2
+
+
+def test_summaries_count_readings_stored_before_rollups_existed():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True).rollup_coverage_test
+        legacy = readings(30, timedelta(minutes=10))
+        await db.readings.insert_many([dict(row) for row in legacy])
+        covered_from = await load_rollup_coverage(db.migrations, db.readings)
+        assert covered_from == T0 + timedelta(hours=5)
+        # Recorded once: later readings don't move it
+        fresh = readings(30, timedelta(minutes=10), start=T0 + timedelta(hours=6))
+        await db.readings.insert_many([dict(row) for row in fresh])
+        await apply_rollups(db.rollups, fresh, METRICS)
+        assert await load_rollup_coverage(db.migrations, db.readings) == covered_from
+
+        end = T0 + timedelta(days=1)
+        stats = await range_stats(db.readings, db.rollups, T0, end, METRICS, covered_from=covered_from)
+        assert stats["temp"]["count"] == 60
+        assert stats["temp"]["first_ts"] == T0
+        rollups_only = await range_stats(db.readings, db.rollups, T0, end, METRICS)
+        assert rollups_only["temp"]["count"] == 30
+
+        await extend_rollup_coverage(db.migrations, T0)
+        assert await load_rollup_coverage(db.migrations, db.readings) == T0
+        await extend_rollup_coverage(db.migrations, T0 + timedelta(hours=1))
+        assert await load_rollup_coverage(db.migrations, db.readings) == T0
+
+    asyncio.run(run())
+
+
+def test_an_empty_database_is_fully_covered():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True).rollup_coverage_test
+        assert await load_rollup_coverage(db.migrations, db.readings) is None
+
+    asyncio.run(run())
+
+
+def test_only_recent_rollup_writer_heartbeats_count():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True).rollup_writer_test
+        await record_rollup_writer(db.writers, "a", host="api-1", pid=10)
+        await record_rollup_writer(db.writers, "b", host="api-2", pid=11)
+        await db.writers.update_one({"_id": "b"}, {"$set": {"seen_at": datetime.now(timezone.utc) - timedelta(minutes=5)}})
+        writers = await active_rollup_writers(db.writers, timedelta(seconds=30))
+        assert [(w["_id"], w["host"], w["pid"]) for w in writers] == [("a", "api-1", 10)]
+
+    asyncio.run(run())
+
+
+def test_series_edge_buckets_only_count_readings_in_range(api, server, monkeypatch):
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=6)
+    batch = [
+        {"timestamp": (start + timedelta(minutes=10 * i)).isoformat(), "water_temperature": 20.0 + i,
+         "gps_latitude": 6.9, "gps_longitude": 79.8, "battery_percentage": 85.0, "water_turbidity": 12.5,
+         "humidity": 78.0, "air_pressure": 1012.0}
+        for i in range(30)
+    ]
+    assert api.post("/api/buoy/readings/batch", json=batch).json()["inserted"] == 30
+    # Both ends fall mid-hour, so the edge buckets are partly outside the range
+    params = {
+        "metric": "temperature", "points": 3,
+        "start": (start + timedelta(minutes=30)).isoformat(), "end": (start + timedelta(hours=4, minutes=20)).isoformat(),
+    }
+    expected = [20.0 + i for i in range(3, 27)]
+
+    def totals():
+        series = api.get("/api/buoy/readings/series", params=params).json()
+        points = series["points"]
+        return sum(p["count"] for p in points), min(p["min"] for p in points), max(p["max"] for p in points), series
+
+    count, low, high, series = totals()
+    assert series["bucket_seconds"] == 7200
+    assert (count, low, high) == (len(expected), min(expected), max(expected))
+    assert sum(p["avg"] * p["count"] for p in series["points"]) == pytest.approx(sum(expected))
+
+    monkeypatch.setattr(server, "USE_ROLLUPS", False)
+    assert totals()[:3] == (count, low, high)
@@ -0,0 +1,48 @@
+import json
+
+from stream_hub import StreamHub
+
+
+def drain(subscriber):
+    messages = []
+    while not subscriber.queue.empty():
+        messages.append(json.loads(subscriber.queue.get_nowait()))
+    return messages
+
+
+def test_slow_subscriber_drops_the_oldest_messages():
+    hub = StreamHub(queue_size=3)
+    slow = hub.subscribe()
+    hub.publish([{"id": str(i), "timestamp": i} for i in range(5)])
+    assert [m["id"] for m in drain(slow)] == ["2", "3", "4"]
+    assert slow.take_dropped() == 2
+    assert slow.take_dropped() == 0
+    assert hub.stats()["published"] == 5
+
+
+def test_one_slow_subscriber_does_not_affect_another():
+    hub = StreamHub(queue_size=2)
+    slow, fast = hub.subscribe(), hub.subscribe()
+    for i in range(4):
+        hub.publish([{"id": str(i), "timestamp": i}])
+        drain(fast)
+        assert fast.take_dropped() == 0
+    assert slow.dropped == 2
+
+
+def test_field_filter_keeps_id_and_timestamp():
+    hub = StreamHub()
+    filtered = hub.subscribe(frozenset({"water_temperature"}))
+    everything = hub.subscribe()
+    event = {"id": "a", "timestamp": 1, "water_temperature": 27.0, "humidity": 80.0}
+    hub.publish([event])
+    assert drain(filtered) == [{"id": "a", "timestamp": 1, "water_temperature": 27.0}]
+    assert drain(everything) == [event]
+
+
+def test_subscribers_are_capped():
+    hub = StreamHub(max_subscribers=1)
+    first = hub.subscribe()
+    assert hub.subscribe() is None
+    hub.unsubscribe(first)
+    assert hub.subscribe() is not None